@@ -0,0 +1,76 @@
+"""
+Benchmark of batch response verification with the crypto engine: inline, then on process pools of
+growing size, reporting verified responses per second and the speedup over inline. Last, the same
+responses are submitted as many small requests, as an aggregator's polls submit them, to be gathered
+into batches by the largest pool.
+
+Usage:
+    python -m benchmarks.crypto_engine --responses 20000 --tasks 100 --max-workers 32
+"""
+import argparse
+import os
+import time
+
+import coincurve
+from ecies import encrypt
+from ecies.utils import generate_eth_key
+
+from src.utils.crypto_engine import CryptoEngine, VerifiedBatch, verify_batch
+
+
+def _records(responses: int, tasks: int):
+    task_keys = [generate_eth_key() for _ in range(tasks)]
+    node_keys = [coincurve.PrivateKey() for _ in range(64)]
+    records = []
+    for i in range(responses):
+        task_key = task_keys[i % tasks]
+        message = os.urandom(32)
+        signature = node_keys[i % len(node_keys)].sign_recoverable(message)
+        ciphertext = encrypt(task_key.public_key.to_hex(), message.hex().encode("utf-8"))
+        records.append((ciphertext, signature, task_key.to_hex().removeprefix("0x"), None))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=20000)
+    parser.add_argument("--tasks", type=int, default=100, help="Distinct task keys")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--per-request", type=int, default=3, help="Responses per request when gathered")
+    args = parser.parse_args()
+
+    records = _records(args.responses, args.tasks)
+    start = time.perf_counter()
+    expected = verify_batch(records)
+    inline_s = time.perf_counter() - start
+    assert all(expected.ok)
+    print(f"responses={args.responses} tasks={args.tasks}")
+    print(f"inline:     {args.responses / inline_s:10.0f}/s")
+
+    sizes = sorted({2 ** i for i in range(1, args.max_workers.bit_length()) if 2 ** i <= args.max_workers}
+                   | {args.max_workers})
+    for workers in sizes:
+        with CryptoEngine(workers, min_batch=1) as engine:
+            # start the pool and warm up each process' key cache outside the measurement
+            engine.verify(records[:workers * engine.chunks_per_worker * 8])
+            start = time.perf_counter()
+            verified = engine.verify(records)
+            seconds = time.perf_counter() - start
+        assert verified.addresses == expected.addresses
+        print(f"{workers:3d} procs: {args.responses / seconds:10.0f}/s ({inline_s / seconds:.1f}x)")
+
+    with CryptoEngine(args.max_workers, batch_window=0.02) as engine:
+        engine.verify(records[:args.max_workers * engine.chunks_per_worker * 8])
+        start = time.perf_counter()
+        futures = [
+            engine.submit(records[i:i + args.per_request]) for i in range(0, len(records), args.per_request)
+        ]
+        verified = VerifiedBatch.concat([future.result() for future in futures])
+        seconds = time.perf_counter() - start
+    assert verified.addresses == expected.addresses
+    print(f"gathered:  {args.responses / seconds:10.0f}/s ({inline_s / seconds:.1f}x), "
+          f"{args.per_request} per request")
+
+
+if __name__ == "__main__":
+    main()
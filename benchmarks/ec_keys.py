@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of signing and decryption: the previous per-call key parsing (`coincurve.PrivateKey`
+from hex on every signature, `ecies.decrypt` with a hex key) against the cached `Signer` and
+`Decryptor`, and their batched `sign_many` / `decrypt_many` on a thread pool.
+
+Usage:
+    python -m benchmarks.ec_keys --ops 20000 --workers 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import coincurve
+from ecies import decrypt, encrypt
+from ecies.utils import generate_eth_key
+
+from src.utils.ec import Decryptor, Signer
+
+
+def _report(name: str, ops: int, seconds: float):
+    print(f"{name:<18} {seconds:7.3f}s ({ops / seconds:10.0f} ops/s)")
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    private_key = generate_eth_key().to_hex().removeprefix("0x")
+    messages = [f'{{"taskId":"{i}","input":"benchmark prompt {i}"}}' for i in range(args.ops)]
+
+    def sign_parsing():
+        return [
+            coincurve.PrivateKey(bytes.fromhex(private_key)).sign_recoverable(message.encode("utf-8"))
+            for message in messages
+        ]
+
+    signer = Signer(private_key)
+    expected, parsing_s = _timed(sign_parsing)
+    cached, cached_s = _timed(lambda: [signer.sign(message) for message in messages])
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        batched, batched_s = _timed(lambda: signer.sign_many(messages, executor, args.workers))
+    assert expected == cached == batched
+
+    print(f"ops={args.ops} workers={args.workers}")
+    print("sign")
+    _report("  parse per call", args.ops, parsing_s)
+    _report("  Signer.sign", args.ops, cached_s)
+    _report("  sign_many", args.ops, batched_s)
+
+    public_key = coincurve.PrivateKey(bytes.fromhex(private_key)).public_key.format(compressed=False)
+    ciphertexts = [encrypt(public_key, message.encode("utf-8")) for message in messages]
+    decryptor = Decryptor()
+
+    plain, parsing_s = _timed(lambda: [decrypt(private_key, c).decode("utf-8") for c in ciphertexts])
+    cached, cached_s = _timed(lambda: [decryptor.decrypt(private_key, c) for c in ciphertexts])
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        batched, batched_s = _timed(
+            lambda: decryptor.decrypt_many(private_key, ciphertexts, None, executor, args.workers)
+        )
+    assert plain == cached == batched == messages
+
+    print("decrypt")
+    _report("  parse per call", args.ops, parsing_s)
+    _report("  Decryptor", args.ops, cached_s)
+    _report("  decrypt_many", args.ops, batched_s)
+
+
+if __name__ == "__main__":
+    main()
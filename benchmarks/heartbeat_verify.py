@@ -0,0 +1,54 @@
+"""
+Benchmark of heartbeat response verification: the previous serial path (recover, compress to hex,
+decompress, keccak) against the batched `recover_addresses` path on a thread pool.
+
+Usage:
+    python -m benchmarks.heartbeat_verify --responses 10000 --workers 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import coincurve
+import sha3
+
+from src.utils.ec import recover_addresses, recover_public_key, uncompressed_public_key
+
+
+def _serial(signatures, message):
+    addresses = []
+    for signature in signatures:
+        public_key = uncompressed_public_key(recover_public_key(signature, message))
+        addresses.append(sha3.keccak_256(public_key[1:]).digest()[-20:].hex())
+    return addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=10000)
+    parser.add_argument("--nodes", type=int, default=1000, help="Distinct signing nodes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    message = b"5b1f7a6e-3a55-4a44-9f0e-0c2b0a7d1c11"
+    keys = [coincurve.PrivateKey() for _ in range(args.nodes)]
+    signatures = [keys[i % args.nodes].sign_recoverable(message) for i in range(args.responses)]
+
+    start = time.perf_counter()
+    expected = _serial(signatures, message)
+    serial_s = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        start = time.perf_counter()
+        actual = recover_addresses(signatures, message, executor, args.workers)
+        batched_s = time.perf_counter() - start
+
+    assert actual == expected
+    print(f"responses={args.responses} nodes={args.nodes} workers={args.workers}")
+    print(f"serial:  {serial_s:.3f}s ({args.responses / serial_s:10.0f}/s)")
+    print(f"batched: {batched_s:.3f}s ({args.responses / batched_s:10.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
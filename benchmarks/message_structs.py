@@ -0,0 +1,124 @@
+"""
+Benchmark of the task messages on the publish/aggregate path: the previous pydantic models against the
+slotted structs, per task, in CPU time and in memory allocated (tracemalloc).
+
+A task is taken through what the roles do with it: the task manager builds its delivery, the publisher
+builds and serializes the task, the task manager turns it into the HollowDB record and the aggregation
+message, and the aggregator validates that message when it reads it back.
+
+Usage:
+    python -m benchmarks.message_structs --tasks 20000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from src.models import AggregatorTaskModel, FilterModel, TaskDeliveryModel, TaskModel
+from src.utils.codec import dumps, loads
+
+
+class _FilterModel(BaseModel):
+    hex: str
+    hashes: int
+
+
+class _TaskDeliveryModel(BaseModel):
+    id: str
+    filter: _FilterModel
+    prompt: str
+    public_key: str
+
+
+class _TaskModel(BaseModel):
+    taskId: str
+    filter: _FilterModel
+    input: str
+    deadline: int
+    publicKey: str
+
+
+class _AggregatorTaskModel(BaseModel):
+    taskId: str
+    filter: _FilterModel
+    input: str
+    deadline: int
+    publicKey: str
+    privateKey: str
+    computeBy: Optional[int] = None
+    collected: Optional[List[dict]] = None
+    extraFilters: Optional[List[str]] = None
+
+
+def _pydantic_path(task_id: str, bloom: str, prompt: str, public_key: str) -> bytes:
+    delivery = _TaskDeliveryModel(
+        id=task_id, filter={"hex": bloom, "hashes": 7}, prompt=prompt, public_key=public_key
+    ).dict()
+    delivery = _TaskDeliveryModel(**delivery)
+    task = _TaskModel(
+        taskId=delivery.id, filter=delivery.filter, input=delivery.prompt, deadline=1, publicKey=delivery.public_key
+    )
+    body = task.json()
+    record = task.dict()
+    message = task.dict()
+    message["computeBy"] = 3
+    message["privateKey"] = public_key
+    _AggregatorTaskModel(**loads(dumps(message)))
+    dumps(record)
+    return body.encode("utf-8")
+
+
+def _struct_path(task_id: str, bloom: str, prompt: str, public_key: str) -> bytes:
+    delivery = TaskDeliveryModel(task_id, FilterModel(bloom, 7), prompt, public_key)
+    task = TaskModel(delivery.id, delivery.filter, delivery.prompt, 1, delivery.public_key)
+    body = task.to_json()
+    record = task.to_dict()
+    message = dict(record)
+    message["computeBy"] = 3
+    message["privateKey"] = public_key
+    AggregatorTaskModel.validate(loads(dumps(message)))
+    dumps(record)
+    return body
+
+
+def _measure(path, tasks):
+    start = time.process_time()
+    for task in tasks:
+        path(*task)
+    cpu = time.process_time() - start
+
+    tracemalloc.start()
+    for task in tasks:
+        path(*task)
+    # blocks allocated and freed again do not show in a snapshot, so count them with the peak of each task
+    allocated = 0
+    for task in tasks[:1000]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        path(*task)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return cpu / len(tasks), allocated / min(len(tasks), 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=20000)
+    args = parser.parse_args()
+
+    tasks = [
+        (os.urandom(16).hex(), os.urandom(48).hex(), f"prompt {i} " + "lorem ipsum " * 20, os.urandom(33).hex())
+        for i in range(args.tasks)
+    ]
+    assert loads(_pydantic_path(*tasks[0])) == loads(_struct_path(*tasks[0]))
+
+    for name, path in (("pydantic", _pydantic_path), ("structs", _struct_path)):
+        cpu, allocated = _measure(path, tasks)
+        print(f"{name:>8}: {cpu * 1e6:7.1f} us/task cpu, {allocated / 1024:6.1f} KiB/task peak allocated")
+
+
+if __name__ == "__main__":
+    main()
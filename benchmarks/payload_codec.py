@@ -0,0 +1,77 @@
+"""
+Benchmark of Waku payload handling on 10k messages: the previous path (base64 to str, then `json.loads`,
+with the aggregator decoding each response twice) against the codec's single decode into a `TaskResponse`,
+and the encoding of signed outgoing messages.
+
+Usage:
+    python -m benchmarks.payload_codec --messages 10000
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+from src.utils import codec
+from src.utils.codec import TaskResponse, encode_signed
+from src.utils.messaging_utils import str_to_base64
+
+
+def _responses(n: int):
+    messages = []
+    for i in range(n):
+        data = {
+            "ciphertext": os.urandom(160).hex(),
+            "signature": os.urandom(65).hex(),
+            "text": f"response {i} " + "lorem ipsum " * 40,
+        }
+        payload = base64.b64encode(json.dumps(data).encode("utf-8")).decode("ascii")
+        messages.append({"payload": payload, "timestamp": time.time_ns()})
+    return messages
+
+
+def _old_decode(messages):
+    # verification, then scoring, each decoding the payload
+    out = []
+    for message in messages:
+        data = json.loads(base64.b64decode(message["payload"]).decode("utf-8"))
+        out.append((bytes.fromhex(data["ciphertext"]), bytes.fromhex(data["signature"])))
+    return [json.loads(base64.b64decode(m["payload"]).decode("utf-8"))["text"] for m in messages], out
+
+
+def _new_decode(messages):
+    responses = [TaskResponse.from_message(message) for message in messages]
+    return [response.text for response in responses], [(r.ciphertext, r.signature) for r in responses]
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    messages = _responses(args.messages)
+    expected, old_s = _timed(_old_decode, messages)
+    actual, new_s = _timed(_new_decode, messages)
+    assert expected == actual
+
+    signature = os.urandom(65)
+    bodies = [json.dumps({"taskId": str(i), "input": "prompt " * 20, "deadline": i}) for i in range(args.messages)]
+    old_payloads, old_encode_s = _timed(lambda: [str_to_base64(signature.hex() + body) for body in bodies])
+    new_payloads, new_encode_s = _timed(lambda: [encode_signed(signature, body) for body in bodies])
+    assert old_payloads == new_payloads
+
+    print(f"messages={args.messages} json={'orjson' if codec.orjson is not None else 'json'}")
+    print(f"decode old: {args.messages / old_s:10.0f} msg/s ({old_s * 1e6 / args.messages:6.1f} us/msg)")
+    print(f"decode new: {args.messages / new_s:10.0f} msg/s ({new_s * 1e6 / args.messages:6.1f} us/msg)")
+    print(f"encode old: {args.messages / old_encode_s:10.0f} msg/s")
+    print(f"encode new: {args.messages / new_encode_s:10.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
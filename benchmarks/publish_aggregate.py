@@ -0,0 +1,93 @@
+"""
+Load benchmark for the publish/aggregate path against the stand-in HollowDB server.
+
+Runs TaskManager publish (get_tasks + add_aggregator_task) and aggregation fetches with an
+in-memory RabbitMQ stand-in, so the numbers reflect HollowDB round-trips and local work only.
+
+Usage:
+    python -m benchmarks.publish_aggregate --tasks 500 --workers 4 --latency 0.002
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from src.config import Config
+from src.db.hollowdb.server import HollowServer
+from src.models import TaskModel
+from src.rabbit.memory import MemoryBroker, MemoryConsumer, MemoryProducer
+from src.utils.node_registry import NodeRegistry
+from src.utils.task_manager import TaskManager
+
+
+def _publish_worker(task_manager: TaskManager, count: int):
+    for _ in range(count):
+        task = task_manager.get_tasks()
+        if task is None:
+            return
+        task_manager.add_aggregator_task(
+            TaskModel(
+                taskId=task.id,
+                filter=task.filter,
+                input=task.prompt,
+                deadline=time.time_ns(),
+                publicKey=task.public_key,
+            )
+        )
+
+
+def _aggregate_worker(task_manager: TaskManager, count: int):
+    for _ in range(count):
+        task = task_manager.fetch_aggregation_tasks()
+        if task is None:
+            return
+        task_manager.hollow.get(task["taskId"])
+
+
+def _timed(target, task_managers, per_worker: int) -> float:
+    threads = [threading.Thread(target=target, args=(tm, per_worker)) for tm in task_managers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected HollowDB latency in seconds")
+    args = parser.parse_args()
+
+    with HollowServer(secret_key="bench", latency=args.latency) as server:
+        os.environ["HOLLOWDB_URL"] = server.url
+        os.environ["HOLLOWDB_SECRET_KEY"] = "bench"
+        config = Config()
+
+        broker = MemoryBroker()
+        task_managers = [
+            TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+            for _ in range(args.workers)
+        ]
+        channel = task_managers[0].config.SYNTHESIS_CHANNEL
+        registry = NodeRegistry()
+        added = registry.observe(os.urandom(20) for _ in range(args.nodes))
+        task_managers[0].publish_available_nodes(registry, registry.commit(added, []))
+        for i in range(args.tasks):
+            broker.publish(channel, json.dumps({"prompt": f"prompt {i}", "public_key": "ab" * 32}).encode())
+
+        per_worker = -(-args.tasks // args.workers)
+        publish_s = _timed(_publish_worker, task_managers, per_worker)
+        aggregate_s = _timed(_aggregate_worker, task_managers, per_worker)
+
+    print(f"nodes={args.nodes} workers={args.workers} latency={args.latency * 1000:.1f}ms")
+    print(f"publish:   {args.tasks / publish_s:10.1f} tasks/s ({publish_s:.2f}s)")
+    print(f"aggregate: {args.tasks / aggregate_s:10.1f} tasks/s ({aggregate_s:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
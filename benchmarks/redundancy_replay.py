@@ -0,0 +1,100 @@
+"""
+Replay benchmark of the adaptive redundancy policy.
+
+Replays recorded tasks through an AgreementTracker: each task is computed by the first k of its recorded
+responses, with k chosen by the tracker, and the winner among those k is compared with the winner among
+all recorded responses. Reports the compute saved against `compute_by_job` and the accuracy lost.
+
+Records are JSON lines as written by the aggregator with AGREEMENT_RECORD_FILE set, i.e.
+{"taskId": ..., "nodes": [...], "similarity": [[...]]} with an optional "type"; record with
+REDUNDANCY_MIN=REDUNDANCY_MAX at the highest redundancy to replay. Without a file, synthetic tasks are used.
+
+Usage:
+    python -m benchmarks.redundancy_replay --records agreement.jsonl
+    python -m benchmarks.redundancy_replay --tasks 20000
+"""
+import argparse
+import json
+import random
+
+from src.utils.redundancy import DEFAULT_TASK_TYPE, AgreementTracker, agreement_scores
+
+
+def _synthetic(tasks: int, responses: int, rng: random.Random):
+    """
+    Tasks of three types whose nodes find the consensus answer 99%, 90% and 60% of the time,
+    with one node in twenty answering at random.
+    """
+    types = {"extraction": 0.99, "synthesis": 0.9, "creative": 0.6}
+    nodes = ["%040x" % i for i in range(200)]
+    faulty = set(nodes[:10])
+    for i in range(tasks):
+        task_type = rng.choice(list(types))
+        picked = rng.sample(nodes, responses)
+        answers = [
+            0 if node not in faulty and rng.random() < types[task_type] else rng.randint(1, 5)
+            for node in picked
+        ]
+        similarity = [
+            [1.0 if a == b else rng.uniform(0.4, 0.6) if i != j else 1.0 for j, b in enumerate(answers)]
+            for i, a in enumerate(answers)
+        ]
+        yield {"taskId": str(i), "type": task_type, "nodes": picked, "similarity": similarity}
+
+
+def _winner(similarity, k: int) -> int:
+    return max(range(k), key=lambda i: sum(similarity[i][j] for j in range(k)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", help="JSON lines of recorded tasks")
+    parser.add_argument("--tasks", type=int, default=20000, help="Synthetic tasks, without --records")
+    parser.add_argument("--compute-by-job", type=int, default=3)
+    parser.add_argument("--min", type=int, default=2)
+    parser.add_argument("--max", type=int, default=5)
+    parser.add_argument("--high", type=float, default=0.9)
+    parser.add_argument("--low", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.records:
+        with open(args.records) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        records = list(_synthetic(args.tasks, args.max, rng))
+
+    tracker = AgreementTracker(args.compute_by_job, args.min, args.max, args.high, args.low, rng=rng)
+    baseline = adaptive = fixed_misses = adaptive_misses = 0
+    per_type = {}
+    for record in records:
+        task_type = record.get("type", DEFAULT_TASK_TYPE)
+        nodes, similarity = record["nodes"], record["similarity"]
+        reference = _winner(similarity, len(nodes))
+
+        k = min(tracker.redundancy(task_type, nodes), len(nodes))
+        fixed = min(args.compute_by_job, len(nodes))
+        chosen = _winner(similarity, k)
+        baseline += fixed
+        adaptive += k
+        # a miss is an answer that does not match the answer picked with all responses
+        fixed_misses += similarity[_winner(similarity, fixed)][reference] < args.high
+        adaptive_misses += similarity[chosen][reference] < args.high
+        stats = per_type.setdefault(task_type, [0, 0])
+        stats[0] += 1
+        stats[1] += k
+
+        tracker.assign(record["taskId"], task_type, float("inf"))
+        sub = [row[:k] for row in similarity[:k]]
+        tracker.complete(record["taskId"], dict(zip(nodes[:k], agreement_scores(sub))))
+
+    print(f"tasks={len(records)} compute_by_job={args.compute_by_job} redundancy={args.min}..{args.max}")
+    print(f"compute:  fixed {baseline}  adaptive {adaptive}  saved {1 - adaptive / baseline:.1%}")
+    print(f"misses:   fixed {fixed_misses / len(records):.2%}  adaptive {adaptive_misses / len(records):.2%}")
+    for task_type, (count, compute) in sorted(per_type.items()):
+        print(f"  {task_type:12s} mean redundancy {compute / count:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark of the thread and async runtimes on an aggregation-shaped workload.
+
+Each task waits for its responses, polling for them like the aggregator does, and then does some CPU
+work standing in for verification and scoring. A share of the tasks straggle, i.e. their responses
+take much longer, as when an assigned node is offline and the aggregator waits until the deadline. The thread runtime runs one such task per worker thread,
+the async runtime waits on the event loop and only takes pool threads for the polls and the CPU work.
+Reports tasks/sec, tasks per CPU-second (i.e. per fully used core) and the p99 time from a task's
+arrival to its completion for each mode.
+
+Usage:
+    python -m benchmarks.runtime_modes --duration 10 --threads 8 --concurrency 256
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+
+from src.runtime import AsyncRuntime, run_stage
+
+
+class SimulatedAggregator:
+    """
+    A role with the aggregator's shape: fetch a task, poll until its responses are in, score them.
+    """
+
+    def __init__(
+            self, tasks: "queue.Queue[tuple]", poll_interval: float, cpu_rounds: int, concurrency: int
+    ):
+        self.tasks = tasks
+        self.poll_interval = poll_interval
+        self.cpu_rounds = cpu_rounds
+        self.concurrency = concurrency
+        self.completed = 0
+        self.durations = []
+        self._lock = threading.Lock()
+        self._runtime = None
+        self._slots = None
+        self._in_flight = set()
+
+    def _fetch(self):
+        try:
+            return self.tasks.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _poll(self, ready_at: float):
+        return None if time.time() >= ready_at else min(self.poll_interval, ready_at - time.time())
+
+    def _score(self, arrived_at: float):
+        hashlib.pbkdf2_hmac("sha256", b"response", b"salt", self.cpu_rounds)
+        with self._lock:
+            self.completed += 1
+            self.durations.append(time.time() - arrived_at)
+
+    def stages(self):
+        return [("aggregate", self._step, 0.01)]
+
+    def _step(self) -> bool:
+        task = self._fetch()
+        if task is None:
+            return False
+        arrived_at, ready_at = task
+        while True:
+            delay = self._poll(ready_at)
+            if delay is None:
+                break
+            time.sleep(delay)
+        self._score(arrived_at)
+        return True
+
+    def async_stages(self, runtime: AsyncRuntime):
+        self._runtime = runtime
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return [("aggregate", self._step_async, 0.01)]
+
+    async def _step_async(self) -> bool:
+        await self._slots.acquire()
+        task = self._fetch()
+        if task is None:
+            self._slots.release()
+            return False
+        in_flight = asyncio.create_task(self._process_async(*task))
+        self._in_flight.add(in_flight)
+        in_flight.add_done_callback(self._in_flight.discard)
+        return True
+
+    async def _process_async(self, arrived_at: float, ready_at: float):
+        try:
+            while True:
+                delay = await self._runtime.io(self._poll, ready_at)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+            await self._runtime.cpu(self._score, arrived_at)
+        finally:
+            self._slots.release()
+
+
+def _feed(tasks: "queue.Queue[tuple]", args, stop: threading.Event):
+    # tasks arrive at a fixed rate, and their responses some latency after
+    rng = random.Random(0)
+    while not stop.is_set():
+        now = time.time()
+        latency = args.straggler_latency if rng.random() < args.stragglers else args.latency
+        tasks.put((now, now + latency))
+        time.sleep(1 / args.rate)
+
+
+def _measure(mode: str, args) -> tuple:
+    tasks: "queue.Queue[tuple]" = queue.Queue()
+    stop = threading.Event()
+    threading.Thread(target=_feed, args=(tasks, args, stop), daemon=True).start()
+    role = SimulatedAggregator(tasks, args.poll_interval, args.cpu_rounds, args.concurrency)
+
+    cpu_start, start = time.process_time(), time.perf_counter()
+    if mode == "thread":
+        for _ in range(args.threads):
+            threading.Thread(target=run_stage, args=(role._step, 0.01, 1), daemon=True).start()
+        time.sleep(args.duration)
+    else:
+        runtime = AsyncRuntime(args.io_workers, args.cpu_workers)
+
+        async def serve():
+            try:
+                await asyncio.wait_for(runtime.serve([role]), args.duration)
+            except asyncio.TimeoutError:
+                pass
+
+        asyncio.run(serve())
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    stop.set()
+    durations = sorted(role.durations) or [float("nan")]
+    p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+    return role.completed / elapsed, role.completed / max(cpu, 1e-9), p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=500, help="Tasks arriving per second")
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds until a task's responses are in")
+    parser.add_argument("--stragglers", type=float, default=0.05, help="Share of straggling tasks")
+    parser.add_argument("--straggler-latency", type=float, default=5.0)
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--cpu-rounds", type=int, default=2000, help="PBKDF2 rounds of CPU work per task")
+    parser.add_argument("--threads", type=int, default=8, help="Workers in thread mode")
+    parser.add_argument("--concurrency", type=int, default=256, help="Tasks in flight in async mode")
+    parser.add_argument("--io-workers", type=int, default=32)
+    parser.add_argument("--cpu-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(
+        f"rate={args.rate}/s latency={args.latency}s stragglers={args.stragglers:.0%} "
+        f"({args.straggler_latency}s) duration={args.duration}s cpus={os.cpu_count()}"
+    )
+    for mode in ("thread", "async"):
+        throughput, per_core, p99 = _measure(mode, args)
+        print(f"{mode:6s} {throughput:8.1f} tasks/s  {per_core:8.1f} tasks/cpu-s  p99 {p99:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Startup cost of each role: the import time of the modules a role's process loads, from `python -X importtime`,
+broken down by top-level package.
+
+Usage:
+    python -m benchmarks.startup --top 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROLES = {
+    "monitor": "src.functions.monitor",
+    "publisher": "src.functions.publisher",
+    "aggregator": "src.functions.aggregator",
+}
+
+# packages that only an aggregator, once started, may load
+HEAVY = ("torch", "transformers", "sklearn", "numpy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Import a module in a fresh interpreter and collect its import times.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        List[Tuple[str, int, int]]: Name, self and cumulative microseconds of every module imported.
+
+    Raises:
+        ImportError: If the module could not be imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else module)
+
+    times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def by_package(times: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """
+    Self import time per top-level package, in microseconds.
+    """
+    packages: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in times:
+        packages[name.split(".", 1)[0]] += self_us
+    return dict(packages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="Packages to list per role")
+    args = parser.parse_args()
+
+    for role, module in ROLES.items():
+        try:
+            times = import_times(module)
+        except ImportError as e:
+            print(f"{role}: failed to import {module}: {e}")
+            continue
+        packages = by_package(times)
+        heavy = sorted(package for package in packages if package in HEAVY)
+        print(f"{role}: {sum(packages.values()) / 1000:.1f} ms, {len(times)} modules, heavy: {heavy or 'none'}")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<24} {self_us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of the batched task envelope against single-task messages: messages per second
+(encoding and signing) and bytes on the wire per task.
+
+Usage:
+    python -m benchmarks.task_envelope --tasks 5000 --max-bytes 100000
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+import coincurve
+
+from src.utils.envelope import TaskBatcher, encode_batch, encode_task
+
+
+def _task_json(prompt_size: int) -> str:
+    return json.dumps(
+        {
+            "taskId": str(uuid.uuid4()),
+            "filter": {"hex": os.urandom(8).hex(), "hashes": 7},
+            "input": "x" * prompt_size,
+            "deadline": time.time_ns(),
+            "publicKey": os.urandom(64).hex(),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--prompt-size", type=int, default=500)
+    parser.add_argument("--max-bytes", type=int, default=100_000)
+    args = parser.parse_args()
+
+    private_key = coincurve.PrivateKey().to_hex()
+    tasks = [_task_json(args.prompt_size) for _ in range(args.tasks)]
+
+    start = time.perf_counter()
+    single = [encode_task(private_key, task) for task in tasks]
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batcher = TaskBatcher(args.max_bytes, flush_interval=float("inf"))
+    batched = []
+    for task in tasks:
+        flushed = batcher.add(None, task)
+        if flushed:
+            batched.append(encode_batch(private_key, [t for _, t in flushed]))
+    batched.append(encode_batch(private_key, [t for _, t in batcher.drain()]))
+    batched_s = time.perf_counter() - start
+
+    for name, messages, seconds in (("single", single, single_s), ("batched", batched, batched_s)):
+        size = sum(len(m) for m in messages)
+        print(
+            f"{name:8s} messages={len(messages):6d} tasks/s={args.tasks / seconds:10.0f} "
+            f"messages/s={len(messages) / seconds:10.0f} bytes/task={size / args.tasks:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
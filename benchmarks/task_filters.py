@@ -0,0 +1,49 @@
+"""
+Benchmark of the task filter types for 3 to 1000 assigned nodes: build time, lookup time, the size of the
+filter field in the task JSON for each encoding, and the measured false-positive rate.
+
+Usage:
+    python -m benchmarks.task_filters --probes 100000
+"""
+import argparse
+import os
+import time
+
+from src.utils.codec import dumps
+from src.utils.filters import FILTER_ENCODINGS, FILTER_TYPES, build_filter, encode_filter
+
+
+def _address() -> str:
+    return os.urandom(20).hex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 10, 30, 100, 300, 1000])
+    parser.add_argument("--probes", type=int, default=100000, help="Unassigned addresses to probe per filter")
+    args = parser.parse_args()
+
+    probes = [_address() for _ in range(args.probes)]
+    print(f"{'type':>6} {'nodes':>6} {'build us':>10} {'lookup ns':>10} "
+          + " ".join(f"{encoding + ' B':>9}" for encoding in FILTER_ENCODINGS) + f" {'fpr':>9}")
+    for size in args.sizes:
+        nodes = [_address() for _ in range(size)]
+        for kind in FILTER_TYPES:
+            rounds = max(1, 1000 // size)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                membership_filter = build_filter(nodes, kind)
+            build_s = (time.perf_counter() - start) / rounds
+
+            assert all(membership_filter.contains(node) for node in nodes)
+            start = time.perf_counter()
+            false_positives = sum(1 for probe in probes if membership_filter.contains(probe))
+            lookup_s = (time.perf_counter() - start) / len(probes)
+
+            sizes = [len(dumps(encode_filter(membership_filter, encoding).to_dict())) for encoding in FILTER_ENCODINGS]
+            print(f"{kind:>6} {size:>6} {build_s * 1e6:>10.1f} {lookup_s * 1e9:>10.0f} "
+                  + " ".join(f"{s:>9}" for s in sizes) + f" {false_positives / len(probes):>9.5f}")
+
+
+if __name__ == "__main__":
+    main()
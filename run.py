@@ -1,15 +1,22 @@
 import logging
+import shutil
+import signal
+import tempfile
 import threading
-from typing import Dict, Type, Union
+from typing import Callable, Dict, Optional
 
-from src.functions import Monitor, Publisher, Aggregator
-from src.config import Config
+import src.functions
+from src.config import config
+from src.rabbit import Consumer
+from src.runtime import AsyncRuntime, Autoscaler, ScalingPolicy, Supervisor, parse_cpus
+from src.utils.metrics import MetricsServer
+from src.utils.profiler import Profiler
+from src.utils.tracing import TRACER
 
-config = Config()
 logger = logging.getLogger(__name__)
 
 
-def thread_function(task_instance: Union[Monitor, Publisher, Aggregator]):
+def thread_function(task_instance):
     """
     Run the given task instance in a separate thread.
 
@@ -21,38 +28,171 @@ def thread_function(task_instance: Union[Monitor, Publisher, Aggregator]):
         logger.error(f"Error occurred in {type(task_instance).__name__}: {e}", exc_info=True)
 
 
+def reload_config(*_):
+    """
+    Reload the tunables of the config, on SIGHUP.
+    """
+    try:
+        config.reload()
+    except Exception as e:
+        logger.error(f"Failed to reload the config: {e}", exc_info=True)
+
+
+def profile_action(start: Callable[[float, float, bool], str]) -> Callable[[Dict[str, str]], str]:
+    """
+    The `/profile` admin action: `seconds` and `allocations` default to PROFILE_SECONDS and PROFILE_ALLOCATIONS.
+
+    :param start: Starts a profile from its seconds, sampling interval and whether to trace allocations.
+    :return: The action, for the metrics server.
+    """
+    def action(params: Dict[str, str]) -> str:
+        seconds = float(params.get("seconds", config.profile_seconds))
+        if not 0 < seconds <= 3600:
+            raise ValueError("seconds must be in (0, 3600]")
+        allocations = params.get("allocations", str(config.profile_allocations)).lower() in ("1", "true")
+        return start(seconds, config.profile_interval, allocations)
+
+    return action
+
+
+def start_metrics_server(
+        snapshot_dir: Optional[str] = None, profile: Optional[Callable[[float, float, bool], str]] = None
+) -> Optional[MetricsServer]:
+    """
+    Serve the metrics at METRICS_HOST:METRICS_PORT, unless METRICS_PORT is 0.
+
+    :param snapshot_dir: Directory of the worker processes' snapshots to merge in, in process mode.
+    :param profile: Starts a profile, served on POST at /profile.
+    :return: The running server, or None if metrics are disabled or the port is taken.
+    """
+    if not config.metrics_port:
+        return None
+    try:
+        return MetricsServer(
+            config.metrics_host, config.metrics_port, snapshot_dir=snapshot_dir,
+            snapshot_max_age=3 * config.metrics_interval,
+            actions={"/profile": profile_action(profile)} if profile is not None else None,
+        ).start()
+    except OSError as e:
+        logger.error(f"Failed to start the metrics server: {e}", exc_info=True)
+        return None
+
+
 def main():
     """
-    Run all tasks in separate threads.
+    Run all tasks, in separate threads, on one event loop or in separate processes depending on `config.runtime`.
 
     config.AGGREGATOR_WORKERS: Number of aggregator workers to run.
     config.MONITORING_WORKERS: Number of monitoring workers to run.
     config.PUBLISHER_WORKERS: Number of publisher workers to run.
+    config.RUNTIME: "thread" for a thread per worker, "async" for the asyncio runtime, or "process"
+        for a process per worker, pinned to the CPUs in AGGREGATOR_CPUS, MONITORING_CPUS and PUBLISHER_CPUS.
+    config.AUTOSCALE: In process mode, scale the publisher and aggregator workers with their queue depth.
+    config.DRAIN_TIMEOUT: Seconds the workers get on SIGTERM or SIGINT to finish or requeue their tasks.
+    config.CONFIG_FILE: JSON file of tunables, reloaded on SIGHUP without a restart.
+    config.METRICS_PORT: Port of the Prometheus metrics endpoint, 0 to disable it.
+    config.TRACE_FILE: File to append the spans of traced tasks to, as OTLP/JSON. Tracing is off if empty.
+    config.TRACE_SAMPLE_RATE: Fraction of the tasks to trace.
+    config.PROFILE_DIR: Where profiles started by SIGUSR1 or a POST to /profile on the metrics port are written.
     """
     print("Starting tasks...")
+    # before the workers are forked, which inherit it
+    TRACER.configure(config.trace_file, config.trace_sample_rate)
     print(config.monitoring_workers, config.aggregator_workers, config.publisher_workers)
-    tasks: Dict[Type[Union[Monitor, Publisher, Aggregator]], int] = {
-        Aggregator: config.aggregator_workers,
-        Monitor: config.monitoring_workers,
-        Publisher: config.publisher_workers,
+    # only the roles that run are imported, so that e.g. a monitor does not load the embedding model's dependencies
+    workers = {
+        "Aggregator": config.aggregator_workers,
+        "Monitor": config.monitoring_workers,
+        "Publisher": config.publisher_workers,
+    }
+    tasks: Dict[type, int] = {
+        getattr(src.functions, name): num_workers for name, num_workers in workers.items() if num_workers > 0
     }
 
-    threads = []
+    if config.runtime == "process":
+        cpus = {
+            "Aggregator": config.aggregator_cpus,
+            "Monitor": config.monitoring_cpus,
+            "Publisher": config.publisher_cpus,
+        }
+        metrics_dir = tempfile.mkdtemp(prefix="dria-metrics-") if config.metrics_port else None
+        supervisor = Supervisor(config, [
+            (task_class, num_workers, parse_cpus(cpus[task_class.__name__]))
+            for task_class, num_workers in tasks.items()
+        ], drain_timeout=config.drain_timeout, metrics_dir=metrics_dir, metrics_interval=config.metrics_interval,
+            profile_dir=config.profile_dir)
+
+        def profile_workers(seconds: float, interval: float, allocations: bool) -> str:
+            workers = supervisor.profile(seconds, interval, allocations)
+            return f"Profiling {workers} workers for {seconds}s into {config.profile_dir}"
+
+        start_metrics_server(metrics_dir, profile_workers)
+        # off the main thread, which may hold the supervisor's lock when the signal arrives
+        signal.signal(signal.SIGUSR1, lambda *_: threading.Thread(target=supervisor.profile, args=(
+            config.profile_seconds, config.profile_interval, config.profile_allocations
+        ), daemon=True).start())
+        if config.autoscale:
+            autoscaler = Autoscaler(supervisor, Consumer(config).queue_depth, [
+                ScalingPolicy(src.functions.Publisher, config.SYNTHESIS_CHANNEL, config.publisher_workers_min,
+                              config.publisher_workers_max, config.publisher_tasks_per_worker,
+                              config.autoscale_down_after),
+                ScalingPolicy(src.functions.Aggregator, config.AGGREGATION_CHANNEL, config.aggregator_workers_min,
+                              config.aggregator_workers_max, config.aggregator_tasks_per_worker,
+                              config.autoscale_down_after),
+            ], config.autoscale_interval)
+            threading.Thread(target=autoscaler.run, name="autoscaler", daemon=True).start()
+        try:
+            supervisor.run()
+        finally:
+            if metrics_dir is not None:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+        return
 
+    profiler = Profiler(config.profile_dir, "main", list(tasks))
+
+    def profile_process(seconds: float, interval: float, allocations: bool) -> str:
+        if not profiler.start(seconds, interval, allocations):
+            return "A profile is already running"
+        return f"Profiling for {seconds}s into {config.profile_dir}"
+
+    start_metrics_server(profile=profile_process)
+    signal.signal(signal.SIGHUP, reload_config)
+    signal.signal(signal.SIGUSR1, lambda *_: profiler.start(
+        config.profile_seconds, config.profile_interval, config.profile_allocations
+    ))
+    task_instances = []
     for task_class, num_workers in tasks.items():
         for _ in range(num_workers):
             try:
-                task_instance = task_class(config)
+                task_instances.append(task_class(config))
             except Exception as e:
                 logger.error(f"Error creating instance of {task_class.__name__}: {e}", exc_info=True)
-                continue
-            thread = threading.Thread(target=thread_function, args=(task_instance,))
-            threads.append(thread)
-            thread.start()
+
+    if config.runtime == "async":
+        AsyncRuntime(config.io_workers, config.cpu_workers, config.polling_interval).run(
+            task_instances, config.drain_timeout
+        )
+        return
+
+    def request_shutdown(*_):
+        logger.info(f"Shutting down, draining for up to {config.drain_timeout}s")
+        for task_instance in task_instances:
+            task_instance.shutdown.request(config.drain_timeout)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, request_shutdown)
+
+    threads = []
+    for task_instance in task_instances:
+        thread = threading.Thread(target=thread_function, args=(task_instance,), name=type(task_instance).__name__)
+        threads.append(thread)
+        thread.start()
 
     for thread in threads:
         try:
-            thread.join()
+            # join in slices, so that the main thread keeps handling signals
+            while thread.is_alive():
+                thread.join(timeout=1)
         except Exception as e:
             logger.error(f"Error joining thread: {e}", exc_info=True)
 
@@ -1,11 +1,32 @@
+import json
 import logging
 import os
-from typing import Any
+import tempfile
+import threading
+from typing import Any, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
 
 class Config:
+    """
+    The node's configuration, read from the environment once at startup and shared by all roles.
+
+    The config is frozen after validation. Only the `TUNABLES`, which the roles read each time they use them,
+    can change afterwards, through `reload`, from the JSON file at CONFIG_FILE.
+    """
+
+    TUNABLES = (
+        "polling_interval",
+        "monitoring_interval",
+        "heartbeat_interval",
+        "heartbeat_poll_interval",
+        "publisher_batch_size",
+        "aggregator_concurrency",
+        "compute_by_job",
+        "redispatch_fraction",
+    )
+
     def __init__(self):
         self.node_auth_key: str = self._get_env_var("NODE_AUTH_KEY", "default_auth_key")
         self.dria_private_key: str = self._get_env_var(
@@ -18,15 +39,208 @@ class Config:
         )
         self.publisher_workers: int = self._get_env_var("PUBLISHER_WORKERS", 1, int)
         self.monitoring_workers: int = self._get_env_var("MONITORING_WORKERS", 1, int)
-        self.monitoring_interval: int = 10
-        self.polling_interval: int = 5
+        self.runtime: str = self._get_env_var("RUNTIME", "thread")
+        self.aggregator_cpus: str = self._get_env_var("AGGREGATOR_CPUS", "")
+        self.publisher_cpus: str = self._get_env_var("PUBLISHER_CPUS", "")
+        self.monitoring_cpus: str = self._get_env_var("MONITORING_CPUS", "")
+        self.autoscale: bool = self._get_env_var("AUTOSCALE", "false").lower() == "true"
+        self.autoscale_interval: float = self._get_env_var("AUTOSCALE_INTERVAL", 5, float)
+        self.autoscale_down_after: float = self._get_env_var("AUTOSCALE_DOWN_AFTER", 60, float)
+        self.publisher_workers_min: int = self._get_env_var("PUBLISHER_WORKERS_MIN", 1, int)
+        self.publisher_workers_max: int = self._get_env_var("PUBLISHER_WORKERS_MAX", 4, int)
+        self.publisher_tasks_per_worker: float = self._get_env_var("PUBLISHER_TASKS_PER_WORKER", 200, float)
+        self.aggregator_workers_min: int = self._get_env_var("AGGREGATOR_WORKERS_MIN", 1, int)
+        self.aggregator_workers_max: int = self._get_env_var("AGGREGATOR_WORKERS_MAX", 8, int)
+        self.aggregator_tasks_per_worker: float = self._get_env_var("AGGREGATOR_TASKS_PER_WORKER", 16, float)
+        self.io_workers: int = self._get_env_var("IO_WORKERS", 32, int)
+        self.cpu_workers: int = self._get_env_var("CPU_WORKERS", os.cpu_count() or 1, int)
+        self.aggregator_concurrency: int = self._get_env_var("AGGREGATOR_CONCURRENCY", 16, int)
+        self.drain_timeout: float = self._get_env_var("DRAIN_TIMEOUT", 30, float)
+        self.verify_workers: int = self._get_env_var("VERIFY_WORKERS", os.cpu_count() or 1, int)
+        # 0 sizes the pool to the cores of the process, see `crypto_engine.pool_size`
+        self.crypto_workers: int = self._get_env_var("CRYPTO_WORKERS", 0, int)
+        self.crypto_min_batch: int = self._get_env_var("CRYPTO_MIN_BATCH", 64, int)
+        self.crypto_batch_window: float = self._get_env_var("CRYPTO_BATCH_WINDOW", 0.02, float)
+        self.monitoring_interval: float = self._get_env_var("MONITORING_INTERVAL", 10, float)
+        self.heartbeat_interval: float = self._get_env_var("HEARTBEAT_INTERVAL", 5, float)
+        self.heartbeat_poll_interval: float = self._get_env_var("HEARTBEAT_POLL_INTERVAL", 1, float)
+        self.polling_interval: float = self._get_env_var("POLLING_INTERVAL", 5, float)
+        self.publisher_batch_size: int = self._get_env_var("PUBLISHER_BATCH_SIZE", 32, int)
+        self.publisher_queue_size: int = self._get_env_var("PUBLISHER_QUEUE_SIZE", 64, int)
+        self.task_batch_enabled: bool = self._get_env_var("TASK_BATCH_ENABLED", "false").lower() == "true"
+        self.task_batch_max_bytes: int = self._get_env_var("TASK_BATCH_MAX_BYTES", 100_000, int)
+        self.task_batch_flush_interval: float = self._get_env_var("TASK_BATCH_FLUSH_INTERVAL", 0.5, float)
+        self.task_filter: str = self._get_env_var("TASK_FILTER", "bloom")
+        self.task_filter_encoding: str = self._get_env_var("TASK_FILTER_ENCODING", "hex")
         self.input_content_topic: str = "/dria/0/synthesis/proto"
         self.heartbeat_topic: str = "/dria/0/heartbeat/proto"
+        self.search_content_topic: str = "/dria/0/search/proto"
         self.task_timeout_minute: int = 3
         self.compute_by_job: int = 3
+        self.adaptive_redundancy: bool = self._get_env_var("ADAPTIVE_REDUNDANCY", "false").lower() == "true"
+        self.redundancy_min: int = self._get_env_var("REDUNDANCY_MIN", 2, int)
+        self.redundancy_max: int = self._get_env_var("REDUNDANCY_MAX", 5, int)
+        self.agreement_high: float = self._get_env_var("AGREEMENT_HIGH", 0.9, float)
+        self.agreement_low: float = self._get_env_var("AGREEMENT_LOW", 0.7, float)
+        self.agreement_record_file: str = self._get_env_var("AGREEMENT_RECORD_FILE", "")
+        self.redispatch_fraction: float = self._get_env_var("REDISPATCH_FRACTION", 0.5, float)
+        self.node_missed_heartbeats: int = self._get_env_var("NODE_MISSED_HEARTBEATS", 3, int)
+        self.node_snapshot_interval: int = self._get_env_var("NODE_SNAPSHOT_INTERVAL", 20, int)
+        self.node_delta_max: int = self._get_env_var("NODE_DELTA_MAX", 1000, int)
         self.dria_base_url: str = self._get_env_var(
             "DRIA_BASE_URL", "http://0.0.0.0:8005"
         )
+        self.HOLLOWDB_URL: str = self._get_env_var("HOLLOWDB_URL", "http://127.0.0.1:3000")
+        self.HOLLOWDB_SECRET_KEY: str = self._get_env_var("HOLLOWDB_SECRET_KEY", "")
+        self.SYNTHESIS_CHANNEL: str = self._get_env_var("SYNTHESIS_CHANNEL", "synthesis")
+        self.AGGREGATION_CHANNEL: str = self._get_env_var("AGGREGATION_CHANNEL", "aggregation")
+        self.SEARCH_CHANNEL: str = self._get_env_var("SEARCH_CHANNEL", "search")
+        self.FEEDBACK_CHANNEL: str = self._get_env_var("FEEDBACK_CHANNEL", "node-feedback")
+        self.RABBITMQ_HOST: str = self._get_env_var("RABBITMQ_HOST", "localhost")
+        self.RABBITMQ_PORT: int = self._get_env_var("RABBITMQ_PORT", 5671, int)
+        self.RABBITMQ_USERNAME: str = self._get_env_var("RABBITMQ_USERNAME", "guest")
+        self.RABBITMQ_PASSWORD: str = self._get_env_var("RABBITMQ_PASSWORD", "guest")
+        self.config_file: str = self._get_env_var("CONFIG_FILE", "")
+        self.metrics_host: str = self._get_env_var("METRICS_HOST", "127.0.0.1")
+        self.metrics_port: int = self._get_env_var("METRICS_PORT", 9464, int)
+        self.metrics_interval: float = self._get_env_var("METRICS_INTERVAL", 5, float)
+        self.trace_file: str = self._get_env_var("TRACE_FILE", "")
+        self.trace_sample_rate: float = self._get_env_var("TRACE_SAMPLE_RATE", 1, float)
+        self.profile_dir: str = self._get_env_var("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "dria-profiles"))
+        self.profile_seconds: float = self._get_env_var("PROFILE_SECONDS", 30, float)
+        self.profile_interval: float = self._get_env_var("PROFILE_INTERVAL", 0.01, float)
+        self.profile_allocations: bool = self._get_env_var("PROFILE_ALLOCATIONS", "false").lower() == "true"
+
+        self._validate(vars(self))
+        self._reload_lock = threading.Lock()
+        self._frozen = True
+        if self.config_file:
+            self.reload()
+
+    def __setattr__(self, name: str, value: Any):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"Config is frozen, {name} can only change through reload()")
+        super().__setattr__(name, value)
+
+    def tunables(self) -> Dict[str, Any]:
+        """
+        Current values of the tunables.
+        """
+        return {name: getattr(self, name) for name in self.TUNABLES}
+
+    def reload(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Reload the tunables from a JSON object of names to values. Either all of them change or, if one is
+        invalid, none.
+
+        Args:
+            path (Optional[str]): The file to read, defaults to CONFIG_FILE.
+
+        Returns:
+            Dict[str, Any]: The tunables that changed, with their new values.
+
+        Raises:
+            ValueError: If no file is given, the file is not a JSON object, or a value is not a valid tunable.
+        """
+        path = path or self.config_file
+        if not path:
+            raise ValueError("No config file to reload from, set CONFIG_FILE")
+        with open(path) as f:
+            overrides = json.load(f)
+        if not isinstance(overrides, dict):
+            raise ValueError(f"Expected a JSON object in {path}")
+
+        values = self.tunables()
+        for name, value in overrides.items():
+            if name not in values:
+                raise ValueError(f"{name} is not a tunable, expected one of {', '.join(self.TUNABLES)}")
+            values[name] = self._convert(name, value, type(values[name]))
+        self._validate({**vars(self), **values})
+
+        with self._reload_lock:
+            changed = {name: value for name, value in values.items() if getattr(self, name) != value}
+            for name, value in changed.items():
+                # single attribute writes, so readers on other threads see the old or the new value
+                object.__setattr__(self, name, value)
+        if changed:
+            logger.info(f"Reloaded tunables from {path}: {changed}")
+        return changed
+
+    @staticmethod
+    def _convert(name: str, value: Any, value_type: type) -> Any:
+        """
+        Convert a JSON value to the type of a tunable without losing anything: a bool only from a bool, an int
+        from an int, and a float from an int or a float. Numbers may also be given as strings.
+
+        Args:
+            name (str): The tunable's name.
+            value (Any): The value from the JSON file.
+            value_type (type): The tunable's type.
+
+        Returns:
+            Any: The converted value.
+
+        Raises:
+            ValueError: If the value does not have the tunable's type.
+        """
+        if value_type is bool or isinstance(value, bool):
+            valid = value_type is bool and isinstance(value, bool)
+        elif isinstance(value, str):
+            valid = True
+        elif value_type is float:
+            valid = isinstance(value, (int, float))
+        else:
+            valid = isinstance(value, value_type)
+        if not valid:
+            raise ValueError(f"Invalid value for {name}: expected {value_type.__name__}, got {value!r}")
+        try:
+            return value_type(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid value for {name}: {e}") from e
+
+    @staticmethod
+    def _validate(values: Dict[str, Any]):
+        """
+        Check the values of a config.
+
+        Args:
+            values (Dict[str, Any]): Attribute names to values.
+
+        Raises:
+            ValueError: Listing every invalid value.
+        """
+        checks = [
+            (values["runtime"] in ("thread", "async", "process"), "RUNTIME must be thread, async or process"),
+            (min(values["aggregator_workers"], values["publisher_workers"], values["monitoring_workers"]) >= 0,
+             "worker counts must not be negative"),
+            (values["polling_interval"] > 0, "polling_interval must be positive"),
+            (values["monitoring_interval"] > 0, "monitoring_interval must be positive"),
+            (values["heartbeat_interval"] > 0, "heartbeat_interval must be positive"),
+            (values["heartbeat_poll_interval"] > 0, "heartbeat_poll_interval must be positive"),
+            (values["publisher_batch_size"] >= 1, "publisher_batch_size must be at least 1"),
+            (values["aggregator_concurrency"] >= 1, "aggregator_concurrency must be at least 1"),
+            (values["compute_by_job"] >= 1, "compute_by_job must be at least 1"),
+            (0 < values["redispatch_fraction"] <= 1, "redispatch_fraction must be in (0, 1]"),
+            (values["redundancy_min"] <= values["redundancy_max"], "REDUNDANCY_MIN must not exceed REDUNDANCY_MAX"),
+            (not values["adaptive_redundancy"]
+             or 2 <= values["redundancy_min"] <= values["compute_by_job"] <= values["redundancy_max"],
+             "adaptive redundancy needs 2 <= REDUNDANCY_MIN <= compute_by_job <= REDUNDANCY_MAX"),
+            (values["node_delta_max"] >= 1, "NODE_DELTA_MAX must be at least 1"),
+            (values["drain_timeout"] >= 0, "DRAIN_TIMEOUT must not be negative"),
+            (values["crypto_workers"] >= 0, "CRYPTO_WORKERS must not be negative"),
+            (values["crypto_batch_window"] >= 0, "CRYPTO_BATCH_WINDOW must not be negative"),
+            (0 < values["RABBITMQ_PORT"] < 65536, "RABBITMQ_PORT must be a port number"),
+            (0 <= values["metrics_port"] < 65536, "METRICS_PORT must be a port number, or 0 to disable metrics"),
+            (values["metrics_interval"] > 0, "METRICS_INTERVAL must be positive"),
+            (0 <= values["trace_sample_rate"] <= 1, "TRACE_SAMPLE_RATE must be in [0, 1]"),
+            (values["profile_seconds"] > 0, "PROFILE_SECONDS must be positive"),
+            (values["profile_interval"] > 0, "PROFILE_INTERVAL must be positive"),
+            (values["task_filter"] in ("bloom", "xor8", "xor16"), "TASK_FILTER must be bloom, xor8 or xor16"),
+            (values["task_filter_encoding"] in ("hex", "base64"), "TASK_FILTER_ENCODING must be hex or base64"),
+        ]
+        errors = [message for ok, message in checks if not ok]
+        if errors:
+            raise ValueError(f"Invalid config: {'; '.join(errors)}")
 
     @staticmethod
     def _get_env_var(
@@ -59,5 +273,5 @@ class Config:
             raise e
 
 
-# Load the config once during startup or when needed
+# The process-wide config, loaded once during startup and passed to every role and client
 config = Config()
@@ -1,25 +1,33 @@
 import json
-from typing import List, Union
+from typing import Any, List, Optional
 
 import requests
 
-from src.config import Config
+from src.config import Config, config as shared_config
+from src.utils.metrics import counter, histogram
+from src.utils.tracing import TRACER
 from .errors import HollowDBError
 
+HOLLOWDB_SECONDS = histogram("dria_hollowdb_request_seconds", "Latency of HollowDB calls.", ("operation",))
+HOLLOWDB_ERRORS = counter("dria_hollowdb_errors_total", "HollowDB calls that failed.", ("operation",))
+
 
 class HollowClient:
     """
     A client for interacting with the HollowDB database.
     """
 
-    def __init__(self):
+    def __init__(self, config: Optional[Config] = None):
         """
         Initialize the HollowClient with the configuration.
+
+        Args:
+            config (Optional[Config]): The config with the HollowDB address and key, defaults to the process-wide one.
         """
-        self.config = Config()
+        self.config = config if config is not None else shared_config
         self.__BASE_URL = self.config.HOLLOWDB_URL
 
-    def get_multi(self, keys: List[str], contract_id: str) -> List[Union[str, dict]]:
+    def get_multi(self, keys: List[str], contract_id: str) -> List[Any]:
         """
         Get multiple values corresponding to a list of keys.
 
@@ -28,7 +36,7 @@ class HollowClient:
             contract_id (str): The ID of the contract.
 
         Returns:
-            List[Union[str, dict]]: A list of values corresponding to the provided keys.
+            List[Any]: The JSON values at the provided keys.
 
         Raises:
             HollowDBError: If there is no data at the specified keys.
@@ -41,7 +49,7 @@ class HollowClient:
 
         return response["data"]["result"]
 
-    def get(self, key: str) -> Union[str, dict]:
+    def get(self, key: str) -> Any:
         """
         Get the value corresponding to a single key.
 
@@ -49,7 +57,7 @@ class HollowClient:
             key (str): The key to fetch the value for.
 
         Returns:
-            Union[str, dict]: The value corresponding to the provided key.
+            Any: The JSON value at the provided key, None if there is none.
 
         Raises:
             HollowDBError: If there is no data at the specified key.
@@ -62,13 +70,13 @@ class HollowClient:
 
         return response["data"]["result"]
 
-    def push_contract(self, key: str, value: Union[str, dict]):
+    def push_contract(self, key: str, value: Any):
         """
         Push a new value to an existing key in the contract.
 
         Args:
             key (str): The key to push the value to.
-            value (Union[str, dict]): The value to push.
+            value (Any): The JSON value to push.
         """
         encoded_key = requests.utils.quote(key)
         response = self._fetch(f"{self.__BASE_URL}/get/{encoded_key}", "GET")
@@ -82,13 +90,13 @@ class HollowClient:
         body = json.dumps({"key": key, "value": contract_list, "options": options})
         self._put_or_update(f"{self.__BASE_URL}/put", body)
 
-    def put(self, key: str, value: Union[str, dict]):
+    def put(self, key: str, value: Any):
         """
         Put a new key-value pair in the database.
 
         Args:
             key (str): The key to put the value under.
-            value (Union[str, dict]): The value to put.
+            value (Any): The JSON value to put.
         """
         options = {"expire": None, "blockchain": "none"}
         body = json.dumps({"key": key, "value": value, "options": options})
@@ -128,7 +136,7 @@ class HollowClient:
         except HollowDBError:
             self._fetch(f"{self.__BASE_URL}/update", "POST", body)
 
-    def _fetch(self, url: str, method: str, body: str = None) -> Union[dict, None]:
+    def _fetch(self, url: str, method: str, body: Optional[str] = None) -> dict:
         """
         Helper method to send a request to the HollowDB API.
 
@@ -138,7 +146,7 @@ class HollowClient:
             body (str, optional): The request body as a JSON string (for POST requests).
 
         Returns:
-            Union[dict, None]: The response JSON data or None if an error occurred.
+            dict: The response JSON data.
 
         Raises:
             ValueError: If an invalid HTTP method is provided.
@@ -149,21 +157,24 @@ class HollowClient:
             "x-secret-key": self.config.HOLLOWDB_SECRET_KEY,
         }
 
-        if method == "GET":
-            response = requests.get(url, headers=headers)
-        elif method == "POST":
-            response = requests.post(url, headers=headers, data=body)
-        else:
-            raise ValueError("Invalid method")
-
-        response_json = response.json()
-
-        if response.status_code == 200:
-            if "newBearer" in response_json:
-                self.__auth_token = response_json["newBearer"]
-            return response_json
-        else:
-            raise HollowDBError(
-                f"{url}: Status: {response.status_code} Error: {response_json['message']}",
-                "",
-            )
+        operation = url[len(self.__BASE_URL) + 1:].split("/", 1)[0]
+        with HOLLOWDB_SECONDS.labels(operation).time(HOLLOWDB_ERRORS.labels(operation)), \
+                TRACER.call(f"hollowdb.{operation}"):
+            if method == "GET":
+                response = requests.get(url, headers=headers)
+            elif method == "POST":
+                response = requests.post(url, headers=headers, data=body)
+            else:
+                raise ValueError("Invalid method")
+
+            response_json = response.json()
+
+            if response.status_code == 200:
+                if "newBearer" in response_json:
+                    self.__auth_token = response_json["newBearer"]
+                return response_json
+            else:
+                raise HollowDBError(
+                    f"{url}: Status: {response.status_code} Error: {response_json['message']}",
+                    "",
+                )
@@ -0,0 +1,321 @@
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Latency = Union[float, Callable[[str], float]]
+
+
+class HollowStore:
+    """
+    Key-value storage behind the stand-in HollowDB server.
+
+    Values are kept as JSON text so that every read returns a fresh copy, just like going
+    over the wire. Data lives in memory unless a SQLite path is given.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the store.
+
+        Args:
+            path (Optional[str]): SQLite database path, or None to keep everything in memory.
+        """
+        self._lock = threading.Lock()
+        self._memory: Dict[str, str] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db.commit()
+
+    def get(self, key: str) -> Any:
+        """
+        Get the value at a key.
+
+        Args:
+            key (str): The key to read.
+
+        Returns:
+            Any: The stored value, or None if the key does not exist.
+        """
+        with self._lock:
+            raw = self._read(key)
+        return None if raw is None else json.loads(raw)
+
+    def mget(self, keys: List[str]) -> List[Any]:
+        """
+        Get the values at several keys.
+
+        Args:
+            keys (List[str]): The keys to read.
+
+        Returns:
+            List[Any]: The stored values, with None for missing keys.
+        """
+        with self._lock:
+            raws = [self._read(key) for key in keys]
+        return [None if raw is None else json.loads(raw) for raw in raws]
+
+    def put(self, key: str, value: Any) -> bool:
+        """
+        Put a value at a new key.
+
+        Args:
+            key (str): The key to write.
+            value (Any): A JSON-serializable value.
+
+        Returns:
+            bool: True if written, False if the key already exists.
+        """
+        raw = json.dumps(value)
+        with self._lock:
+            if self._read(key) is not None:
+                return False
+            self._write(key, raw)
+        return True
+
+    def update(self, key: str, value: Any) -> bool:
+        """
+        Replace the value at an existing key.
+
+        Args:
+            key (str): The key to write.
+            value (Any): A JSON-serializable value.
+
+        Returns:
+            bool: True if written, False if the key does not exist.
+        """
+        raw = json.dumps(value)
+        with self._lock:
+            if self._read(key) is None:
+                return False
+            self._write(key, raw)
+        return True
+
+    def clear(self):
+        """
+        Remove every key from the store.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM kv")
+                self._db.commit()
+
+    def close(self):
+        """
+        Close the SQLite connection, if any.
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _read(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return self._memory.get(key)
+        row = self._db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write(self, key: str, raw: str):
+        if self._db is None:
+            self._memory[key] = raw
+            return
+        self._db.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, raw))
+        self._db.commit()
+
+
+class _HollowRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler implementing the HollowDB REST endpoints used by HollowClient.
+    """
+
+    server: "_HollowHTTPServer"
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if not path.startswith("/get/"):
+            self._reply(404, {"message": f"Route GET {path} not found"})
+            return
+        if not self._authorize("get"):
+            return
+        key = urllib.parse.unquote(path[len("/get/"):])
+        self._reply(200, {"data": {"result": self.server.store.get(key)}})
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        route = path.strip("/")
+        if route not in ("mget", "put", "update"):
+            self._reply(404, {"message": f"Route POST {path} not found"})
+            return
+        if not self._authorize(route):
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, {"message": f"Invalid body: {e}"})
+            return
+
+        if route == "mget":
+            if not isinstance(body.get("keys"), list):
+                self._reply(400, {"message": "body must have required property 'keys'"})
+                return
+            self._reply(200, {"data": {"result": self.server.store.mget(body["keys"])}})
+            return
+
+        if "key" not in body or "value" not in body:
+            self._reply(400, {"message": "body must have required properties 'key' and 'value'"})
+            return
+
+        if route == "put":
+            if not self.server.store.put(body["key"], body["value"]):
+                self._reply(400, {"message": f"Key already exists: {body['key']}"})
+                return
+        elif not self.server.store.update(body["key"], body["value"]):
+            self._reply(400, {"message": f"Key does not exist: {body['key']}"})
+            return
+        self._reply(200, {})
+
+    def _authorize(self, route: str) -> bool:
+        """
+        Check the secret key header and apply the injected latency.
+        """
+        delay = self.server.latency(route) if callable(self.server.latency) else self.server.latency
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.headers.get("x-secret-key") != self.server.secret_key:
+            self._reply(401, {"message": "Invalid secret key"})
+            return False
+        return True
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class _HollowHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], store: HollowStore, secret_key: str, latency: Latency):
+        super().__init__(address, _HollowRequestHandler)
+        self.store = store
+        self.secret_key = secret_key
+        self.latency = latency
+
+
+class HollowServer:
+    """
+    A local stand-in for the HollowDB REST server.
+
+    It serves `/get`, `/mget`, `/put` and `/update` with the same response and error shapes as
+    HollowDB, so that HollowClient and TaskManager can run offline, in tests and in load benchmarks.
+
+    Example:
+        with HollowServer(secret_key="secret", latency=0.005) as server:
+            os.environ["HOLLOWDB_URL"] = server.url
+    """
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            secret_key: str = "",
+            store: Optional[HollowStore] = None,
+            latency: Latency = 0.0,
+    ):
+        """
+        Initialize the server, binding to the given address.
+
+        Args:
+            host (str): Host to bind to.
+            port (int): Port to bind to, 0 picks a free port.
+            secret_key (str): Expected value of the `x-secret-key` header.
+            store (Optional[HollowStore]): Backing store, defaults to a new in-memory store.
+            latency (Latency): Seconds to wait before serving each request, or a callable
+                that receives the route name (get, mget, put, update) and returns the delay.
+        """
+        self.store = store if store is not None else HollowStore()
+        self.host = host
+        self._httpd = _HollowHTTPServer((host, port), self.store, secret_key, latency)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL of the running server.
+        """
+        return f"http://{self.host}:{self._httpd.server_port}"
+
+    def start(self) -> "HollowServer":
+        """
+        Start serving requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"HollowDB stand-in listening on {self.url}")
+        return self
+
+    def serve_forever(self):
+        """
+        Serve requests on the calling thread until interrupted.
+        """
+        logger.info(f"HollowDB stand-in listening on {self.url}")
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            self.store.close()
+
+    def stop(self):
+        """
+        Stop serving requests and release the socket.
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "HollowServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in HollowDB server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--secret-key", default="")
+    parser.add_argument("--db", default=None, help="SQLite file to persist data, in-memory if omitted")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of latency per request")
+    args = parser.parse_args()
+
+    server = HollowServer(args.host, args.port, args.secret_key, HollowStore(args.db), args.latency)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
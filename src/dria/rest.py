@@ -1,5 +1,5 @@
 import logging
-from typing import Union
+from typing import Optional, Union
 
 import requests
 
@@ -25,7 +25,7 @@ class DriaClient:
         logging.basicConfig(level=logging.INFO)
         self.session = requests.Session()  # Using session for connection pooling
 
-    def _make_request(self, method: str, endpoint: str, data: Union[dict, list] = None) -> Union[dict, list]:
+    def _make_request(self, method: str, endpoint: str, data: Optional[Union[dict, list]] = None) -> Union[dict, list]:
         """
         Helper method to handle requests.
 
@@ -1,5 +1,23 @@
-from .aggregator import Aggregator
-from .monitor import Monitor
-from .publisher import Publisher
+import importlib
+
+# roles are imported on first access (PEP 562), so that a process only loads the dependencies
+# of the roles it runs
+_LAZY = {
+    "Aggregator": ".aggregator",
+    "Monitor": ".monitor",
+    "Publisher": ".publisher",
+}
 
 __all__ = ["Aggregator", "Monitor", "Publisher"]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
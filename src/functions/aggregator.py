@@ -1,20 +1,87 @@
-import base64
-import json
+import asyncio
+import functools
 import logging
+import os
+import threading
 import time
-from typing import Dict, Optional, List
-
-from fastbloom_rs import BloomFilter
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
 
 from src.config import Config
-from src.models import AggregatorTaskModel
-from src.utils import BertEmbedding
-from src.utils.ec import decrypt_message, recover_public_key, publickey_to_address
+from src.models import AggregatorTaskModel, FilterModel, MessageError, TaskModel
+from src.runtime import AsyncRuntime, Shutdown, Stage, run_stage
+from src.utils.codec import CodecError, TaskResponse, dumps
+from src.utils.crypto_engine import CryptoEngine
+from src.utils.envelope import encode_task
+from src.utils.filters import MembershipFilter, build_filter, decode_filter, encode_filter
+from src.utils.metrics import counter, gauge, histogram
+from src.utils.redundancy import agreement_scores
 from src.utils.task_manager import TaskManager
+from src.utils.tracing import TRACER
 from src.waku import WakuClient
 
+if TYPE_CHECKING:
+    from src.utils.bert import BertEmbedding
+
 logger = logging.getLogger(__name__)
 
+TASK_SECONDS = histogram("dria_task_seconds", "Time from publishing a task to the end of its aggregation.", ("outcome",))
+TASKS_AGGREGATED = counter("dria_tasks_aggregated_total", "Tasks whose aggregation ended.", ("outcome",))
+TASKS_IN_FLIGHT = gauge("dria_tasks_in_flight", "Tasks taken from RabbitMQ and not finished yet.", ("role",))
+
+_RECORD_LOCK = threading.Lock()
+
+
+class ResponseCollection:
+    """
+    State of a task whose responses are still being collected.
+    """
+
+    def __init__(
+            self,
+            task_data: AggregatorTaskModel,
+            required: int,
+            deadline: float,
+            published_at: float,
+            redispatch_at: float,
+            assigned_filter: MembershipFilter,
+    ):
+        self.task_data = task_data
+        self.required = required
+        self.deadline = deadline
+        self.published_at = published_at
+        self.redispatch_at = redispatch_at
+        # the task's filter, followed by the filter of the extra nodes if it was re-dispatched
+        self.filters: List[MembershipFilter] = [assigned_filter]
+        # exact addresses of the assigned nodes, None for tasks published without them
+        self.assigned: Optional[Set[str]] = set(task_data.nodes) if task_data.nodes is not None else None
+        self.redispatched = False
+        self.truthful_nodes: List[dict] = []
+        # texts of the truthful nodes' responses, decoded once when they were accepted
+        self.texts: List[Optional[str]] = []
+        self.responses: Dict[str, Optional[float]] = {}
+        # responses to verify before the ones on the topic
+        self.carried: List[dict] = []
+
+    @property
+    def missing(self) -> int:
+        return max(0, self.required - len(self.truthful_nodes))
+
+    def is_assigned(self, address: str) -> bool:
+        """
+        Whether the task was assigned to a node, exactly if the assigned addresses are known, else by the filters.
+        """
+        if self.assigned is not None:
+            return address in self.assigned
+        return any(assigned_filter.contains(address) for assigned_filter in self.filters)
+
+    def add_nodes(self, extra_filter: MembershipFilter, nodes: List[str]):
+        """
+        Record the extra nodes the task was re-dispatched to.
+        """
+        self.filters.append(extra_filter)
+        if self.assigned is not None:
+            self.assigned.update(nodes)
+
 
 class Aggregator:
     """
@@ -25,62 +92,182 @@ class Aggregator:
         self.config = config
         self.task_manager: Optional[TaskManager] = None
         self.waku: Optional[WakuClient] = None
-        self.bert: Optional[BertEmbedding] = None
-        self.bloom: Optional[BloomFilter] = None
+        self.bert: Optional["BertEmbedding"] = None
+        # shared by the aggregators of this process, so that the responses of all their tasks are batched together
+        self.crypto = CryptoEngine.shared(config)
+        self._in_flight: Set[asyncio.Task] = set()
+        self._processing = False
+        self.shutdown = Shutdown()
+        TASKS_IN_FLIGHT.labels("aggregator").add_function(self.in_flight)
         self._initialize_components()
 
     def _initialize_components(self):
         """
-        Initialize the required components (Task Manager, Waku client, Bert, and Bloom filter).
+        Initialize the required components (Task Manager, Waku client and Bert).
         """
         try:
-            self.task_manager = TaskManager()
+            self.task_manager = TaskManager(self.config)
             logger.info("Task Manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Task Manager: {e}", exc_info=True)
 
         try:
-            self.waku = WakuClient()
+            self.waku = WakuClient(self.config)
             logger.info("Waku Client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Waku Client: {e}", exc_info=True)
 
         try:
-            self.bert = BertEmbedding()
+            # torch and transformers are only imported by processes that run an aggregator
+            from src.utils.bert import BertEmbedding
+
+            self.bert = BertEmbedding.shared()
             logger.info("Bert Embedding initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Bert Embedding: {e}", exc_info=True)
 
+    @classmethod
+    def preload(cls):
+        """
+        Load the embedding model ahead of the workers, which then share it.
+        """
+        from src.utils.bert import BertEmbedding
+
+        BertEmbedding.shared()
+
+    def stages(self) -> List[Stage]:
+        """
+        The stages of the aggregator, one task at a time.
+
+        Returns:
+            List[Stage]: Name, step function and idle delay of each stage.
+        """
+        return [("aggregate", self._aggregate_step, 10)]
+
+    def async_stages(self, runtime: AsyncRuntime) -> List[Stage]:
+        """
+        The stages of the aggregator on the async runtime, which collects responses for up to
+        `aggregator_concurrency` tasks at once.
+
+        Args:
+            runtime (AsyncRuntime): The runtime to run blocking and CPU-bound calls on.
+
+        Returns:
+            List[Stage]: Name, coroutine step function and idle delay of each stage.
+        """
+        return [("aggregate", functools.partial(self._aggregate_async, runtime), 10)]
+
+    def run(self):
+        """Continuously fetch and process tasks, until drained after a shutdown request."""
+        # sleep when there are no tasks, or after an error, so that we don't hammer the system or service
+        run_stage(self._aggregate_step, 10, 10, self.shutdown)
+        self.close()
+
+    def close(self):
+        """
+        Close the connections.
+        """
+        self.crypto.close()
+        if self.task_manager:
+            self.task_manager.close()
+
+    def _aggregate_step(self) -> bool:
+        """
+        Fetch and process the next task.
+
+        Returns:
+            bool: True if a task was processed, False if there was none or shutting down.
+        """
+        if self.shutdown.requested.is_set():
+            return False
+        task = self._fetch_task()
+        if not task:
+            logger.warning("No available tasks")
+            return False
+        self._processing = True
         try:
-            self.bloom = BloomFilter(128, 0.01)
-            logger.info("Bloom Filter initialized successfully")
+            self._log_output(self.process_task(task))
+        finally:
+            self._processing = False
+        return True
+
+    def in_flight(self) -> int:
+        """
+        Number of tasks whose responses are being collected or scored.
+        """
+        return len(self._in_flight) + self._processing
+
+    async def _aggregate_async(self, runtime: AsyncRuntime) -> bool:
+        """
+        Fetch the next task and start processing it in the background, once fewer than
+        `aggregator_concurrency` tasks are in flight.
+
+        On shutdown, no more tasks are fetched and the tasks in flight get until the drain deadline.
+
+        Args:
+            runtime (AsyncRuntime): The runtime to run blocking and CPU-bound calls on.
+
+        Returns:
+            bool: True if a task was started, False if there was none or shutting down.
+        """
+        if self.shutdown.requested.is_set():
+            if self._in_flight:
+                await asyncio.wait(set(self._in_flight), timeout=self.shutdown.remaining())
+            return False
+
+        # the limit is read on every step, so that a reload of the config takes effect at once
+        while len(self._in_flight) >= self.config.aggregator_concurrency:
+            await asyncio.wait(set(self._in_flight), return_when=asyncio.FIRST_COMPLETED)
+        task = await runtime.io(self._fetch_task)
+        if not task:
+            logger.warning("No available tasks")
+            return False
+
+        in_flight = asyncio.create_task(self._process_async(runtime, task))
+        self._in_flight.add(in_flight)
+        in_flight.add_done_callback(self._in_flight.discard)
+        return True
+
+    async def _process_async(self, runtime: AsyncRuntime, task_data: AggregatorTaskModel):
+        """
+        Process a task on the async runtime: polls run on the I/O pool, scoring on the CPU pool,
+        and the waits in between on the event loop.
+
+        Args:
+            runtime (AsyncRuntime): The runtime to run blocking and CPU-bound calls on.
+            task_data (AggregatorTaskModel): Task data
+        """
+        try:
+            if not self._components_ready():
+                return
+            collection = self._start_collection(task_data)
+            while True:
+                delay = await runtime.io(self._poll_responses, collection)
+                if delay is None:
+                    break
+                if self.shutdown.expired:
+                    await runtime.io(self._requeue, collection)
+                    return
+                await asyncio.sleep(min(delay, self.shutdown.remaining() or delay))
+            self._log_output(await runtime.cpu(self._finish_collection, collection))
         except Exception as e:
-            logger.error(f"Failed to initialize Bloom Filter: {e}", exc_info=True)
+            logger.error(f"Error during task processing: {e}", exc_info=True)
+            TRACER.finish("aggregate", task_data.taskId, error=str(e))
 
-    def run(self):
-        """Continuously fetch and process tasks."""
-        while True:
-            try:
-                task = self._fetch_task()
-                if task:
-                    output = self.process_task(AggregatorTaskModel(**task))
-                    if output:
-                        logger.info(f"Task processed successfully: {output}")
-                    else:
-                        logger.error("Failed to process task properly.")
-                else:
-                    logger.warning("No available tasks")
-                    time.sleep(10)  # Sleep to prevent tight loop if no tasks are available
-            except Exception as e:
-                logger.error(f"Error during task fetching and processing: {e}", exc_info=True)
-                time.sleep(10)  # Sleep before retrying to ensure we don't hammer the system or service
-
-    def _fetch_task(self) -> Optional[dict]:
-        """
-        Fetch task from the Task Manager.
+    @staticmethod
+    def _log_output(output: Optional[Dict]):
+        if output:
+            logger.info(f"Task processed successfully: {output}")
+        else:
+            logger.error("Failed to process task properly.")
+
+    def _fetch_task(self) -> Optional[AggregatorTaskModel]:
+        """
+        Fetch task from the Task Manager, validating it once on the way in. Malformed tasks are dropped.
 
         Returns:
-            Optional[Dict]: Task data, or None if no tasks are available or the Task Manager is not initialized.
+            Optional[AggregatorTaskModel]: Task data, or None if no valid task is available or the Task Manager
+                is not initialized.
         """
         if self.task_manager is None:
             logger.warning("Task Manager is not initialized, cannot fetch tasks.")
@@ -89,8 +276,10 @@ class Aggregator:
         try:
             task = self.task_manager.fetch_aggregation_tasks()
             if task is not None:
-                return task
+                return AggregatorTaskModel.validate(task)
             logger.info(f"No tasks found")
+        except MessageError as e:
+            logger.error(f"Dropping malformed aggregation task: {e}")
         except Exception as e:
             logger.error(f"Error fetching tasks: {e}", exc_info=True)
 
@@ -99,53 +288,307 @@ class Aggregator:
     def process_task(self, task_data: AggregatorTaskModel) -> Optional[Dict]:
         """Process an individual task.
 
+        Responses are collected as they arrive, until the task's `computeBy` (`compute_by_job` by default)
+        verified responses are in or the deadline passes; the first valid answers win. If too few responses
+        have arrived once `redispatch_fraction` of the task's time has elapsed, the task is re-published
+        once to fresh nodes. With adaptive redundancy, the agreement of the scored responses is reported with the
+        node feedback.
+
         Args:
             task_data (AggregatorTaskModel): Task data
 
         Returns:
             Optional[Dict]: Processed task output, or None if task processing failed
         """
-        if not all([self.waku, self.bert, self.bloom]):
-            logger.warning("Required components not initialized, skipping task processing.")
+        if not self._components_ready():
             return None
 
-        if task_data.timestamp < time.time():
-            topic_results = self.waku.get_content_topic(f"/dria/0/{task_data.taskId}/proto")
-            if not topic_results:
-                logger.warning("No topic results found for the task.")
+        collection = self._start_collection(task_data)
+        while True:
+            delay = self._poll_responses(collection)
+            if delay is None:
+                break
+            if self.shutdown.expired:
+                self._requeue(collection)
                 return None
+            time.sleep(min(delay, self.shutdown.remaining() or delay))
+        return self._finish_collection(collection)
+
+    def _requeue(self, collection: ResponseCollection):
+        """
+        Put a task whose collection was cut short by a shutdown back onto the aggregation queue.
+
+        The responses accepted so far, and the filters and addresses of nodes it was re-dispatched to, travel
+        with the task, since they were already taken from the Waku topic.
 
-            bf_bytes = task_data.filter
+        Args:
+            collection (ResponseCollection): The collection state.
+        """
+        message = collection.task_data.to_dict()
+        message["collected"] = collection.truthful_nodes
+        message["extraFilters"] = [
+            encode_filter(extra_filter, self.config.task_filter_encoding).to_dict()
+            for extra_filter in collection.filters[1:]
+        ]
+        if collection.assigned is not None:
+            message["nodes"] = sorted(collection.assigned)
+        if self.task_manager is None:
+            raise RuntimeError("Task Manager is not initialized")
+        if self.task_manager.requeue(self.config.AGGREGATION_CHANNEL, message):
+            logger.info(f"Requeued task {collection.task_data.taskId} with {len(collection.truthful_nodes)} responses")
+        TRACER.finish("aggregate", collection.task_data.taskId, outcome="requeued")
+
+    def _components_ready(self) -> bool:
+        if not all([self.task_manager, self.waku, self.bert]):
+            logger.warning("Required components not initialized, skipping task processing.")
+            return False
+        return True
+
+    def _start_collection(self, task_data: AggregatorTaskModel) -> ResponseCollection:
+        """
+        Start collecting the responses of a task, and its `aggregate` span if it is traced.
+
+        Args:
+            task_data (AggregatorTaskModel): Task data
 
+        Returns:
+            ResponseCollection: The collection state.
+        """
+        TRACER.start(
+            "aggregate", task_data.taskId, parent=task_data.traceparent, requeued=task_data.collected is not None
+        )
+        deadline = task_data.deadline / 1e9
+        published_at = deadline - 60 * self.config.task_timeout_minute
+        collection = ResponseCollection(
+            task_data,
+            required=task_data.computeBy or self.config.compute_by_job,
+            deadline=deadline,
+            published_at=published_at,
+            redispatch_at=published_at + self.config.redispatch_fraction * (deadline - published_at),
+            assigned_filter=decode_filter(task_data.filter),
+        )
+        # state carried over by a task that was requeued on shutdown
+        collection.filters.extend(
+            decode_filter(FilterModel.validate(extra_filter)) for extra_filter in task_data.extraFilters or []
+        )
+        collection.redispatched = bool(task_data.extraFilters)
+        collection.carried = list(task_data.collected or [])
+        return collection
+
+    def _poll_responses(self, collection: ResponseCollection) -> Optional[float]:
+        """
+        Fetch the responses that arrived since the last poll, and re-dispatch the task if it is straggling.
+
+        Args:
+            collection (ResponseCollection): The collection state.
+
+        Returns:
+            Optional[float]: Seconds until the next poll, or None if the collection is done.
+        """
+        if self.waku is None:
+            raise RuntimeError("Waku client is not initialized")
+        task_data = collection.task_data
+        carried, collection.carried = collection.carried, []
+        task_responses = []
+        with TRACER.span("aggregate", task_data.taskId, "poll"):
+            topic_results = self.waku.get_content_topic(f"/dria/0/{task_data.taskId}/proto")
+        for topic_result in carried + topic_results:
             try:
-                for topic_result in topic_results:
-                    topic_result_data = json.loads(base64.b64decode(topic_result["payload"]).decode("utf-8"))
-                    result = decrypt_message(task_data.privateKey, topic_result_data["ciphertext"])
-                    public_key = recover_public_key(topic_result_data["signature"],
-                                                    bytes.fromhex(result))
-                    address = publickey_to_address(public_key)
-
-                    bloom = BloomFilter.from_bytes(bf_bytes.hex.encode("utf-8"), self.bloom.hashes())
-
-                    truthful_nodes = [
-                        result for result in topic_results if bloom.contains(address)
-                    ]
-
-                    if len(truthful_nodes) == self.config.compute_by_job:
-                        texts = [json.loads(base64.b64decode(result["payload"]).decode("utf-8"))["text"] for result in
-                                 truthful_nodes]
-                        texts_embeddings = self.bert.generate_embeddings(texts)
-                        dists = [
-                            self.bert.maxsim(e.unsqueeze(0), texts_embeddings)
-                            for e in texts_embeddings
-                        ]
-                        best_index = dists.index(max(dists))
-                        return truthful_nodes[best_index]
-                    else:
-                        logger.error("Not enough truthful nodes found to process the task.")
-            except Exception as e:
-                logger.error(f"Error processing task: {e}", exc_info=True)
-        else:
-            logger.warning("Task timestamp is in the future, skipping task processing.")
+                task_responses.append(TaskResponse.from_message(topic_result))
+            except CodecError as e:
+                logger.error(f"Error decoding task response: {e}")
+        with TRACER.span("aggregate", task_data.taskId, "verify", responses=len(task_responses)):
+            addresses = self._verify_responses(task_data, task_responses)
+        for response, address in zip(task_responses, addresses):
+            if address is None or address in collection.responses:
+                continue
+            if not collection.is_assigned(address):
+                continue
+            # waku message timestamps are in nanoseconds
+            timestamp = response.message.get("timestamp")
+            collection.responses[address] = timestamp / 1e9 - collection.published_at if timestamp else None
+            collection.truthful_nodes.append(response.message)
+            collection.texts.append(response.text)
+            if len(collection.truthful_nodes) == collection.required:
+                break
+
+        now = time.time()
+        if collection.missing == 0 or now >= collection.deadline:
+            return None
+        if not collection.redispatched and now >= collection.redispatch_at:
+            collection.redispatched = True
+            with TRACER.span("aggregate", task_data.taskId, "redispatch", missing=collection.missing):
+                extra = self._redispatch(task_data, collection.is_assigned, collection.missing)
+            if extra is not None:
+                collection.add_nodes(*extra)
+        return min(self.config.polling_interval, collection.deadline - now)
+
+    def _finish_collection(self, collection: ResponseCollection) -> Optional[Dict]:
+        """
+        Score the collected responses, pick the best one and report the node feedback.
+
+        Args:
+            collection (ResponseCollection): The collection state.
+
+        Returns:
+            Optional[Dict]: The best response, or None if there were too few or scoring failed.
+        """
+        task_data, truthful_nodes, responses = collection.task_data, collection.truthful_nodes, collection.responses
+        if collection.missing:
+            self._report_feedback(task_data, responses)
+            logger.error("Not enough truthful nodes found to process the task.")
+            self._observe_task(collection, "incomplete")
+            return None
+
+        agreement = None
+        outcome = "failed"
+        try:
+            if self.bert is None:
+                raise RuntimeError("Bert Embedding is not initialized")
+            with TRACER.span("aggregate", task_data.taskId, "score", responses=len(truthful_nodes)):
+                texts_embeddings = self.bert.generate_embeddings(collection.texts)
+                pairwise = self.bert.pairwise_maxsim(texts_embeddings)
+                # the response that agrees most with the others wins
+                dists = [sum(row) - row[i] for i, row in enumerate(pairwise.tolist())]
+                # normalized only for the redundancy policy, live or replayed
+                if self.config.adaptive_redundancy or self.config.agreement_record_file:
+                    similarity = self._similarity(pairwise, texts_embeddings.shape[1])
+                    if self.config.adaptive_redundancy:
+                        agreement = dict(zip(responses, agreement_scores(similarity)))
+                    self._record_agreement(task_data, list(responses), similarity)
+            best_index = dists.index(max(dists))
+            outcome = "aggregated"
+            return truthful_nodes[best_index]
+        except Exception as e:
+            logger.error(f"Error processing task: {e}", exc_info=True)
+        finally:
+            self._report_feedback(task_data, responses, agreement)
+            self._observe_task(collection, outcome)
 
         return None
+
+    def _report_feedback(
+            self,
+            task_data: AggregatorTaskModel,
+            responses: Dict[str, Optional[float]],
+            agreement: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Report the node feedback of a task to the publisher that assigned it.
+        """
+        if self.task_manager is None:
+            logger.warning("Task Manager is not initialized, cannot report node feedback.")
+            return
+        self.task_manager.report_node_feedback(task_data.taskId, responses, agreement, queue=task_data.feedbackQueue)
+
+    @staticmethod
+    def _observe_task(collection: ResponseCollection, outcome: str):
+        """
+        Record how a task's aggregation ended, and how long after its publication, and end its `aggregate` span.
+        """
+        TASK_SECONDS.labels(outcome).observe(time.time() - collection.published_at)
+        TASKS_AGGREGATED.labels(outcome).inc()
+        TRACER.finish(
+            "aggregate", collection.task_data.taskId, outcome=outcome, responses=len(collection.truthful_nodes)
+        )
+
+    @staticmethod
+    def _similarity(pairwise, tokens: int) -> List[List[float]]:
+        """
+        Pairwise similarity of the responses: the maxsim of one response against another, averaged over its tokens.
+
+        Args:
+            pairwise: The maxsim of each response against each other, see `BertEmbedding.pairwise_maxsim`.
+            tokens (int): Tokens per response, as padded for embedding.
+
+        Returns:
+            List[List[float]]: `similarity[i][j]` between responses i and j, 1.0 on the diagonal.
+        """
+        similarity = (pairwise / tokens).tolist()
+        for i, row in enumerate(similarity):
+            row[i] = 1.0
+        return similarity
+
+    def _record_agreement(self, task_data: AggregatorTaskModel, nodes: List[str], similarity: List[List[float]]):
+        """
+        Append the agreement of a task to `agreement_record_file`, if set, for replaying redundancy policies.
+        """
+        path = self.config.agreement_record_file
+        if not path:
+            return
+        line = dumps({"taskId": task_data.taskId, "nodes": nodes, "similarity": similarity}) + b"\n"
+        try:
+            # a single write of the whole line to a descriptor opened for appending, so that the lines of
+            # aggregators in other processes do not interleave; the lock orders the threads of this one
+            with _RECORD_LOCK:
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            logger.error(f"Failed to record the agreement of task {task_data.taskId}: {e}", exc_info=True)
+
+    def _verify_responses(self, task_data: AggregatorTaskModel, responses: List[TaskResponse]) -> List[Optional[str]]:
+        """
+        Decrypt task responses and recover the addresses of the nodes that signed them, as one batch.
+
+        Args:
+            task_data (AggregatorTaskModel): Task data
+            responses (List[TaskResponse]): The decoded responses.
+
+        Returns:
+            List[Optional[str]]: The node addresses in input order, None where a response could not be verified.
+        """
+        if not responses:
+            return []
+        deadline = task_data.deadline / 1e9
+        verified = self.crypto.verify(
+            [(response.ciphertext, response.signature, task_data.privateKey, deadline) for response in responses]
+        )
+        return [verified.address(index) for index in range(len(responses))]
+
+    def _redispatch(
+            self, task_data: AggregatorTaskModel, is_assigned: Callable[[str], bool], missing: int
+    ) -> Optional[Tuple[MembershipFilter, List[str]]]:
+        """
+        Re-publish a straggling task to nodes it was not assigned to yet.
+
+        The task goes out again with the same id and deadline, and a new filter that admits only the
+        extra nodes, so that the originally assigned nodes do not compute it twice.
+
+        Args:
+            task_data (AggregatorTaskModel): Task data
+            is_assigned (Callable[[str], bool]): Whether the task is already assigned to a node.
+            missing (int): Number of responses still missing.
+
+        Returns:
+            Optional[Tuple[MembershipFilter, List[str]]]: The filter and addresses of the extra nodes, or None if
+                the task could not be re-published.
+        """
+        try:
+            if self.task_manager is None or self.waku is None:
+                raise RuntimeError("Task Manager or Waku client is not initialized")
+            extra_nodes = self.task_manager.pick_extra_nodes(missing, is_assigned)
+            if not extra_nodes:
+                logger.warning(f"No fresh nodes to re-dispatch task {task_data.taskId} to.")
+                return None
+
+            extra_filter = build_filter(extra_nodes, self.config.task_filter)
+
+            task_model = TaskModel(
+                taskId=task_data.taskId,
+                filter=encode_filter(extra_filter, self.config.task_filter_encoding),
+                input=task_data.input,
+                deadline=task_data.deadline,
+                publicKey=task_data.publicKey,
+            )
+            self.waku.push_content_topic(
+                encode_task(self.config.dria_private_key, task_model.to_json()),
+                self.config.input_content_topic,
+            )
+            logger.info(f"Task {task_data.taskId} re-dispatched to {len(extra_nodes)} extra nodes.")
+            return extra_filter, extra_nodes
+        except Exception as e:
+            logger.error(f"Failed to re-dispatch task {task_data.taskId}: {e}", exc_info=True)
+            return None
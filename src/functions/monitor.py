@@ -1,61 +1,134 @@
-import json
+import binascii
 import logging
+import threading
 import time
 import uuid
-from typing import List, Optional
-
-import sha3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
 
 from src.config import Config
-from src.models import NodeModel
-from src.utils import (
-    recover_public_key,
-    sign_address,
-    uncompressed_public_key,
-    str_to_base64,
-    base64_to_json,
-)
+from src.runtime import Shutdown, Stage, worker_index
+from src.utils import sign_address
+from src.utils.codec import CodecError, decode_payload, dumps, encode_signed
+from src.utils.ec import recover_addresses
+from src.utils.metrics import gauge
+from src.utils.node_codec import PackedNodes
+from src.utils.node_registry import NodeRegistry
 from src.utils.task_manager import TaskManager
 from src.waku import WakuClient
 
 logger = logging.getLogger(__name__)
 
+AVAILABLE_NODES = gauge("dria_available_nodes", "Nodes in the registry that answered a recent heartbeat.")
+
+
+class HeartbeatRound:
+    """
+    State of a heartbeat round whose responses are still being collected.
+    """
+
+    def __init__(self, uuid_: str, deadline: float):
+        self.uuid = uuid_
+        self.deadline = deadline
+        self.responders: Set[str] = set()
+        self.polling = False
+
 
 class Monitor:
     """
     Monitor class to handle the monitoring of the node network.
+
+    A single monitor writes the published registry, so that its epochs keep one writer id: the supervisor's
+    first monitor worker in process mode, or the first monitor of the process otherwise. Any other monitor
+    only follows the published registry, without sending heartbeats.
     """
 
+    _writer_lock = threading.Lock()
+    _writer_elected = False
+
     def __init__(self, config: Config):
         self.config = config
         self.task_manager: Optional[TaskManager] = None
         self.waku: Optional[WakuClient] = None
+        self.registry = NodeRegistry(ttl=self._node_ttl())
+        self._rounds: Dict[str, HeartbeatRound] = {}
+        self._rounds_lock = threading.Lock()
+        self._added: List[bytes] = []
+        self._next_round = time.time()
+        self.shutdown = Shutdown()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="heartbeat")
+        self._verify_executor = ThreadPoolExecutor(max_workers=config.verify_workers, thread_name_prefix="verify")
+        self.writer = self._elect_writer()
         self._initialize_clients()
+        self._initialize_registry()
 
     def _initialize_clients(self):
         """
         Initialize the Task Manager and Waku client.
         """
         try:
-            self.task_manager = TaskManager()
+            self.task_manager = TaskManager(self.config)
             logger.info("Task Manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Task Manager: {e}", exc_info=True)
 
         try:
-            self.waku = WakuClient()
+            self.waku = WakuClient(self.config)
             logger.info("Waku Client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Waku Client: {e}", exc_info=True)
 
+    @classmethod
+    def _elect_writer(cls) -> bool:
+        """
+        Whether this monitor is the one that writes the published registry.
+        """
+        index = worker_index()
+        with cls._writer_lock:
+            if cls._writer_elected or index not in (None, 0):
+                return False
+            cls._writer_elected = True
+            return True
+
+    def _initialize_registry(self):
+        """
+        Seed the node registry from the published one, so that a restart does not empty the node pool,
+        and claim a writer id for its epochs, so that readers tell its deltas from those of a previous writer.
+        """
+        if not self.task_manager:
+            return
+        if not self.writer:
+            logger.info("Another monitor writes the node registry, following it")
+            return
+
+        try:
+            existing = self.task_manager.get_available_nodes()
+            if existing is not None:
+                self.registry = NodeRegistry.from_snapshot(
+                    PackedNodes.decode(existing.snapshot()), ttl=self.registry.ttl
+                )
+                logger.info(f"Node registry restored at epoch {self.registry.epoch} with {len(self.registry)} nodes")
+            self.registry.claim()
+            self.task_manager.publish_available_nodes(self.registry, None)
+        except Exception as e:
+            logger.error(f"Failed to initialize node registry: {e}", exc_info=True)
+
+    def _node_ttl(self) -> float:
+        """
+        Seconds after which a node that missed its heartbeats expires, from the current, possibly reloaded,
+        heartbeat and monitoring intervals.
+        """
+        # a round's responses can arrive up to monitoring_interval after it was sent
+        return self.config.node_missed_heartbeats * self.config.heartbeat_interval + self.config.monitoring_interval
+
     @staticmethod
-    def _sign_message(private_key: str, message: str) -> bytes:
+    def _sign_message(private_key: str, message: bytes) -> bytes:
         """
         Sign a message using the provided private key.
 
         Args:
             private_key (str): The private key to use for signing.
-            message (str): The message to sign.
+            message (bytes): The message to sign.
 
         Returns:
             bytes: The signature of the message.
@@ -69,48 +142,159 @@ class Monitor:
             logger.error(f"Error signing message: {e}", exc_info=True)
             raise e
 
+    def stages(self) -> List[Stage]:
+        """
+        The stages of the monitor.
+
+        Returns:
+            List[Stage]: Name, step function and idle delay of each stage.
+        """
+        return [("heartbeat", self._heartbeat_step, self.config.heartbeat_poll_interval)]
+
     def run(self):
         """
-        Periodically sends a heartbeat to the node network and checks for responses.
+        Sends a heartbeat to the node network every `heartbeat_interval` seconds and collects responses.
+
+        Rounds overlap: a new heartbeat goes out on a fixed cadence while the response topics of earlier
+        rounds are still polled, every `heartbeat_poll_interval` seconds, until each round's deadline.
+        Waku calls run on a small thread pool, so a slow call does not hold back the cadence.
+        On shutdown, the registry is published once more before the connections are closed.
         """
-        while True:
-            uuid_ = str(uuid.uuid4())
-            payload = json.dumps(
-                {
-                    "uuid": uuid_,
-                    "deadline": int(time.time() + self.config.monitoring_interval),
-                }
-            )
-            try:
-                signed_uuid = self._sign_message(self.config.dria_private_key, payload)
-            except Exception as e:
-                logger.error(f"Error signing heartbeat payload: {e}", exc_info=True)
-                time.sleep(self.config.polling_interval)
-                continue
+        while not self.shutdown.requested.is_set():
+            now = time.time()
+            self._heartbeat_step()
+            wake = now + self.config.heartbeat_poll_interval
+            if self.writer:
+                wake = min(self._next_round, wake)
+            self.shutdown.requested.wait(max(0.0, wake - time.time()))
+        self.close()
+
+    def close(self):
+        """
+        Publish the registry a last time if this monitor writes it, stop the pending rounds and close the
+        connections.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._verify_executor.shutdown(wait=False, cancel_futures=True)
+        if self.task_manager:
+            if self.writer:
+                try:
+                    self._publish_registry()
+                except Exception as e:
+                    logger.error(f"Failed to publish the node registry on shutdown: {e}", exc_info=True)
+            self.task_manager.close()
+
+    def _heartbeat_step(self) -> bool:
+        """
+        Starts a heartbeat round if one is due, schedules polls of the open rounds and publishes the registry.
+        A monitor that does not write the registry follows the published one instead.
 
-            try:
-                if not self._send_heartbeat(payload, signed_uuid.hex()):
-                    time.sleep(self.config.polling_interval)
-                    continue
+        Returns:
+            bool: Always False, the monitor waits for the next poll after each step.
+        """
+        if not self.writer:
+            self._follow_registry()
+            return False
+
+        now = time.time()
+        try:
+            if now >= self._next_round:
+                self._executor.submit(self._start_round)
+                self._next_round += self.config.heartbeat_interval
+                if self._next_round < now:
+                    # we fell behind, do not burst the missed rounds
+                    self._next_round = now + self.config.heartbeat_interval
+
+            self._collect_rounds(now)
+            self._publish_registry()
+        except Exception as e:
+            logger.error(f"Error during heartbeat process: {e}", exc_info=True)
+        return False
+
+    def _follow_registry(self):
+        """
+        Takes the registry the writing monitor published, as the task manager follows it.
+        """
+        if not self.task_manager:
+            return
+        try:
+            registry = self.task_manager.get_available_nodes()
+            if registry is not None:
+                self.registry = registry
+        except Exception as e:
+            logger.error(f"Error following the node registry: {e}", exc_info=True)
 
-                time.sleep(self.config.monitoring_interval)
+    def _start_round(self) -> Optional[HeartbeatRound]:
+        """
+        Signs and sends a new heartbeat, and registers its round for collection.
 
-                if self._check_heartbeat(uuid_):
-                    logger.info(f"Received heartbeat response for: {uuid_}")
-                else:
-                    logger.error(f"No response received for: {uuid_}")
+        Returns:
+            Optional[HeartbeatRound]: The started round, or None if the heartbeat could not be sent.
+        """
+        uuid_ = str(uuid.uuid4())
+        deadline = time.time() + self.config.monitoring_interval
+        payload = dumps({"uuid": uuid_, "deadline": int(deadline)})
+        try:
+            signed_uuid = self._sign_message(self.config.dria_private_key, payload)
+            if not self._send_heartbeat(payload, signed_uuid):
+                return None
+        except Exception as e:
+            logger.error(f"Error sending heartbeat: {e}", exc_info=True)
+            return None
+
+        heartbeat_round = HeartbeatRound(uuid_, deadline)
+        with self._rounds_lock:
+            self._rounds[uuid_] = heartbeat_round
+        return heartbeat_round
+
+    def _collect_rounds(self, now: float):
+        """
+        Schedules a poll of every open round that is not already being polled, and closes rounds
+        whose deadline (plus one poll interval of grace) has passed.
 
-            except Exception as e:
-                logger.error(f"Error during heartbeat process: {e}", exc_info=True)
-                time.sleep(self.config.polling_interval)
+        Args:
+            now (float): Current time.
+        """
+        with self._rounds_lock:
+            rounds = list(self._rounds.values())
 
-    def _send_heartbeat(self, payload: str, signature: str) -> bool:
+        for heartbeat_round in rounds:
+            if heartbeat_round.polling:
+                continue
+            heartbeat_round.polling = True
+            final = now >= heartbeat_round.deadline + self.config.heartbeat_poll_interval
+            self._executor.submit(self._poll_round, heartbeat_round, final)
+
+    def _poll_round(self, heartbeat_round: HeartbeatRound, final: bool):
+        """
+        Fetches the responses that arrived for a round since the last poll and merges them into the registry.
+
+        Args:
+            heartbeat_round (HeartbeatRound): The round to poll.
+            final (bool): Whether this is the last poll of the round.
+        """
+        try:
+            if self._check_heartbeat(heartbeat_round):
+                logger.debug(f"Received heartbeat responses for: {heartbeat_round.uuid}")
+        except Exception as e:
+            logger.error(f"Error polling heartbeat round {heartbeat_round.uuid}: {e}", exc_info=True)
+        finally:
+            heartbeat_round.polling = False
+            if final:
+                with self._rounds_lock:
+                    self._rounds.pop(heartbeat_round.uuid, None)
+                if heartbeat_round.responders:
+                    logger.info(f"Heartbeat {heartbeat_round.uuid}: {len(heartbeat_round.responders)} responses")
+                else:
+                    logger.error(f"No response received for: {heartbeat_round.uuid}")
+
+    def _send_heartbeat(self, payload: bytes, signature: bytes) -> bool:
         """
         Sends a heartbeat message to the network.
 
         Args:
-            payload (str): The unique identifier for the heartbeat.
-            signature (str): The signature of the payload.
+            payload (bytes): The heartbeat's uuid and deadline as JSON.
+            signature (bytes): The signature of the payload.
 
         Returns:
             bool: True if successful, False otherwise.
@@ -120,67 +304,91 @@ class Monitor:
             return False
 
         status = self.waku.push_content_topic(
-            str_to_base64(signature + payload), self.config.heartbeat_topic
+            encode_signed(signature, payload), self.config.heartbeat_topic
         )
         if not status:
-            logger.error(f"Failed to send heartbeat: {payload}")
+            logger.error(f"Failed to send heartbeat: {payload.decode('utf-8')}")
             return False
 
-        logger.info(f"Sent heartbeat: {payload}")
+        logger.info(f"Sent heartbeat: {payload.decode('utf-8')}")
         return True
 
-    def _check_heartbeat(self, uuid_: str) -> bool:
+    def _check_heartbeat(self, heartbeat_round: HeartbeatRound) -> bool:
         """
-        Checks for a response to a previously sent heartbeat.
+        Checks for new responses to a heartbeat and refreshes the responding nodes in the registry.
 
         Args:
-            uuid_ (str): The unique identifier for the heartbeat.
+            heartbeat_round (HeartbeatRound): The round to check.
 
         Returns:
-            bool: True if a response is received, False otherwise.
+            bool: True if new responses were received, False otherwise.
         """
         if not self.waku:
             logger.warning("Waku client not initialized, skipping heartbeat checking.")
             return False
 
-        topic = self.waku.get_content_topic(f"/dria/0/{uuid_}/proto")
-        if topic:
-            try:
-                nodes_as_address = self._decrypt_nodes(
-                    [base64_to_json(t["payload"]) for t in topic], uuid_
-                )
-                self.task_manager.add_available_nodes(NodeModel(uuid=uuid_, nodes=nodes_as_address))
-
-                return True
-            except Exception as e:
-                logger.error(f"Error processing heartbeat response: {e}", exc_info=True)
-        else:
-            print("ON EMPTY")
-            self.task_manager.add_available_nodes(NodeModel(uuid=uuid_, nodes=[]))
-
-        logger.error(f"Failed to receive heartbeat response: {uuid_}")
-        return False
+        topic = self.waku.get_content_topic(f"/dria/0/{heartbeat_round.uuid}/proto")
+        if not topic:
+            return False
 
-    @staticmethod
-    def _decrypt_nodes(available_nodes: List[str], msg: str) -> List[str]:
+        signatures = []
+        for message in topic:
+            try:
+                signatures.append(decode_payload(message["payload"]))
+            except (CodecError, KeyError) as e:
+                logger.error(f"Failed to decode heartbeat response: {e}")
+        nodes_as_address = [
+            address
+            for address in self._decrypt_nodes(signatures, heartbeat_round.uuid)
+            if address not in heartbeat_round.responders
+        ]
+        heartbeat_round.responders.update(nodes_as_address)
+
+        added = self.registry.observe(nodes_as_address)
+        with self._rounds_lock:
+            self._added.extend(added)
+        return bool(nodes_as_address)
+
+    def _publish_registry(self):
         """
-        Decrypts the available nodes to get the address.
+        Expires nodes that missed too many heartbeats and publishes the registry change since the last call.
+        A heartbeat round without responses does not wipe the registry.
+        """
+        with self._rounds_lock:
+            added, self._added = self._added, []
+        self.registry.ttl = self._node_ttl()
+        removed = self.registry.expire()
+        delta = self.registry.commit(added, removed)
+        AVAILABLE_NODES.set(len(self.registry))
+        if delta is None:
+            return
+
+        logger.info(f"Node registry epoch {delta['epoch']}: +{len(added)} -{len(removed)}, {len(self.registry)} nodes")
+        if self.task_manager:
+            self.task_manager.publish_available_nodes(self.registry, delta)
+
+    def _decrypt_nodes(self, available_nodes: List[bytes], msg: str) -> List[str]:
+        """
+        Recovers the node addresses from their heartbeat response signatures.
+
+        Signatures are verified in batches on the verification pool, straight to uncompressed keys,
+        and keys already seen are mapped to their address from a cache.
 
         Args:
-            available_nodes (List[str]): Encrypted node identifiers.
-            msg (str): Message to decrypt the heartbeat results.
+            available_nodes (List[bytes]): Hex signatures of the heartbeat responses, as ASCII bytes.
+            msg (str): The heartbeat uuid signed by the nodes.
 
         Returns:
-            List[str]: List of decrypted node addresses.
+            List[str]: List of recovered node addresses.
         """
-        node_addresses = []
+        signatures = []
         for node in available_nodes:
             try:
-                public_key = recover_public_key(bytes.fromhex(node), msg)
-                public_key = uncompressed_public_key(public_key)
-                address = sha3.keccak_256(public_key[1:]).digest()[-20:].hex()
-                node_addresses.append(address)
-            except Exception as e:
-                logger.error(f"Failed to decrypt node: {e}", exc_info=True)
-        return node_addresses
+                signatures.append(binascii.unhexlify(node.strip()))
+            except (binascii.Error, ValueError) as e:
+                logger.error(f"Failed to decode node signature: {e}")
 
+        addresses = recover_addresses(
+            signatures, msg.encode("utf-8"), self._verify_executor, self.config.verify_workers
+        )
+        return [address for address in addresses if address is not None]
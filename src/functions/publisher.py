@@ -1,27 +1,67 @@
 import logging
+import queue
+import threading
 import time
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from src.config import Config
-from src.models import TaskModel
-from src.models.models import TaskDeliveryModel
-from src.utils import str_to_base64
-from src.utils.ec import sign_message
+from src.models import MessageError, TaskDeliveryModel, TaskModel
+from src.runtime import Shutdown, Stage, run_stage
+from src.utils.envelope import TaskBatcher, encode_batch, encode_task
+from src.utils.metrics import counter, gauge
+from src.utils.node_registry import NodeRegistry
 from src.utils.task_manager import TaskManager
+from src.utils.tracing import TRACER
 from src.waku import WakuClient
 
 logger = logging.getLogger(__name__)
 
+QUEUE_DEPTH = gauge("dria_queue_depth", "Tasks waiting in the internal queues between stages.", ("queue",))
+TASKS_IN_FLIGHT = gauge("dria_tasks_in_flight", "Tasks taken from RabbitMQ and not finished yet.", ("role",))
+TASKS_PUBLISHED = counter("dria_tasks_published_total", "Tasks pushed to Waku.")
+
 
 class Publisher:
     """
     Publisher class to handle task retrieval and processing.
+
+    Tasks flow through four stages connected by bounded queues, each running on its own thread:
+
+    - drain: fetch a batch of tasks from the synthesis queue
+    - assign: pick nodes and build the Bloom filter
+    - sign: build and sign the task message, or a batch envelope of several tasks
+    - push: push to Waku and hand the tasks over to the aggregators
+
+    Only the drain stage sleeps, and only when the synthesis queue is empty. Tasks are acknowledged to
+    RabbitMQ only once they are pushed or requeued, so that the tasks in the stages are delivered again if
+    the process dies.
+
+    On shutdown the drain stage stops, the other stages finish the tasks already taken until the
+    drain deadline, and whatever is left is put back onto the synthesis queue.
     """
 
     def __init__(self, config: Config):
         self.config = config
         self.task_manager: Optional[TaskManager] = None
         self.waku: Optional[WakuClient] = None
+        # synthesis tasks with the time they were drained, in nanoseconds since the epoch, and their delivery tag
+        self._assign_queue: "queue.Queue[Tuple[int, int, dict]]" = queue.Queue(maxsize=config.publisher_queue_size)
+        self._sign_queue: "queue.Queue[TaskDeliveryModel]" = queue.Queue(maxsize=config.publisher_queue_size)
+        self._push_queue: "queue.Queue[Tuple[List[TaskModel], str]]" = queue.Queue(maxsize=config.publisher_queue_size)
+        self._batcher: Optional[TaskBatcher[TaskModel]] = None
+        # task id -> delivery tag and synthesis message it was assigned from, acknowledged once the task is
+        # published, or requeued as is if it is not
+        self._drained: Dict[str, Tuple[int, dict]] = {}
+        # the drain time of the batch being assigned, and the nodes fetched for it
+        self._batch_ns: Optional[int] = None
+        self._batch_nodes: Optional[NodeRegistry] = None
+        self.shutdown = Shutdown()
+        if config.task_batch_enabled:
+            self._batcher = TaskBatcher(config.task_batch_max_bytes, config.task_batch_flush_interval)
+        stage_queues = (("assign", self._assign_queue), ("sign", self._sign_queue), ("push", self._push_queue))
+        for name, stage_queue in stage_queues:
+            QUEUE_DEPTH.labels(f"publisher_{name}").add_function(stage_queue.qsize)
+        TASKS_IN_FLIGHT.labels("publisher").add_function(self.in_flight)
         self._initialize_clients()
 
     def _initialize_clients(self):
@@ -29,49 +69,125 @@ class Publisher:
         Initialize the Task Manager and Waku client.
         """
         try:
-            self.task_manager = TaskManager()
+            self.task_manager = TaskManager(self.config)
             logger.info("Task Manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Task Manager: {e}", exc_info=True)
 
         try:
-            self.waku = WakuClient()
+            self.waku = WakuClient(self.config)
             logger.info("Waku Client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Waku Client: {e}", exc_info=True)
 
-    def _handle_available_tasks(self):
+    def stages(self) -> List[Stage]:
         """
-        Handle task retrieval and processing if available.
+        The pipeline stages of the publisher.
+
+        Returns:
+            List[Stage]: Name, step function and idle delay of each stage.
         """
+        return [
+            ("drain", self._drain_tasks, self.config.polling_interval),
+            ("assign", self._assign_tasks, 0),
+            ("sign", self._sign_tasks, 0),
+            ("push", self._push_tasks, 0),
+        ]
 
-        try:
-            task = self.task_manager.get_tasks()
-            if task:
-                logger.info(f"{len(task)} tasks retrieved, ready for processing.")
-                task = TaskDeliveryModel(**task)
-                task = self._publish_task(task)
-                self.task_manager.add_aggregator_task(task)
-            time.sleep(self.config.polling_interval)
+    def in_flight(self) -> int:
+        """
+        Number of tasks taken from the synthesis queue and not yet published.
+        """
+        batched = len(self._batcher) if self._batcher is not None else 0
+        return self._assign_queue.qsize() + self._sign_queue.qsize() + self._push_queue.qsize() + batched
 
-        except Exception as e:
-            logger.error(f"Failed to handle available tasks: {e}", exc_info=True)
+    def _drain_tasks(self) -> bool:
+        """
+        Fetch a batch of tasks from the synthesis queue, and apply the node feedback reported by aggregators.
 
-    def _publish_task(self, task: TaskDeliveryModel):
+        Returns:
+            bool: True if any task was fetched, False if the queue was empty or shutting down.
         """
-        Publishes a task to the topic specified in the configuration.
+        if self.shutdown.requested.is_set():
+            return False
+        if self.task_manager is None:
+            logger.warning("Task Manager is not initialized, cannot fetch tasks.")
+            return False
+        self.task_manager.apply_node_feedback()
+        tasks = self.task_manager.fetch_synthesis_tasks(self.config.publisher_batch_size)
+        if tasks:
+            logger.info(f"{len(tasks)} tasks retrieved, ready for processing.")
+        received_ns = time.time_ns()
+        for i, (delivery_tag, task) in enumerate(tasks):
+            # waits while the pipeline is full, which is what bounds the batch in flight
+            if not self._put(self._assign_queue, (received_ns, delivery_tag, task)):
+                self._requeue(tasks=tasks[i:])
+                break
+        return bool(tasks)
 
-        Args:
-            task (TaskDeliveryModel): Task data.
+    def _assign_tasks(self) -> bool:
+        """
+        Assign nodes to the next task. A task is held until there are nodes to assign it to.
+
+        The available nodes are fetched once per drained batch, and again while a task is held.
 
         Returns:
-            TaskModel: Task data if successful, None otherwise.
+            bool: True if a task was assigned, False if there was none waiting.
         """
-        if not self.waku:
-            logger.warning("Waku client not initialized, skipping task publishing.")
-            return
+        # tasks are only drained through the Task Manager
+        if self.task_manager is None:
+            return False
+        try:
+            received_ns, delivery_tag, task = self._assign_queue.get(timeout=self.config.polling_interval)
+        except queue.Empty:
+            return False
+
+        delivery = None
+        while delivery is None:
+            try:
+                if self._batch_ns != received_ns:
+                    self._batch_nodes = self.task_manager.get_available_nodes()
+                    self._batch_ns = received_ns
+                delivery = self.task_manager.assign_task(task, received_ns, self._batch_nodes)
+            except MessageError as e:
+                logger.error(f"Dropping malformed synthesis task: {e}")
+                self.task_manager.ack_task(delivery_tag)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to assign task: {e}", exc_info=True)
+            if delivery is None:
+                self._batch_ns = None
+                if self.shutdown.expired:
+                    self._requeue(tasks=[(delivery_tag, task)])
+                    return True
+                time.sleep(self.config.polling_interval)
+
+        self._drained[delivery.id] = (delivery_tag, task)
+        if not self._put(self._sign_queue, delivery):
+            self._requeue(deliveries=[delivery])
+        return True
+
+    def _sign_tasks(self) -> bool:
+        """
+        Build and sign the message of the next assigned task.
+
+        With `task_batch_enabled`, tasks are collected into one signed envelope instead, which is
+        flushed when it reaches `task_batch_max_bytes` or `task_batch_flush_interval` has passed.
 
+        Returns:
+            bool: True if a task was signed or a batch flushed, False if there was nothing waiting.
+        """
+        batcher = self._batcher
+        timeout = batcher.time_to_flush() if batcher is not None else None
         try:
+            task = self._sign_queue.get(timeout=self.config.polling_interval if timeout is None else timeout)
+        except queue.Empty:
+            if batcher is not None and len(batcher):
+                self._push_batch(batcher.drain())
+                return True
+            return False
+
+        with TRACER.span("publish", task.id, "sign"):
             task_model = TaskModel(
                 taskId=task.id,
                 filter=task.filter,
@@ -79,25 +195,170 @@ class Publisher:
                 deadline=int(time.time_ns() + 60 * 1000000000 * self.config.task_timeout_minute),
                 publicKey=task.public_key if task.public_key[:2] != "0x" else task.public_key[2:],
             )
-            task_json = task_model.json()
-            signature = sign_message(self.config.dria_private_key, task_json)
-            self.waku.push_content_topic(
-                str_to_base64(signature.hex() + task_json),
-                self.config.input_content_topic,
-            )
-            logger.info(f"Task published successfully: {task.id}")
-            return task_model
+            task_json = task_model.to_json()
+            if batcher is None:
+                payload = encode_task(self.config.dria_private_key, task_json)
+        if batcher is None:
+            if not self._put(self._push_queue, ([task_model], payload)):
+                self._requeue(task_models=[task_model])
+            return True
+
+        flushed = batcher.add(task_model, task_json)
+        if flushed:
+            self._push_batch(flushed)
+        if batcher.time_to_flush() == 0:
+            self._push_batch(batcher.drain())
+        return True
+
+    def _push_batch(self, batch: List[Tuple[TaskModel, Union[str, bytes]]]):
+        """
+        Sign a batch of tasks as one envelope and queue it for pushing.
+        """
+        start_ns = time.time_ns()
+        payload = encode_batch(self.config.dria_private_key, [task_json for _, task_json in batch])
+        end_ns = time.time_ns()
+        for task_model, _ in batch:
+            TRACER.record("publish", task_model.taskId, "sign_batch", start_ns, end_ns, tasks=len(batch))
+        task_models = [task_model for task_model, _ in batch]
+        if not self._put(self._push_queue, (task_models, payload)):
+            self._requeue(task_models=task_models)
+
+    def _put(self, stage_queue: queue.Queue, item) -> bool:
+        """
+        Put an item on the queue of the next stage, waiting while it is full, until the drain deadline passes.
+
+        Returns:
+            bool: True if the item was queued, False if the deadline passed first, e.g. because the next stage stopped.
+        """
+        while not self.shutdown.expired:
+            try:
+                # in slices, so that the deadline is seen soon after it passes
+                stage_queue.put(item, timeout=min(0.25, self.config.polling_interval))
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _push_tasks(self) -> bool:
+        """
+        Push the next signed message to Waku and add its tasks to the aggregation queue. If the push fails,
+        its tasks are put back onto the synthesis queue.
+
+        Returns:
+            bool: True if a message was handled, False if there was none waiting.
+        """
+        if self.task_manager is None:
+            return False
+        try:
+            task_models, payload = self._push_queue.get(timeout=self.config.polling_interval)
+        except queue.Empty:
+            return False
+
+        if not self.waku:
+            logger.warning("Waku client not initialized, requeueing the tasks.")
+            self._requeue(task_models=task_models)
+            return True
+
+        start_ns = time.time_ns()
+        try:
+            self.waku.push_content_topic(payload, self.config.input_content_topic)
+            logger.info(f"Tasks published successfully: {', '.join(t.taskId for t in task_models)}")
+            TASKS_PUBLISHED.inc(len(task_models))
         except Exception as e:
-            logger.error(f"Failed to publish task: {e}", exc_info=True)
+            logger.error(f"Failed to publish tasks: {e}", exc_info=True)
+            for task_model in task_models:
+                TRACER.record("publish", task_model.taskId, "push", start_ns, error=str(e), tasks=len(task_models))
+            self._requeue(task_models=task_models)
+            return True
+
+        end_ns = time.time_ns()
+        for task_model in task_models:
+            TRACER.record("publish", task_model.taskId, "push", start_ns, end_ns, tasks=len(task_models))
+
+        for task_model in task_models:
+            self.task_manager.add_aggregator_task(task_model)
+            drained = self._drained.pop(task_model.taskId, None)
+            if drained is not None:
+                self.task_manager.ack_task(drained[0])
+        return True
 
     def run(self):
         """
-        Continuously checks for task availability and processes any found.
+        Runs the publishing pipeline, one thread per stage, until it drained after a shutdown request.
         """
-        while True:
-            try:
-                self._handle_available_tasks()
-            except Exception as e:
-                logger.error(f"An error occurred while checking for tasks: {e}", exc_info=True)
-            finally:
-                time.sleep(self.config.polling_interval)
+        threads = [
+            threading.Thread(target=self._run_stage, args=(name, step, idle), name=f"publisher-{name}", daemon=True)
+            for name, step, idle in self.stages()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.close()
+
+    def _run_stage(self, name: str, step: Callable[[], bool], idle: float):
+        """
+        Run a stage on the current thread. A stage that stops before a shutdown was requested, i.e. that failed,
+        requests one, so that the other stages drain and stop too instead of waiting on it forever.
+        """
+        try:
+            run_stage(step, idle, self.config.polling_interval, self.shutdown)
+        except BaseException as e:
+            logger.error(f"Publisher stage {name} failed: {e}", exc_info=True)
+        finally:
+            if not self.shutdown.requested.is_set():
+                logger.error(f"Publisher stage {name} stopped, stopping the others")
+                self.shutdown.request(self.config.drain_timeout)
+
+    def close(self):
+        """
+        Put the tasks that were taken but not published back onto the synthesis queue, and close the connections.
+        """
+        tasks: List[Tuple[int, dict]] = []
+        while not self._assign_queue.empty():
+            _, delivery_tag, task = self._assign_queue.get_nowait()
+            tasks.append((delivery_tag, task))
+        deliveries: List[TaskDeliveryModel] = []
+        while not self._sign_queue.empty():
+            deliveries.append(self._sign_queue.get_nowait())
+        task_models = [task_model for task_model, _ in self._batcher.drain()] if self._batcher is not None else []
+        while not self._push_queue.empty():
+            task_models.extend(self._push_queue.get_nowait()[0])
+        self._requeue(tasks, deliveries, task_models)
+        if self.task_manager is not None:
+            self.task_manager.close()
+
+    def _requeue(
+            self,
+            tasks: Sequence[Tuple[int, dict]] = (),
+            deliveries: Sequence[TaskDeliveryModel] = (),
+            task_models: Sequence[TaskModel] = (),
+    ):
+        """
+        Put tasks that were taken but will not be published back onto the synthesis queue, from whichever
+        stage they were in, and forget their assignments. Each goes back as the message it was drained as,
+        and its delivery is acknowledged once it is back; one that could not be put back is left to RabbitMQ
+        to deliver again.
+
+        Args:
+            tasks (Sequence[Tuple[int, dict]]): Delivery tags and tasks as drained, not assigned yet.
+            deliveries (Sequence[TaskDeliveryModel]): Assigned tasks, not signed yet.
+            task_models (Sequence[TaskModel]): Signed tasks, not pushed yet.
+        """
+        if self.task_manager is None:
+            # nothing was drained
+            return
+        pending = list(tasks)
+        task_ids = [delivery.id for delivery in deliveries] + [task_model.taskId for task_model in task_models]
+        for task_id in task_ids:
+            pending.append(self._drained.pop(task_id))
+            TRACER.finish("publish", task_id, outcome="requeued")
+            self.task_manager.discard_task(task_id)
+
+        if pending:
+            requeued = 0
+            for delivery_tag, task in pending:
+                if self.task_manager.requeue(self.config.SYNTHESIS_CHANNEL, task):
+                    self.task_manager.ack_task(delivery_tag)
+                    requeued += 1
+            logger.info(f"Requeued {requeued} of {len(pending)} unpublished tasks")
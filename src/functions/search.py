@@ -2,7 +2,7 @@ import json
 import logging
 from typing import Optional
 
-from src.config import Config
+from src.config import Config, config as shared_config
 from src.utils import str_to_base64
 from src.utils.ec import sign_message
 from src.utils.task_manager import TaskManager
@@ -17,8 +17,8 @@ class Search:
 
     """
 
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config if config is not None else shared_config
         self.waku: Optional[WakuClient] = None
         self.task_manager: Optional[TaskManager] = None
 
@@ -27,13 +27,13 @@ class Search:
         Initialize the Task Manager and Waku client.
         """
         try:
-            self.task_manager = TaskManager()
+            self.task_manager = TaskManager(self.config)
             logger.info("Task Manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Task Manager: {e}", exc_info=True)
 
         try:
-            self.waku = WakuClient()
+            self.waku = WakuClient(self.config)
             logger.info("Waku Client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Waku Client: {e}", exc_info=True)
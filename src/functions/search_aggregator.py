@@ -2,10 +2,13 @@ import base64
 import json
 import logging
 import time
-from typing import Optional, Dict
+from typing import Dict, List, Optional
 
-from src.config import Config
+from pydantic import ValidationError
+
+from src.config import Config, config as shared_config
 from src.models.models import SearchTaskModel
+from src.runtime import Shutdown, Stage, run_stage
 from src.utils.ec import decrypt_message, recover_public_key, publickey_to_address
 from src.utils.task_manager import TaskManager
 from src.waku import WakuClient
@@ -14,50 +17,110 @@ logger = logging.getLogger(__name__)
 
 
 class SearchAggregator:
-    def __init__(self):
-        self.config = Config()
+    """
+    Aggregates the responses to search tasks, one task at a time.
+
+    On shutdown no more tasks are fetched. The task in progress is finished if its responses are due before
+    the drain deadline, and put back onto the search queue otherwise.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config if config is not None else shared_config
         self.waku: Optional[WakuClient] = None
         self.task_manager: Optional[TaskManager] = None
+        self.shutdown = Shutdown()
+        self._processing = False
+        self._initialize_clients()
 
     def _initialize_clients(self):
         try:
-            self.task_manager = TaskManager()
+            self.task_manager = TaskManager(self.config)
             logger.info("Task Manager initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Task Manager: {e}", exc_info=True)
 
         try:
-            self.waku = WakuClient()
+            self.waku = WakuClient(self.config)
             logger.info("Waku Client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Waku Client: {e}", exc_info=True)
 
+    def stages(self) -> List[Stage]:
+        """
+        The stages of the search aggregator, one task at a time.
+
+        Returns:
+            List[Stage]: Name, step function and idle delay of each stage.
+        """
+        return [("search", self._search_step, 10)]
+
     def run(self):
-        while True:
+        """Continuously fetch and process search tasks, until drained after a shutdown request."""
+        # sleep when there are no tasks, or after an error, so that we don't hammer the system or service
+        run_stage(self._search_step, 10, 10, self.shutdown)
+        self.close()
+
+    def in_flight(self) -> int:
+        """
+        Number of tasks being processed.
+        """
+        return int(self._processing)
+
+    def _search_step(self) -> bool:
+        """
+        Fetch and process the next search task, once its responses are due.
+
+        A task whose responses are not due by the drain deadline is put back onto the search queue.
+
+        Returns:
+            bool: True if a task was handled, False if there was none or shutting down.
+        """
+        if self.shutdown.requested.is_set():
+            return False
+        if self.task_manager is None:
+            logger.warning("Task Manager is not initialized, cannot fetch tasks.")
+            return False
+        task = self._fetch_queries(self.task_manager)
+        if not task:
+            logger.warning("No available tasks")
+            return False
+        self._processing = True
+        try:
             try:
-                task = self._fetch_queries()
-                if task:
-                    output = self.process_task(SearchTaskModel(**task))
-                    if output:
-                        logger.info(f"Task processed successfully: {output}")
-                    else:
-                        logger.error("Failed to process task properly.")
-                else:
-                    logger.warning("No available tasks")
-                    time.sleep(10)
-            except Exception as e:
-                logger.error(f"Error during task fetching and processing: {e}", exc_info=True)
-                time.sleep(10)
+                task_data = SearchTaskModel(**task)
+            except ValidationError as e:
+                logger.error(f"Dropping malformed search task: {e}")
+                return True
+            while task_data.timestamp >= time.time():
+                if self.shutdown.expired:
+                    if self.task_manager.requeue(self.config.SEARCH_CHANNEL, task):
+                        logger.info(f"Requeued search task {task_data.task_id}")
+                    return True
+                delay = task_data.timestamp - time.time()
+                time.sleep(max(0.0, min(delay, self.config.polling_interval, self.shutdown.remaining() or delay)))
+            output = self.process_task(task_data)
+            if output:
+                logger.info(f"Task processed successfully: {output}")
+            else:
+                logger.error("Failed to process task properly.")
+        finally:
+            self._processing = False
+        return True
+
+    def close(self):
+        if self.task_manager:
+            self.task_manager.close()
 
-    def _fetch_queries(self) -> Optional[dict]:
+    @staticmethod
+    def _fetch_queries(task_manager: TaskManager) -> Optional[dict]:
         try:
-            return self.task_manager.fetch_search_tasks()
+            return task_manager.fetch_search_tasks()
         except Exception as e:
             logger.error(f"An error occurred while fetching tasks: {e}")
             raise
 
     def process_task(self, task_data: SearchTaskModel) -> Optional[Dict]:
-        if not all([self.waku]):
+        if self.waku is None or self.task_manager is None:
             logger.warning("Required components not initialized, skipping task processing.")
             return None
 
@@ -1,5 +1,6 @@
 from .exceptions import WakuClientError, WakuSubscriptionError, WakuContentTopicError
-from .models import TaskModel, NodeModel, AggregatorTaskModel, TaskDeliveryModel, QuestionModel, AggregatorTaskModel
+from .messages import AggregatorTaskModel, FilterModel, MessageError, TaskDeliveryModel, TaskModel
+from .models import NodeModel, QuestionModel
 
 __all__ = [
     "TaskModel",
@@ -8,6 +9,8 @@ __all__ = [
     "WakuContentTopicError",
     "NodeModel",
     "AggregatorTaskModel",
+    "FilterModel",
+    "MessageError",
     "TaskDeliveryModel",
     "QuestionModel"
 ]
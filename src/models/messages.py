@@ -0,0 +1,205 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.codec import dumps
+
+
+class MessageError(ValueError):
+    """Raised when a message from outside the admin node does not have the expected fields."""
+
+
+class Struct:
+    """
+    A slotted message of the task pipeline.
+
+    Messages built by the admin node itself are trusted and skip validation. Messages that come in from
+    RabbitMQ or Waku go through `validate` once, at that boundary.
+    """
+
+    __slots__: Tuple[str, ...] = ()
+
+    # field name, expected type, and whether it is optional
+    _schema: Tuple[Tuple[str, type, bool], ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The message as a dict, with nested messages as dicts, leaving out optional fields that are None.
+        """
+        data = {}
+        for name, kind, optional in self._schema:
+            value = getattr(self, name)
+            if value is None and optional:
+                continue
+            data[name] = value.to_dict() if isinstance(value, Struct) else value
+        return data
+
+    def to_json(self) -> bytes:
+        """
+        The message as compact UTF-8 JSON.
+        """
+        return dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """
+        Build a message from a trusted dict, such as one produced by `to_dict`, without validation.
+        """
+        return cls(**{
+            name: kind.from_dict(data[name]) if issubclass(kind, Struct) and name in data else data.get(name)
+            for name, kind, _ in cls._schema
+        })
+
+    @classmethod
+    def validate(cls, data: Any):
+        """
+        Build a message from untrusted data.
+
+        Args:
+            data (Any): The decoded JSON of the message.
+
+        Returns:
+            The message.
+
+        Raises:
+            MessageError: If a field is missing or has the wrong type.
+        """
+        if not isinstance(data, dict):
+            raise MessageError(f"{cls.__name__} must be an object, got {type(data).__name__}")
+        fields = {}
+        for name, kind, optional in cls._schema:
+            value = data.get(name)
+            if value is None:
+                if not optional:
+                    raise MessageError(f"{cls.__name__}.{name} is required")
+            elif issubclass(kind, Struct):
+                value = kind.validate(value)
+            elif not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+                raise MessageError(f"{cls.__name__}.{name} must be {kind.__name__}, got {type(value).__name__}")
+            fields[name] = value
+        return cls(**fields)
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class FilterModel(Struct):
+    """
+    The membership filter of the nodes a task is assigned to, see `src.utils.filters`.
+
+    `type` is "bloom" when absent, and Bloom filters carry their number of hashes. The filter's bytes are
+    either hex in `hex`, as in messages from before the filter type was configurable, or base64 in `data`.
+    """
+
+    __slots__ = ("hex", "hashes", "type", "data")
+    _schema = (("hex", str, True), ("hashes", int, True), ("type", str, True), ("data", str, True))
+
+    def __init__(
+            self, hex: Optional[str] = None, hashes: Optional[int] = None, type: Optional[str] = None,
+            data: Optional[str] = None,
+    ):
+        self.hex = hex
+        self.hashes = hashes
+        self.type = type
+        self.data = data
+
+    @classmethod
+    def validate(cls, data: Any) -> "FilterModel":
+        model = super().validate(data)
+        if (model.hex is None) == (model.data is None):
+            raise MessageError("FilterModel must have exactly one of hex and data")
+        if model.type in (None, "bloom") and model.hashes is None:
+            raise MessageError("FilterModel.hashes is required for Bloom filters")
+        return model
+
+
+class TaskDeliveryModel(Struct):
+    """
+    A synthesis task with its assigned nodes, on its way from assignment to signing.
+    """
+
+    __slots__ = ("id", "filter", "prompt", "public_key")
+    _schema = (("id", str, False), ("filter", FilterModel, False), ("prompt", str, False), ("public_key", str, False))
+
+    def __init__(self, id: str, filter: FilterModel, prompt: str, public_key: str):
+        self.id = id
+        self.filter = filter
+        self.prompt = prompt
+        self.public_key = public_key
+
+
+class TaskModel(Struct):
+    """
+    A task as published to the nodes.
+    """
+
+    __slots__ = ("taskId", "filter", "input", "deadline", "publicKey")
+    _schema = (
+        ("taskId", str, False),
+        ("filter", FilterModel, False),
+        ("input", str, False),
+        ("deadline", int, False),
+        ("publicKey", str, False),
+    )
+
+    def __init__(self, taskId: str, filter: FilterModel, input: str, deadline: int, publicKey: str):
+        self.taskId = taskId
+        self.filter = filter
+        self.input = input
+        self.deadline = deadline
+        self.publicKey = publicKey
+
+
+class AggregatorTaskModel(Struct):
+    """
+    A published task waiting for its responses to be aggregated, as read from the aggregation queue.
+    """
+
+    __slots__ = (
+        "taskId", "filter", "input", "deadline", "publicKey", "privateKey", "computeBy", "nodes", "collected",
+        "extraFilters", "traceparent", "feedbackQueue",
+    )
+    _schema = (
+        ("taskId", str, False),
+        ("filter", FilterModel, False),
+        ("input", str, False),
+        ("deadline", int, False),
+        ("publicKey", str, False),
+        ("privateKey", str, False),
+        ("computeBy", int, True),
+        ("nodes", list, True),
+        ("collected", list, True),
+        ("extraFilters", list, True),
+        ("traceparent", str, True),
+        ("feedbackQueue", str, True),
+    )
+
+    def __init__(
+            self,
+            taskId: str,
+            filter: FilterModel,
+            input: str,
+            deadline: int,
+            publicKey: str,
+            privateKey: str,
+            computeBy: Optional[int] = None,
+            nodes: Optional[List[str]] = None,
+            collected: Optional[List[dict]] = None,
+            extraFilters: Optional[List[dict]] = None,
+            traceparent: Optional[str] = None,
+            feedbackQueue: Optional[str] = None,
+    ):
+        self.taskId = taskId
+        self.filter = filter
+        self.input = input
+        self.deadline = deadline
+        self.publicKey = publicKey
+        self.privateKey = privateKey
+        self.computeBy = computeBy
+        self.nodes = nodes
+        self.collected = collected
+        self.extraFilters = extraFilters
+        self.traceparent = traceparent
+        self.feedbackQueue = feedbackQueue
@@ -14,41 +14,16 @@ class NodeModel(BaseModel):
         return nodes
 
 
-class FilterModel(BaseModel):
-    hex: str
-    hashes: int
-
-
-class AggregatorTaskModel(BaseModel):
-    taskId: str
-    filter: FilterModel
-    input: str
-    deadline: int
-    publicKey: str
-    privateKey: str
-
-
 class SearchTaskModel(BaseModel):
     task_id: str
     query_id: str
     type: str
     query: str
-
-
-class TaskDeliveryModel(BaseModel):
-    id: str = Field(..., description="The unique identifier for the task.")
-    filter: FilterModel = Field(..., description="The Bloom filter for the task.")
-    prompt: str = Field(..., description="The task prompt.")
-    public_key: str = Field(..., description="The public key for the task.")
+    # when the responses are due, as unix time, and the key and nodes the responses are verified with
+    timestamp: float
+    privateKey: str
+    nodes: List[str]
 
 
 class QuestionModel(BaseModel):
     question: str
-
-
-class TaskModel(BaseModel):
-    taskId: str
-    filter: FilterModel
-    input: str
-    deadline: int
-    publicKey: str
@@ -1,20 +1,28 @@
 import ssl
+from typing import Optional
 
 import pika
 
-from src.config import Config
+from src.config import Config, config as shared_config
+from src.utils.metrics import counter, histogram
 
-settings = Config()
+RABBITMQ_SECONDS = histogram("dria_rabbitmq_seconds", "Latency of RabbitMQ receives and publishes.", ("operation", "queue"))
+RABBITMQ_ERRORS = counter("dria_rabbitmq_errors_total", "RabbitMQ calls that failed.", ("operation", "queue"))
+RABBITMQ_MESSAGES = counter("dria_rabbitmq_messages_total", "Messages received and published.", ("operation", "queue"))
 
 
-def get_connection():
+def get_connection(config: Optional[Config] = None):
     """
     Get a connection to the RabbitMQ server.
 
+    Args:
+        config: The config with the RabbitMQ address and credentials, defaults to the process-wide one.
+
     Returns:
         A connection to the RabbitMQ server.
 
     """
+    settings = config if config is not None else shared_config
 
     ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
     ssl_context.set_ciphers("ECDHE+AESGCM:!ECDSA")
@@ -27,13 +35,15 @@ def get_connection():
     return connection
 
 
-def create_queue(channel, q_name):
+def create_queue(channel, q_name, exclusive=False):
     """
     Create a queue with the specified name.
 
     Args:
         channel: The channel to create the queue on.
         q_name: The name of the queue to create.
+        exclusive: Whether only this channel's connection may use the queue, which is then deleted when
+            the connection closes.
 
     """
-    channel.queue_declare(queue=q_name)
+    channel.queue_declare(queue=q_name, exclusive=exclusive)
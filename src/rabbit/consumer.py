@@ -1,7 +1,11 @@
-import json
 import logging
+from typing import Optional, Set
 
-from src.rabbit.common import get_connection
+import pika
+
+from src.config import Config, config as shared_config
+from src.rabbit.common import RABBITMQ_ERRORS, RABBITMQ_MESSAGES, RABBITMQ_SECONDS, create_queue, get_connection
+from src.utils.codec import loads
 
 
 class Consumer:
@@ -15,79 +19,162 @@ class Consumer:
 
     """
 
-    def __init__(self):
+    def __init__(self, config: Optional[Config] = None):
         logging.basicConfig(level=logging.INFO)
-        connection = get_connection()
+        self.config = config if config is not None else shared_config
+        connection = get_connection(config)
         self.channel = connection.channel()
+        self._declared: Set[str] = set()
 
-    def receive_message(self, queue, n=1):
+    def receive_message(self, queue, n=1, timeout=None):
         """
-        Receive 'n' messages from the specified queue.
+        Receive up to 'n' messages from the specified queue, waiting at most `timeout` seconds for each.
+
+        The wait is bounded so that callers get control back, and see a stop request, at least once per
+        timeout while the queue is empty.
 
         Args:
             queue: The queue to receive messages from.
             n: The number of messages to receive. Default is 1.
+            timeout: Seconds to wait for a message, defaults to the config's `polling_interval`.
 
+        Returns:
+            The first received message, or None if none arrived in time.
         """
-
-        message_count = 0
         tasks = []
+        if timeout is None:
+            timeout = self.config.polling_interval
+        with RABBITMQ_SECONDS.labels("receive", queue).time(RABBITMQ_ERRORS.labels("receive", queue)):
+            try:
+                for method, properties, body in self.channel.consume(queue, auto_ack=False, inactivity_timeout=timeout):
+                    if method is None:
+                        break
+                    logging.info(f"Received Message {len(tasks) + 1}: {body}")
+                    # Acknowledge that the message has been received
+                    self.channel.basic_ack(delivery_tag=method.delivery_tag)
+                    tasks.append(loads(body))
+                    if len(tasks) >= n:
+                        break
+            finally:
+                # requeues the messages delivered to this consumer but not taken, for the other workers
+                self.channel.cancel()
+        RABBITMQ_MESSAGES.labels("receive", queue).inc(len(tasks))
+        return tasks[0] if tasks else None
+
+    def receive_questions(self, queue, n=1, timeout=None):
+        """
+        Receive 'n' messages from the specified queue, as `receive_message` does.
 
-        def callback(ch, method, properties, body):
-            nonlocal message_count
-            message_count += 1
-            logging.info(f"Received Message {message_count}: {body}")
-
-            # Acknowledge that the message has been received
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-
-            # Stop consuming after 'n' messages
-            if message_count >= n:
-                ch.stop_consuming()
-            json_loaded = json.loads(body.decode("utf-8"))
-            tasks.append(json_loaded)
+        Args:
+            queue: The queue to receive messages from.
+            n: The number of messages to receive. Default is 1.
+            timeout: Seconds to wait for a message, defaults to the config's `polling_interval`.
+        """
+        return self.receive_message(queue, n, timeout)
 
-        # Tell RabbitMQ that this particular callback function should receive messages from our 'hello' queue
-        self.channel.basic_consume(
-            queue=queue, on_message_callback=callback, auto_ack=False
-        )
+    def declare_queue(self, queue, exclusive=False):
+        """
+        Declare a queue once per consumer.
 
-        self.channel.start_consuming()
-        return tasks[0]
+        Args:
+            queue: The queue to declare.
+            exclusive: Whether only this consumer's connection may use the queue, which the broker then
+                deletes when the connection closes.
+        """
+        if queue not in self._declared:
+            create_queue(self.channel, queue, exclusive)
+            self._declared.add(queue)
 
-    def receive_questions(self, queue, n=1):
+    def drain_messages(self, queue, max_n=100):
         """
-        Receive 'n' messages from the specified queue.
+        Receive up to 'max_n' messages from the specified queue without blocking. The messages are
+        acknowledged as they are received, so a message is lost if the caller stops before handling it.
 
         Args:
             queue: The queue to receive messages from.
-            n: The number of messages to receive. Default is 1.
+            max_n: The maximum number of messages to receive. Default is 100.
 
+        Returns:
+            The received messages, possibly none.
         """
+        self.declare_queue(queue)
 
-        message_count = 0
         tasks = []
+        with RABBITMQ_SECONDS.labels("drain", queue).time(RABBITMQ_ERRORS.labels("drain", queue)):
+            for _ in range(max_n):
+                method, properties, body = self.channel.basic_get(queue=queue, auto_ack=True)
+                if method is None:
+                    break
+                tasks.append(loads(body))
+        RABBITMQ_MESSAGES.labels("receive", queue).inc(len(tasks))
+        return tasks
+
+    def drain_deliveries(self, queue, max_n=100):
+        """
+        Receive up to 'max_n' messages from the specified queue without blocking, and without acknowledging
+        them. Each must be acknowledged with `ack` once it is handled. The broker delivers the unacknowledged
+        ones again once this consumer's connection closes, e.g. because its process died.
 
-        def callback(ch, method, properties, body):
-            nonlocal message_count
-            message_count += 1
-            logging.info(f"Received Message {message_count}: {body}")
+        A message that is not valid JSON is acknowledged and dropped.
 
-            # Acknowledge that the message has been received
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+        Args:
+            queue: The queue to receive messages from.
+            max_n: The maximum number of messages to receive. Default is 100.
 
-            # Stop consuming after 'n' messages
-            if message_count >= n:
-                ch.stop_consuming()
-            json_loaded = json.loads(body.decode("utf-8"))
-            tasks.append(json_loaded)
+        Returns:
+            The delivery tag and message of each received message, possibly none.
+        """
+        self.declare_queue(queue)
+
+        deliveries = []
+        with RABBITMQ_SECONDS.labels("drain", queue).time(RABBITMQ_ERRORS.labels("drain", queue)):
+            for _ in range(max_n):
+                method, properties, body = self.channel.basic_get(queue=queue, auto_ack=False)
+                if method is None:
+                    break
+                try:
+                    deliveries.append((method.delivery_tag, loads(body)))
+                except ValueError as e:
+                    logging.error(f"Dropping malformed message from {queue}: {e}")
+                    self.channel.basic_ack(delivery_tag=method.delivery_tag)
+        RABBITMQ_MESSAGES.labels("receive", queue).inc(len(deliveries))
+        return deliveries
+
+    def ack(self, delivery_tag):
+        """
+        Acknowledge a message received with `drain_deliveries`, which removes it from its queue.
 
-        # Tell RabbitMQ that this particular callback function should receive messages from our 'hello' queue
-        self.channel.basic_consume(
-            queue=queue, on_message_callback=callback, auto_ack=False
-        )
+        Args:
+            delivery_tag: The delivery tag of the message.
+        """
+        self.channel.basic_ack(delivery_tag=delivery_tag)
 
-        self.channel.start_consuming()
-        return tasks[0]
+    def queue_depth(self, queue):
+        """
+        Number of messages ready in the specified queue, from a passive declare that does not create it.
+
+        A missing queue counts as empty. The broker closes the channel when it answers a passive declare
+        with an error, so the channel is reopened then, and it keeps working for the following calls.
 
+        Args:
+            queue: The queue to inspect.
 
+        Returns:
+            The message count.
+        """
+        if self.channel.is_closed:
+            self.channel = self.channel.connection.channel()
+        try:
+            return self.channel.queue_declare(queue=queue, passive=True).method.message_count
+        except pika.exceptions.ChannelClosedByBroker as e:
+            self.channel = self.channel.connection.channel()
+            if e.reply_code == 404:
+                return 0
+            raise
+
+    def close(self):
+        """
+        Close the connection to the RabbitMQ server.
+        """
+        if self.channel.connection.is_open:
+            self.channel.connection.close()
@@ -0,0 +1,195 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from src.utils.codec import loads
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBroker:
+    """
+    An in-process stand-in for RabbitMQ, holding one FIFO per queue name.
+
+    Used together with MemoryConsumer and MemoryProducer to run TaskManager offline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[bytes]] = defaultdict(deque)
+
+    def publish(self, queue: str, body: bytes):
+        """
+        Append a message to a queue.
+
+        Args:
+            queue (str): The queue name.
+            body (bytes): The message body.
+        """
+        with self._lock:
+            self._queues[queue].append(body)
+
+    def push_front(self, queue: str, body: bytes):
+        """
+        Put a message back at the head of a queue, as RabbitMQ does with unacknowledged messages.
+
+        Args:
+            queue (str): The queue name.
+            body (bytes): The message body.
+        """
+        with self._lock:
+            self._queues[queue].appendleft(body)
+
+    def get(self, queue: str) -> Optional[bytes]:
+        """
+        Pop the oldest message from a queue.
+
+        Args:
+            queue (str): The queue name.
+
+        Returns:
+            Optional[bytes]: The message body, or None if the queue is empty.
+        """
+        with self._lock:
+            q = self._queues[queue]
+            return q.popleft() if q else None
+
+    def depth(self, queue: str) -> int:
+        """
+        Number of messages waiting in a queue.
+
+        Args:
+            queue (str): The queue name.
+
+        Returns:
+            int: The message count.
+        """
+        with self._lock:
+            return len(self._queues[queue])
+
+
+class MemoryConsumer:
+    """
+    A Consumer backed by a MemoryBroker. Unlike the RabbitMQ consumer, it does not block on an
+    empty queue and returns None instead.
+    """
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self._lock = threading.Lock()
+        self._delivery_tag = 0
+        # delivery tag -> queue and body of the messages not acknowledged yet
+        self._unacked: Dict[int, Tuple[str, bytes]] = {}
+
+    def receive_message(self, queue, n=1, timeout=None):
+        """
+        Receive the oldest message from the specified queue.
+
+        Args:
+            queue: The queue to receive messages from.
+            n: Kept for interface compatibility, a single message is returned.
+            timeout: Kept for interface compatibility, an empty queue returns None at once.
+        """
+        body = self.broker.get(queue)
+        if body is None:
+            return None
+        logger.debug(f"Received Message: {body}")
+        return loads(body)
+
+    def receive_questions(self, queue, n=1, timeout=None):
+        return self.receive_message(queue, n, timeout)
+
+    def declare_queue(self, queue, exclusive=False):
+        """
+        Queues of the in-memory broker exist once used, so there is nothing to declare.
+        """
+
+    def drain_messages(self, queue, max_n=100):
+        """
+        Receive up to 'max_n' messages from the specified queue.
+
+        Args:
+            queue: The queue to receive messages from.
+            max_n: The maximum number of messages to receive. Default is 100.
+        """
+        tasks = []
+        for _ in range(max_n):
+            task = self.receive_message(queue)
+            if task is None:
+                break
+            tasks.append(task)
+        return tasks
+
+    def drain_deliveries(self, queue, max_n=100):
+        """
+        Receive up to 'max_n' messages from the specified queue without acknowledging them. The messages
+        not acknowledged with `ack` go back onto their queue when the consumer is closed.
+
+        Args:
+            queue: The queue to receive messages from.
+            max_n: The maximum number of messages to receive. Default is 100.
+
+        Returns:
+            The delivery tag and message of each received message, possibly none.
+        """
+        deliveries = []
+        for _ in range(max_n):
+            body = self.broker.get(queue)
+            if body is None:
+                break
+            with self._lock:
+                self._delivery_tag += 1
+                self._unacked[self._delivery_tag] = (queue, body)
+                deliveries.append((self._delivery_tag, loads(body)))
+        return deliveries
+
+    def ack(self, delivery_tag):
+        """
+        Acknowledge a message received with `drain_deliveries`.
+
+        Args:
+            delivery_tag: The delivery tag of the message.
+        """
+        with self._lock:
+            self._unacked.pop(delivery_tag)
+
+    def queue_depth(self, queue):
+        """
+        Number of messages waiting in the specified queue.
+
+        Args:
+            queue: The queue to inspect.
+        """
+        return self.broker.depth(queue)
+
+    def close(self):
+        """
+        Put the messages that were not acknowledged back onto their queues, in their original order.
+        """
+        with self._lock:
+            unacked, self._unacked = self._unacked, {}
+        for queue, body in reversed(list(unacked.values())):
+            self.broker.push_front(queue, body)
+
+
+class MemoryProducer:
+    """
+    A Producer backed by a MemoryBroker.
+    """
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+
+    def send_message(self, channel, message):
+        """
+        Send a message to the specified channel.
+
+        Args:
+            channel: The channel to send the message to.
+            message: The message to send, as bytes or a string.
+        """
+        self.broker.publish(channel, message if isinstance(message, bytes) else message.encode())
+
+    def close(self):
+        pass
@@ -1,8 +1,11 @@
 import logging
+from typing import Optional
 
 import pika
 
-from src.rabbit.common import get_connection
+from src.config import Config
+from src.rabbit.common import RABBITMQ_ERRORS, RABBITMQ_MESSAGES, RABBITMQ_SECONDS, get_connection
+from src.utils.tracing import TRACER
 
 
 class Producer:
@@ -15,9 +18,9 @@ class Producer:
 
     """
 
-    def __init__(self):
+    def __init__(self, config: Optional[Config] = None):
         logging.basicConfig(level=logging.INFO)
-        connection = get_connection()
+        connection = get_connection(config)
         self.channel = connection.channel()
 
     def send_message(self, channel, message):
@@ -26,12 +29,22 @@ class Producer:
 
         Args:
             channel: The channel to send the message to.
-            message: The message to send.
+            message: The message to send, as bytes or a string.
         """
-        self.channel.basic_publish(
-            exchange="",
-            routing_key=channel,
-            body=message.encode(),
-            properties=pika.BasicProperties(delivery_mode=2),
-        )  # 2 makes the message persistent
+        with RABBITMQ_SECONDS.labels("publish", channel).time(RABBITMQ_ERRORS.labels("publish", channel)), \
+                TRACER.call("rabbitmq.publish", queue=channel):
+            self.channel.basic_publish(
+                exchange="",
+                routing_key=channel,
+                body=message if isinstance(message, bytes) else message.encode(),
+                properties=pika.BasicProperties(delivery_mode=2),
+            )  # 2 makes the message persistent
+        RABBITMQ_MESSAGES.labels("publish", channel).inc()
         logging.info("Task sent to the queue")
+
+    def close(self):
+        """
+        Close the connection to the RabbitMQ server.
+        """
+        if self.channel.connection.is_open:
+            self.channel.connection.close()
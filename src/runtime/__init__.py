@@ -0,0 +1,7 @@
+from .async_runtime import AsyncRuntime
+from .autoscaler import Autoscaler, ScalingPolicy
+from .stages import Shutdown, Stage, run_stage
+from .supervisor import Supervisor, parse_cpus, worker_index
+
+__all__ = ["AsyncRuntime", "Autoscaler", "ScalingPolicy", "Shutdown", "Stage", "Supervisor", "parse_cpus", "run_stage",
+           "worker_index"]
@@ -0,0 +1,148 @@
+import asyncio
+import functools
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from src.runtime.stages import Shutdown, Stage
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """
+    Runs the stages of all roles as coroutines on one event loop.
+
+    A role exposes `stages()`, whose blocking steps run on the I/O pool, and may expose
+    `async_stages(runtime)` instead, whose steps are coroutines that await their I/O and CPU work
+    through `io` and `cpu`. Waiting (polling intervals, idle delays) never holds a thread.
+    Roles with a `shutdown` (see `Shutdown`) drain on SIGTERM before their `close()` is called.
+    """
+
+    def __init__(self, io_workers: int = 32, cpu_workers: Optional[int] = None, error_delay: float = 5):
+        """
+        Initialize the runtime.
+
+        Args:
+            io_workers (int): Threads for blocking HTTP and AMQP calls.
+            cpu_workers (Optional[int]): Threads for ECIES, signature recovery and embeddings,
+                whose native code releases the GIL. Defaults to the number of CPUs.
+            error_delay (float): Seconds to wait after a step that raised.
+        """
+        self.error_delay = error_delay
+        self._io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+        self._cpu = ThreadPoolExecutor(max_workers=cpu_workers or os.cpu_count() or 1, thread_name_prefix="cpu")
+
+    async def io(self, fn: Callable, *args) -> Any:
+        """
+        Run a blocking call on the I/O pool.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._io, functools.partial(fn, *args))
+
+    async def cpu(self, fn: Callable, *args) -> Any:
+        """
+        Run a CPU-bound call on the CPU pool.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._cpu, functools.partial(fn, *args))
+
+    async def run_stage(self, name: str, step: Callable, idle: float, shutdown: Optional[Shutdown] = None):
+        """
+        Run a stage, until a shutdown is requested and the step has nothing left to do, or the drain
+        deadline passes. Coroutine steps are awaited, plain steps run on the I/O pool.
+
+        Args:
+            name (str): The stage name, for logging.
+            step (Callable): The stage's step.
+            idle (float): Seconds to wait after a step that had nothing to do.
+            shutdown (Optional[Shutdown]): The role's shutdown, the stage runs until cancelled without one.
+        """
+        is_coroutine = asyncio.iscoroutinefunction(step)
+        while shutdown is None or not shutdown.expired:
+            try:
+                if await step() if is_coroutine else await self.io(step):
+                    continue
+                if shutdown is not None and shutdown.requested.is_set():
+                    return
+                await self._idle(idle, shutdown)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"An error occurred in stage {name}: {e}", exc_info=True)
+                await asyncio.sleep(self.error_delay)
+
+    @staticmethod
+    async def _idle(seconds: float, shutdown: Optional[Shutdown]):
+        # sleep in slices, so that a shutdown request cuts the wait short
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not (shutdown is not None and shutdown.requested.is_set()):
+            await asyncio.sleep(min(0.25, deadline - time.monotonic()))
+
+    def role_stages(self, role) -> List[Stage]:
+        """
+        The stages of a role to run on this runtime.
+        """
+        if hasattr(role, "async_stages"):
+            return role.async_stages(self)
+        return role.stages()
+
+    @staticmethod
+    def request_shutdown(roles: list, drain_timeout: float):
+        """
+        Ask the given roles to stop taking new work and drain within `drain_timeout` seconds.
+        """
+        logger.info(f"Shutting down, draining for up to {drain_timeout}s")
+        for role in roles:
+            if getattr(role, "shutdown", None) is not None:
+                role.shutdown.request(drain_timeout)
+
+    async def serve(self, roles: list, drain_timeout: float = 30):
+        """
+        Run the stages of the given roles until they drained after SIGTERM or SIGINT, then close the roles.
+
+        Args:
+            roles (list): Role instances.
+            drain_timeout (float): Seconds the roles get to drain after a signal.
+        """
+        loop = asyncio.get_running_loop()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, self.request_shutdown, roles, drain_timeout)
+
+        stages = [
+            asyncio.create_task(
+                self.run_stage(f"{type(role).__name__}.{name}", step, idle, getattr(role, "shutdown", None)),
+                name=name,
+            )
+            for role in roles
+            for name, step, idle in self.role_stages(role)
+        ]
+        logger.info(f"Async runtime started with {len(stages)} stages")
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            for role in roles:
+                if hasattr(role, "close"):
+                    try:
+                        await self.io(role.close)
+                    except Exception as e:
+                        logger.error(f"Failed to close {type(role).__name__}: {e}", exc_info=True)
+
+    def run(self, roles: list, drain_timeout: float = 30):
+        """
+        Run the stages of the given roles on a new event loop, blocking until they drained after SIGTERM or SIGINT.
+
+        Args:
+            roles (list): Role instances.
+            drain_timeout (float): Seconds the roles get to drain after a signal.
+        """
+        try:
+            asyncio.run(self.serve(roles, drain_timeout))
+        finally:
+            self._io.shutdown(wait=False)
+            self._cpu.shutdown(wait=False)
@@ -0,0 +1,173 @@
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.utils.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+RABBITMQ_QUEUE_DEPTH = gauge("dria_rabbitmq_queue_depth", "Messages ready in a RabbitMQ queue.", ("queue",))
+WORKERS = gauge("dria_workers", "Worker processes of a role.", ("role",))
+DESIRED_WORKERS = gauge("dria_workers_desired", "Worker processes a role's load asks for.", ("role",))
+SCALINGS = counter("dria_autoscaler_scalings_total", "Worker pool resizes.", ("role", "direction"))
+
+
+class ScalingPolicy:
+    """
+    Scaling bounds and targets of one role.
+    """
+
+    def __init__(
+            self,
+            role: type,
+            queue: str,
+            min_workers: int,
+            max_workers: int,
+            tasks_per_worker: float,
+            scale_down_after: float = 60.0,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            role (type): The role class.
+            queue (str): The RabbitMQ queue the role consumes.
+            min_workers (int): Lower bound of workers.
+            max_workers (int): Upper bound of workers.
+            tasks_per_worker (float): Waiting plus in-flight tasks one worker is expected to handle.
+            scale_down_after (float): Seconds the load must stay low before a worker is removed.
+        """
+        if not 0 <= min_workers <= max_workers:
+            raise ValueError(f"Expected 0 <= min_workers <= max_workers, got {min_workers}, {max_workers}")
+        self.role = role
+        self.queue = queue
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.tasks_per_worker = tasks_per_worker
+        self.scale_down_after = scale_down_after
+
+
+class Autoscaler:
+    """
+    Grows and shrinks the worker pools of the supervisor from queue depth and tasks in flight.
+
+    The desired number of workers of a role is its load (messages ready in its queue plus tasks in
+    flight in its workers) divided by `tasks_per_worker`, within the policy's bounds. Pools grow to
+    the desired size at once, and shrink one worker at a time, only while even one worker less would
+    be at most half loaded for `scale_down_after` seconds, so that a fluctuating load does not flap.
+    """
+
+    def __init__(
+            self,
+            supervisor,
+            queue_depth: Callable[[str], int],
+            policies: List[ScalingPolicy],
+            interval: float = 5.0,
+    ):
+        """
+        Initialize the autoscaler.
+
+        Args:
+            supervisor (Supervisor): The supervisor whose pools to scale.
+            queue_depth (Callable[[str], int]): Messages ready in a queue, e.g. `Consumer.queue_depth`.
+            policies (List[ScalingPolicy]): One policy per scaled role.
+            interval (float): Seconds between scaling decisions.
+        """
+        self.supervisor = supervisor
+        self.queue_depth = queue_depth
+        self.policies = policies
+        self.interval = interval
+        self._low_since: Dict[type, Optional[float]] = {policy.role: None for policy in policies}
+        self._metrics: Dict[str, dict] = {
+            policy.role.__name__: {
+                "workers": supervisor.worker_count(policy.role),
+                "desired": None,
+                "queue_depth": None,
+                "in_flight": None,
+                "scale_ups": 0,
+                "scale_downs": 0,
+            }
+            for policy in policies
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def step(self, now: Optional[float] = None):
+        """
+        Take one scaling decision per role.
+
+        Args:
+            now (Optional[float]): Current monotonic time, defaults to the current time.
+        """
+        now = time.monotonic() if now is None else now
+        for policy in self.policies:
+            try:
+                self._scale(policy, now)
+            except Exception as e:
+                logger.error(f"Failed to autoscale {policy.role.__name__}: {e}", exc_info=True)
+
+    def _scale(self, policy: ScalingPolicy, now: float):
+        depth = self.queue_depth(policy.queue)
+        in_flight = self.supervisor.in_flight(policy.role)
+        load = depth + in_flight
+        workers = self.supervisor.worker_count(policy.role)
+        desired = min(policy.max_workers, max(policy.min_workers, math.ceil(load / policy.tasks_per_worker)))
+
+        target = workers
+        if desired > workers:
+            target = desired
+            self._low_since[policy.role] = None
+        elif workers > policy.min_workers and load <= 0.5 * (workers - 1) * policy.tasks_per_worker:
+            low_since = self._low_since[policy.role]
+            if low_since is None:
+                self._low_since[policy.role] = now
+            elif now - low_since >= policy.scale_down_after:
+                target = workers - 1
+                # the next step down needs another full period of low load
+                self._low_since[policy.role] = now
+        else:
+            self._low_since[policy.role] = None
+
+        if target != workers:
+            logger.info(
+                f"Scaling {policy.role.__name__} from {workers} to {target} workers "
+                f"(queue depth {depth}, in flight {in_flight})"
+            )
+            self.supervisor.scale(policy.role, target)
+
+        role = policy.role.__name__
+        RABBITMQ_QUEUE_DEPTH.labels(policy.queue).set(depth)
+        WORKERS.labels(role).set(target)
+        DESIRED_WORKERS.labels(role).set(desired)
+        with self._lock:
+            metrics = self._metrics[role]
+            metrics.update(workers=target, desired=desired, queue_depth=depth, in_flight=in_flight)
+            if target > workers:
+                metrics["scale_ups"] += 1
+                SCALINGS.labels(role, "up").inc()
+            elif target < workers:
+                metrics["scale_downs"] += 1
+                SCALINGS.labels(role, "down").inc()
+
+    def metrics(self) -> Dict[str, dict]:
+        """
+        Scaling state per role.
+
+        Returns:
+            Dict[str, dict]: Role name to its workers, desired workers, queue depth, tasks in flight and
+                the number of scale ups and downs so far.
+        """
+        with self._lock:
+            return {role: dict(metrics) for role, metrics in self._metrics.items()}
+
+    def run(self):
+        """
+        Take scaling decisions every `interval` seconds until `stop` is called.
+        """
+        while not self._stop.wait(self.interval):
+            self.step()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# name, step and idle delay of a role's stage; a step handles one unit of work and returns
+# False if there was nothing to do, after which the runner waits for the idle delay. Steps of
+# `async_stages` are coroutine functions, which only the async runtime runs.
+Stage = Tuple[str, Callable[[], Union[bool, Awaitable[bool]]], float]
+
+
+class Shutdown:
+    """
+    Cooperative shutdown of a role: once requested, the role stops taking new work and drains what it
+    has in flight until the deadline, after which unfinished work is requeued.
+    """
+
+    def __init__(self):
+        self.requested = threading.Event()
+        self.deadline: Optional[float] = None
+
+    def request(self, drain_timeout: float):
+        """
+        Request the shutdown.
+
+        Args:
+            drain_timeout (float): Seconds to finish the work in flight.
+        """
+        if not self.requested.is_set():
+            self.deadline = time.monotonic() + drain_timeout
+            self.requested.set()
+
+    @property
+    def expired(self) -> bool:
+        """
+        Whether the drain deadline has passed.
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self) -> Optional[float]:
+        """
+        Seconds until the drain deadline, or None if no shutdown was requested.
+        """
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+
+def run_stage(step: Callable[[], bool], idle: float, error_delay: float, shutdown: Optional[Shutdown] = None):
+    """
+    Run a stage on the current thread, until a shutdown is requested and the step has nothing left
+    to do, or the drain deadline passes.
+
+    Args:
+        step (Callable[[], bool]): The stage's step.
+        idle (float): Seconds to wait after a step that had nothing to do.
+        error_delay (float): Seconds to wait after a step that raised.
+        shutdown (Optional[Shutdown]): The role's shutdown, the stage runs forever without one.
+    """
+    while shutdown is None or not shutdown.expired:
+        try:
+            if step():
+                continue
+            if shutdown is not None and shutdown.requested.is_set():
+                return
+            if idle:
+                if shutdown is not None:
+                    shutdown.requested.wait(idle)
+                else:
+                    time.sleep(idle)
+        except Exception as e:
+            logger.error(f"An error occurred while processing tasks: {e}", exc_info=True)
+            time.sleep(error_delay)
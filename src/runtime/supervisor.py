@@ -0,0 +1,399 @@
+import gc
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.utils.metrics import snapshot_loop
+from src.utils.profiler import Profiler, request_profile
+from src.utils.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+# index of this process among its role's workers, set in the worker processes of a supervisor
+_worker_index: Optional[int] = None
+
+
+def worker_index() -> Optional[int]:
+    """
+    The index of this worker process among the workers of its role, which a restarted worker keeps.
+
+    Returns:
+        Optional[int]: The index, or None outside a supervisor's worker processes.
+    """
+    return _worker_index
+
+
+def parse_cpus(spec: str) -> List[int]:
+    """
+    Parse a CPU list such as "0-3,6".
+
+    Args:
+        spec (str): Comma separated CPU ids and inclusive ranges, may be empty.
+
+    Returns:
+        List[int]: The CPU ids in order.
+
+    Raises:
+        ValueError: If the list is malformed.
+    """
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+class Worker:
+    """
+    A worker process of the supervisor: one instance of a role, optionally pinned to a CPU.
+    """
+
+    def __init__(self, role: type, index: int, cpus: Sequence[int], in_flight):
+        self.role = role
+        self.index = index
+        self.cpus = list(cpus)
+        # tasks in flight in the worker, as last reported by it
+        self.in_flight = in_flight
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.started_at = 0.0
+        self.restart_at = 0.0
+        self.failures = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.role.__name__.lower()}-{self.index}"
+
+
+def _report_in_flight(instance, in_flight, interval: float):
+    while True:
+        try:
+            in_flight.value = instance.in_flight()
+        except Exception as e:
+            logger.error(f"Failed to report tasks in flight: {e}", exc_info=True)
+        time.sleep(interval)
+
+
+def _reload_config(config):
+    try:
+        config.reload()
+    except Exception as e:
+        logger.error(f"Failed to reload the config: {e}", exc_info=True)
+
+
+def _worker_main(
+        role: type,
+        index: int,
+        config,
+        cpus: List[int],
+        in_flight,
+        drain_timeout: float,
+        metrics_dir: Optional[str] = None,
+        metrics_interval: float = 5.0,
+        profile_dir: Optional[str] = None,
+):
+    """
+    Entry point of a worker process.
+    """
+    global _worker_index
+    _worker_index = index
+    # the supervisor handles SIGINT for the whole process group, and sends SIGTERM to drain a worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+        if "torch" in sys.modules:
+            # do not let intra-op threads of one worker spill onto the other workers' cores
+            sys.modules["torch"].set_num_threads(len(cpus))
+    instance = role(config)
+    if getattr(instance, "shutdown", None) is not None:
+        signal.signal(signal.SIGTERM, lambda *_: instance.shutdown.request(drain_timeout))
+    if hasattr(config, "reload"):
+        signal.signal(signal.SIGHUP, lambda *_: _reload_config(config))
+    if hasattr(instance, "in_flight"):
+        threading.Thread(target=_report_in_flight, args=(instance, in_flight, 1.0), daemon=True).start()
+    if metrics_dir is not None:
+        threading.Thread(
+            target=snapshot_loop,
+            args=(metrics_dir, multiprocessing.current_process().name, metrics_interval),
+            name="metrics",
+            daemon=True,
+        ).start()
+    if profile_dir is not None:
+        profiler = Profiler(profile_dir, multiprocessing.current_process().name, [role])
+        signal.signal(signal.SIGUSR1, lambda *_: profiler.start_requested())
+    instance.run()
+    # worker processes exit without running atexit handlers
+    TRACER.flush()
+
+
+class Supervisor:
+    """
+    Runs each role's workers in separate processes and restarts the ones that exit.
+
+    Roles may define a `preload()` classmethod, which is called once in the supervisor before any
+    worker is forked, to load read-only state (e.g. model weights) that the workers then share
+    copy-on-write. Connections are opened by each worker after the fork. Roles may also define an
+    `in_flight()` method, which workers report back to the supervisor every second, and a `shutdown`
+    (see `Shutdown`), which SIGTERM requests so that the worker drains before it exits. SIGHUP is
+    forwarded to the workers, which reload the tunables of their config. With a `metrics_dir`, each
+    worker writes a snapshot of its metrics there, for the supervisor's metrics server to merge. With a
+    `profile_dir`, `profile` has the workers profile themselves and write the results there. A worker
+    finds its index among its role's workers with `worker_index()`.
+    """
+
+    def __init__(
+            self,
+            config,
+            roles: List[Tuple[type, int, Sequence[int]]],
+            backoff_base: float = 1.0,
+            backoff_max: float = 60.0,
+            stable_after: float = 60.0,
+            drain_timeout: float = 30.0,
+            metrics_dir: Optional[str] = None,
+            metrics_interval: float = 5.0,
+            profile_dir: Optional[str] = None,
+    ):
+        """
+        Initialize the supervisor.
+
+        Args:
+            config: The Config passed to every role.
+            roles (List[Tuple[type, int, Sequence[int]]]): Role class, number of workers and the CPUs
+                to pin them to, round-robin one CPU per worker; no pinning if empty.
+            backoff_base (float): Delay before restarting a worker after its first failure, doubled per failure.
+            backoff_max (float): Maximum restart delay.
+            stable_after (float): Seconds a worker must run before its failure count is reset.
+            drain_timeout (float): Seconds a terminated worker gets to drain before it is killed.
+            metrics_dir (Optional[str]): Directory the workers write their metrics snapshots to, none if not given.
+            metrics_interval (float): Seconds between the metrics snapshots of a worker.
+            profile_dir (Optional[str]): Directory the workers write their profiles to, profiling is off if not given.
+        """
+        self.config = config
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.drain_timeout = drain_timeout
+        self.metrics_dir = metrics_dir
+        self.metrics_interval = metrics_interval
+        self.profile_dir = profile_dir
+        self.workers: List[Worker] = []
+        self._cpus: Dict[type, List[int]] = {}
+        self._retired: List[multiprocessing.process.BaseProcess] = []
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("fork")
+        self._stop = threading.Event()
+        for role, num_workers, cpus in roles:
+            self._cpus[role] = list(cpus)
+            for _ in range(num_workers):
+                self._add_worker(role)
+
+    def _add_worker(self, role: type) -> Worker:
+        indices = {worker.index for worker in self.workers if worker.role is role}
+        index = next(i for i in range(len(indices) + 1) if i not in indices)
+        cpus = self._cpus.get(role) or []
+        pinned = [cpus[index % len(cpus)]] if cpus else []
+        worker = Worker(role, index, pinned, self._context.Value("i", 0, lock=False))
+        self.workers.append(worker)
+        return worker
+
+    def worker_count(self, role: type) -> int:
+        """
+        Number of workers of a role.
+        """
+        with self._lock:
+            return sum(1 for worker in self.workers if worker.role is role)
+
+    def in_flight(self, role: type) -> int:
+        """
+        Tasks in flight in the running workers of a role, as last reported by them.
+        """
+        with self._lock:
+            return sum(
+                worker.in_flight.value for worker in self.workers if worker.role is role and worker.process is not None
+            )
+
+    def scale(self, role: type, num_workers: int):
+        """
+        Grow or shrink the workers of a role. New workers start on the next check, removed ones
+        (the highest indices first) are sent SIGTERM.
+
+        Args:
+            role (type): The role class.
+            num_workers (int): The new number of workers.
+        """
+        with self._lock:
+            workers = sorted((worker for worker in self.workers if worker.role is role), key=lambda w: w.index)
+            for _ in range(len(workers), num_workers):
+                self._add_worker(role)
+            for worker in workers[num_workers:]:
+                self.workers.remove(worker)
+                if worker.process is not None:
+                    worker.process.terminate()
+                    self._retired.append(worker.process)
+                logger.info(f"Retired worker {worker.name}")
+
+    def backoff(self, failures: int) -> float:
+        """
+        Delay before restarting a worker that failed `failures` times in a row.
+        """
+        return min(self.backoff_max, self.backoff_base * 2 ** max(0, failures - 1))
+
+    def _preload(self):
+        for role in {worker.role for worker in self.workers}:
+            preload = getattr(role, "preload", None)
+            if preload is None:
+                continue
+            try:
+                preload()
+                logger.info(f"Preloaded shared state of {role.__name__}")
+            except Exception as e:
+                logger.error(f"Failed to preload {role.__name__}: {e}", exc_info=True)
+        # keep the collector from touching, and so copying, the preloaded objects in the workers
+        gc.collect()
+        gc.freeze()
+
+    def _start(self, worker: Worker):
+        worker.in_flight.value = 0
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker.role, worker.index, self.config, worker.cpus, worker.in_flight, self.drain_timeout, self.metrics_dir,
+                self.metrics_interval, self.profile_dir,
+            ),
+            name=worker.name,
+            daemon=False,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        cpus = f" on CPU {worker.cpus[0]}" if worker.cpus else ""
+        logger.info(f"Started worker {worker.name} (pid {worker.process.pid}){cpus}")
+
+    def _check(self, worker: Worker, now: float):
+        """
+        Restart a worker whose process exited, once its backoff delay has passed.
+        """
+        if worker.process is not None:
+            if worker.process.is_alive():
+                if worker.failures and now - worker.started_at >= self.stable_after:
+                    worker.failures = 0
+                return
+            exitcode = worker.process.exitcode
+            worker.process = None
+            worker.failures += 1
+            delay = self.backoff(worker.failures)
+            worker.restart_at = now + delay
+            logger.error(
+                f"Worker {worker.name} exited with code {exitcode}, "
+                f"restarting in {delay:.1f}s (failure {worker.failures})"
+            )
+        if now >= worker.restart_at:
+            self._start(worker)
+
+    def stop(self):
+        """
+        Stop supervising and terminate the workers.
+        """
+        self._stop.set()
+
+    def reload(self):
+        """
+        Have the running workers reload their config.
+        """
+        with self._lock:
+            processes = [worker.process for worker in self.workers if worker.process is not None]
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+        logger.info(f"Asked {len(processes)} workers to reload their config")
+
+    def profile(self, seconds: float, interval: float = 0.01, allocations: bool = False) -> int:
+        """
+        Have the running workers profile themselves, see `Profiler.start`.
+
+        Returns:
+            int: Number of workers asked to.
+
+        Raises:
+            ValueError: If the supervisor has no `profile_dir`.
+        """
+        if self.profile_dir is None:
+            raise ValueError("Profiling is off, the supervisor has no profile directory")
+        request_profile(self.profile_dir, seconds, interval, allocations)
+        with self._lock:
+            processes = [worker.process for worker in self.workers if worker.process is not None]
+        alive = [process.pid for process in processes if process.is_alive() and process.pid is not None]
+        for pid in alive:
+            os.kill(pid, signal.SIGUSR1)
+        logger.info(f"Asked {len(alive)} workers to profile for {seconds}s")
+        return len(alive)
+
+    def run(self, poll_interval: float = 0.5):
+        """
+        Start the workers and keep them running until `stop` is called or the supervisor gets SIGINT or SIGTERM.
+
+        Args:
+            poll_interval (float): Seconds between checks of the worker processes.
+        """
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: self.stop())
+            signal.signal(signal.SIGHUP, lambda *_: self.reload())
+
+        self._preload()
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                with self._lock:
+                    for worker in self.workers:
+                        self._check(worker, now)
+                    # reap retired workers once they exited
+                    self._retired = [process for process in self._retired if process.is_alive()]
+                self._stop.wait(poll_interval)
+        finally:
+            self._terminate()
+
+    def _terminate(self):
+        with self._lock:
+            processes = [worker.process for worker in self.workers if worker.process is not None] + self._retired
+        alive = [process for process in processes if process.is_alive()]
+        for process in alive:
+            process.terminate()
+        # the workers drain in parallel, leave them a little time beyond the drain timeout to close
+        deadline = time.monotonic() + self.drain_timeout + 5
+        for process in alive:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.name} did not drain in time, killing it")
+                process.kill()
+        logger.info(f"Supervisor stopped {len(alive)} workers")
+
+    def status(self) -> Dict[str, dict]:
+        """
+        State of each worker.
+
+        Returns:
+            Dict[str, dict]: Worker name to its pid, CPUs, consecutive failures and tasks in flight.
+        """
+        with self._lock:
+            return {
+                worker.name: {
+                    "pid": worker.process.pid if worker.process is not None else None,
+                    "cpus": worker.cpus,
+                    "failures": worker.failures,
+                    "in_flight": worker.in_flight.value,
+                }
+                for worker in self.workers
+            }
@@ -1,6 +1,16 @@
-from .bert import BertEmbedding
-from .ec import recover_public_key, sign_address, uncompressed_public_key, generate_task_keys
-from .messaging_utils import base64_to_json, str_to_base64
+import importlib
+
+# attributes are imported on first access (PEP 562), so that e.g. `from src.utils import sign_address`
+# does not pull in torch and transformers through BertEmbedding
+_LAZY = {
+    "BertEmbedding": ".bert",
+    "recover_public_key": ".ec",
+    "sign_address": ".ec",
+    "uncompressed_public_key": ".ec",
+    "generate_task_keys": ".ec",
+    "base64_to_json": ".messaging_utils",
+    "str_to_base64": ".messaging_utils",
+}
 
 __all__ = [
     "BertEmbedding",
@@ -11,3 +21,15 @@ __all__ = [
     "str_to_base64",
     "generate_task_keys"
 ]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,20 +1,47 @@
 import logging
 import random
-from typing import List, Union
+import threading
+from typing import Dict, List, Optional, Union
 
 import numpy as np
 import torch
 from sklearn.metrics.pairwise import cosine_similarity
 from transformers import BertTokenizer, BertModel
 
+from src.utils.metrics import histogram, timed
+
 logger = logging.getLogger(__name__)
 
+EMBEDDING_SECONDS = histogram("dria_embedding_seconds", "Latency of embedding a batch of responses.")
+MAXSIM_SECONDS = histogram("dria_maxsim_seconds", "Latency of one maxsim score.")
+PAIRWISE_MAXSIM_SECONDS = histogram(
+    "dria_pairwise_maxsim_seconds", "Latency of the maxsim scores of all pairs of a task's responses."
+)
+
 
 class BertEmbedding:
     """
     BertEmbedding class to generate embeddings and calculate cosine similarity between vectors
     """
 
+    _shared: Dict[str, "BertEmbedding"] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, model_name="bert-base-uncased") -> "BertEmbedding":
+        """
+        Get the process-wide instance for the given model, loading it on first use
+
+        Loaded before worker processes are forked, the weights are shared between them copy-on-write.
+
+        :param model_name: Model name to use for embeddings, defaults to 'bert-base-uncased'
+        :return: The shared BertEmbedding instance
+        """
+        with cls._shared_lock:
+            if model_name not in cls._shared:
+                cls._shared[model_name] = cls(model_name)
+            return cls._shared[model_name]
+
     def __init__(self, model_name="bert-base-uncased", random_seed=42):
         """
         Initialize the BertEmbedding class with the given model name and random seed
@@ -37,12 +64,13 @@ class BertEmbedding:
             logger.error(f"Error initializing BertEmbedding: {e}", exc_info=True)
             raise e
 
+    @timed(EMBEDDING_SECONDS, None)
     def generate_embeddings(
             self,
             texts: List[str],
             add_special_tokens: bool = True,
             cls_only: bool = False,
-            max_length: int = None,
+            max_length: Optional[int] = None,
     ) -> Union[torch.Tensor, None]:
         """
         Generate embeddings for the given texts
@@ -96,6 +124,7 @@ class BertEmbedding:
             return None
 
     @staticmethod
+    @timed(MAXSIM_SECONDS, None)
     def maxsim(
             query_embeddings: torch.Tensor, doc_embeddings: torch.Tensor
     ) -> Union[float, None]:
@@ -130,3 +159,18 @@ class BertEmbedding:
         except Exception as e:
             logger.error(f"Error calculating maximum cosine similarity: {e}", exc_info=True)
             return None
+
+    @staticmethod
+    @timed(PAIRWISE_MAXSIM_SECONDS, None)
+    def pairwise_maxsim(embeddings: torch.Tensor) -> np.ndarray:
+        """
+        The maxsim of every text against every other, from one cosine similarity of all their tokens,
+        rather than one `maxsim` call per pair
+
+        :param embeddings: Token embeddings of the texts, of shape (texts, tokens, dim)
+        :return: Array of shape (texts, texts) whose [i][j] is the maxsim of text i as query against text j
+        """
+        texts, tokens, _ = embeddings.shape
+        similarity = cosine_similarity(embeddings.numpy().reshape(texts * tokens, -1))
+        # [i, t, j, s] is the similarity of token t of text i and token s of text j
+        return similarity.reshape(texts, tokens, texts, tokens).max(axis=3).sum(axis=1)
@@ -0,0 +1,141 @@
+import binascii
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    import json
+    _HAS_ORJSON = False
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class CodecError(ValueError):
+    """Raised when a message cannot be decoded."""
+
+
+def _default(obj: Any) -> Any:
+    # numpy scalars, e.g. similarity scores
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+if _HAS_ORJSON:
+    def loads(data: Union[Buffer, str]) -> Any:
+        """
+        Parse JSON from bytes, a memoryview or a string, without decoding bytes to a string first.
+        """
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """
+        Serialize to compact UTF-8 JSON.
+        """
+        return orjson.dumps(obj, default=_default)
+else:
+    def loads(data: Union[Buffer, str]) -> Any:
+        """
+        Parse JSON from bytes, a memoryview or a string, without decoding bytes to a string first.
+        """
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+    def dumps(obj: Any) -> bytes:
+        """
+        Serialize to compact UTF-8 JSON.
+        """
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+def decode_payload(payload: Union[str, Buffer]) -> bytes:
+    """
+    Decode the base64 payload of a Waku message to its raw bytes.
+
+    Raises:
+        CodecError: If the payload is not valid base64.
+    """
+    try:
+        return binascii.a2b_base64(payload)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise CodecError(f"Invalid base64 payload: {e}") from e
+
+
+def decode_json_payload(payload: Union[str, Buffer]) -> Any:
+    """
+    Decode the base64 JSON payload of a Waku message, in one pass from base64 to objects.
+
+    Raises:
+        CodecError: If the payload is not valid base64 or JSON.
+    """
+    raw = decode_payload(payload)
+    try:
+        return loads(raw)
+    except ValueError as e:
+        raise CodecError(f"Invalid JSON payload: {e}") from e
+
+
+def encode_payload(data: Buffer) -> str:
+    """
+    Encode raw bytes as the base64 payload of a Waku message.
+    """
+    return binascii.b2a_base64(data, newline=False).decode("ascii")
+
+
+def encode_signed(signature: bytes, body: Union[str, Buffer]) -> str:
+    """
+    Encode a signed message: the hex signature followed by the body, in base64.
+
+    Args:
+        signature (bytes): The signature of the body.
+        body (Union[str, Buffer]): The signed body, strings as UTF-8.
+
+    Returns:
+        str: The Waku payload.
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return encode_payload(binascii.hexlify(signature) + body)
+
+
+def _binary_field(value: Any) -> bytes:
+    # binary fields travel as hex in JSON
+    if isinstance(value, str):
+        return bytes.fromhex(value)
+    return bytes(value)
+
+
+class TaskResponse:
+    """
+    A node's response to a task, decoded once from its Waku message.
+    """
+
+    __slots__ = ("message", "ciphertext", "signature", "text")
+
+    def __init__(self, message: dict, ciphertext: bytes, signature: bytes, text: Optional[str]):
+        self.message = message
+        self.ciphertext = ciphertext
+        self.signature = signature
+        self.text = text
+
+    @classmethod
+    def from_message(cls, message: dict) -> "TaskResponse":
+        """
+        Decode a response from its Waku message.
+
+        Args:
+            message (dict): The Waku message, with the base64 JSON payload under "payload".
+
+        Returns:
+            TaskResponse: The decoded response.
+
+        Raises:
+            CodecError: If the payload is malformed.
+        """
+        try:
+            data = decode_json_payload(message["payload"])
+            return cls(message, _binary_field(data["ciphertext"]), _binary_field(data["signature"]), data.get("text"))
+        except CodecError:
+            raise
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise CodecError(f"Invalid task response: {e}") from e
@@ -0,0 +1,344 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterator, List, Optional, Sequence, Tuple
+
+import coincurve
+
+from src.utils.ec import Decryptor, uncompressed_public_key_to_address
+from src.utils.metrics import counter, histogram
+
+if TYPE_CHECKING:
+    from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+VERIFY_SECONDS = histogram("dria_crypto_verify_seconds", "Latency of verifying a batch of task responses.", ("mode",))
+VERIFIED_RESPONSES = counter("dria_crypto_responses_total", "Task responses verified.", ("outcome",))
+
+ADDRESS_SIZE = 20
+
+# ciphertext, 65-byte recoverable signature over the plaintext's bytes, the task's private key as hex,
+# and the task's deadline as unix time, after which its parsed key can be evicted
+VerifyRecord = Tuple[bytes, bytes, str, Optional[float]]
+
+# one per process, so that each worker parses a task key once
+_decryptor = Decryptor()
+
+
+class VerifiedBatch:
+    """
+    Results of a verified batch, packed: the 20-byte addresses in one buffer, an ok flag per record,
+    and the plaintexts. The address of a record that failed is zeroed, and its plaintext is None.
+    """
+
+    __slots__ = ("addresses", "ok", "plaintexts")
+
+    def __init__(self, addresses: bytes, ok: bytes, plaintexts: List[Optional[str]]):
+        self.addresses = addresses
+        self.ok = ok
+        self.plaintexts = plaintexts
+
+    def __len__(self) -> int:
+        return len(self.ok)
+
+    def address(self, index: int) -> Optional[str]:
+        """
+        The address of a record as a hex string, without 0x, or None if it failed verification.
+        """
+        if not self.ok[index]:
+            return None
+        return self.addresses[index * ADDRESS_SIZE:(index + 1) * ADDRESS_SIZE].hex()
+
+    def __iter__(self) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        for index in range(len(self)):
+            yield self.address(index), self.plaintexts[index]
+
+    def slice(self, start: int, end: int) -> "VerifiedBatch":
+        """
+        The results of the records from `start` to `end`.
+        """
+        return VerifiedBatch(
+            self.addresses[start * ADDRESS_SIZE:end * ADDRESS_SIZE], self.ok[start:end], self.plaintexts[start:end]
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["VerifiedBatch"]) -> "VerifiedBatch":
+        return cls(
+            b"".join(batch.addresses for batch in batches),
+            b"".join(batch.ok for batch in batches),
+            [plaintext for batch in batches for plaintext in batch.plaintexts],
+        )
+
+
+def verify_batch(records: Sequence[VerifyRecord]) -> VerifiedBatch:
+    """
+    Decrypt each response with its task key and recover the address of the node that signed it, in this process.
+
+    The address is the Ethereum address of the recovered public key, the last 20 bytes of the keccak of its
+    uncompressed form, as `recover_address` derives it.
+
+    Args:
+        records (Sequence[VerifyRecord]): Ciphertext, signature, task private key and deadline of each response.
+
+    Returns:
+        VerifiedBatch: The results in input order.
+    """
+    addresses = bytearray(ADDRESS_SIZE * len(records))
+    ok = bytearray(len(records))
+    plaintexts: List[Optional[str]] = []
+    for index, (ciphertext, signature, private_key, deadline) in enumerate(records):
+        try:
+            plaintext = _decryptor.decrypt(private_key, ciphertext, deadline=deadline)
+            if len(signature) != 65:
+                raise ValueError("Signature must be exactly 65 bytes long")
+            public_key = coincurve.PublicKey.from_signature_and_message(signature, bytes.fromhex(plaintext))
+            address = bytes.fromhex(uncompressed_public_key_to_address(public_key.format(compressed=False)))
+        except Exception as e:
+            logger.error(f"Failed to verify response: {e}")
+            plaintexts.append(None)
+            continue
+        addresses[index * ADDRESS_SIZE:(index + 1) * ADDRESS_SIZE] = address
+        ok[index] = 1
+        plaintexts.append(plaintext)
+    return VerifiedBatch(bytes(addresses), bytes(ok), plaintexts)
+
+
+def pool_size(config: "Config") -> int:
+    """
+    Processes of the crypto pool of this process: `crypto_workers` if set, else the cores it may run on. In
+    process mode every aggregator process has a pool of its own, so the cores are split between them.
+    """
+    if config.crypto_workers > 0:
+        return config.crypto_workers
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    if config.runtime == "process":
+        processes = config.aggregator_workers_max if config.autoscale else config.aggregator_workers
+        cores //= max(1, processes)
+    return max(1, cores)
+
+
+class _Request:
+    """
+    Records submitted by one caller, and the future of their results.
+    """
+
+    __slots__ = ("records", "future")
+
+    def __init__(self, records: Sequence[VerifyRecord]):
+        self.records = records
+        self.future: "Future[VerifiedBatch]" = Future()
+
+
+class CryptoEngine:
+    """
+    Verifies batches of task responses across a pool of processes.
+
+    ECIES decryption and public key recovery are CPU-bound, and the Python around them holds the GIL,
+    so separate processes scale with cores where threads do not. A poll of one task yields a handful of
+    responses, so the records submitted by all callers, e.g. the tasks an aggregator collects at once
+    and the aggregators of a process, are gathered for up to `batch_window` seconds into one batch.
+    Batches smaller than `min_batch` are verified inline, where shipping them to another process would
+    cost more than it saves. The pool and the thread that gathers the batches start on first use.
+
+    One engine is shared per process, see `shared`.
+    """
+
+    _shared: Optional["CryptoEngine"] = None
+    _shared_pid = 0
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config: "Config") -> "CryptoEngine":
+        """
+        Get the engine of this process, sized by `pool_size`, creating it on first use.
+
+        Each call must be matched by a `close`; the pool is stopped when the last user closes it.
+
+        Args:
+            config (Config): The config to size the engine by.
+
+        Returns:
+            CryptoEngine: The shared engine.
+        """
+        with cls._shared_lock:
+            # a forked worker starts an engine of its own rather than use the parent's pool
+            if cls._shared is None or cls._shared_pid != os.getpid():
+                cls._shared = cls(pool_size(config), config.crypto_min_batch, config.crypto_batch_window)
+                cls._shared_pid = os.getpid()
+            cls._shared._users += 1
+            return cls._shared
+
+    def __init__(
+            self,
+            workers: Optional[int] = None,
+            min_batch: int = 64,
+            batch_window: float = 0.0,
+            chunks_per_worker: int = 4,
+    ):
+        """
+        Initialize the engine.
+
+        Args:
+            workers (Optional[int]): Processes of the pool, defaults to the number of CPUs; 1 or less verifies inline.
+            min_batch (int): Smallest batch that is sent to the pool.
+            batch_window (float): Seconds that `submit` waits for the records of other callers, 0 to verify each
+                call on its own.
+            chunks_per_worker (int): Chunks per process a batch is split into, so that uneven chunks even out.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.min_batch = min_batch
+        self.batch_window = batch_window
+        self.chunks_per_worker = chunks_per_worker
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._users = 0
+        self._pending: "queue.SimpleQueue[Optional[_Request]]" = queue.SimpleQueue()
+        self._gatherer: Optional[threading.Thread] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawned rather than forked, since the calling process has threads holding locks and connections
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info(f"Started crypto engine with {self.workers} processes")
+            return self._pool
+
+    def verify(self, records: Sequence[VerifyRecord]) -> VerifiedBatch:
+        """
+        Verify the responses of a caller, batched with those of other callers within the batch window.
+
+        Args:
+            records (Sequence[VerifyRecord]): Ciphertext, signature, task private key and deadline of each response.
+
+        Returns:
+            VerifiedBatch: The results in input order.
+        """
+        return self.submit(records).result()
+
+    def submit(self, records: Sequence[VerifyRecord]) -> "Future[VerifiedBatch]":
+        """
+        Submit the responses of a caller, to be verified with those of other callers within the batch window.
+
+        Args:
+            records (Sequence[VerifyRecord]): Ciphertext, signature, task private key and deadline of each response.
+
+        Returns:
+            Future[VerifiedBatch]: The results in input order.
+        """
+        request = _Request(records)
+        if self.workers <= 1 or self.batch_window <= 0 or len(records) >= self.min_batch:
+            # nothing to gain from waiting for other callers
+            self._dispatch([request])
+            return request.future
+        with self._lock:
+            if self._gatherer is None:
+                self._gatherer = threading.Thread(target=self._gather, name="crypto-batches", daemon=True)
+                self._gatherer.start()
+        self._pending.put(request)
+        return request.future
+
+    def _gather(self):
+        """
+        Gather the pending requests into batches: from the first request, until `min_batch` records are
+        pending or `batch_window` has passed.
+        """
+        while True:
+            request = self._pending.get()
+            if request is None:
+                return
+            requests, records = [request], len(request.records)
+            deadline = time.monotonic() + self.batch_window
+            while records < self.min_batch:
+                try:
+                    request = self._pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._dispatch(requests)
+                    return
+                requests.append(request)
+                records += len(request.records)
+            self._dispatch(requests)
+
+    def _dispatch(self, requests: List[_Request]):
+        """
+        Verify the records of some requests as one batch, inline or on the pool, and resolve their futures.
+        """
+        records = [record for request in requests for record in request.records]
+        if self.workers <= 1 or len(records) < self.min_batch:
+            with VERIFY_SECONDS.labels("inline").time():
+                verified = verify_batch(records)
+            self._resolve(requests, verified)
+            return
+
+        chunks = min(len(records), self.workers * self.chunks_per_worker)
+        size = -(-len(records) // chunks)
+        started = time.perf_counter()
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(verify_batch, records[i:i + size]) for i in range(0, len(records), size)]
+        except Exception as e:
+            logger.error(f"Failed to submit a batch to the crypto pool: {e}", exc_info=True)
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        remaining = len(futures)
+        remaining_lock = threading.Lock()
+
+        def chunk_done(_):
+            nonlocal remaining
+            with remaining_lock:
+                remaining -= 1
+                if remaining:
+                    return
+            VERIFY_SECONDS.labels("pool").observe(time.perf_counter() - started)
+            try:
+                verified = VerifiedBatch.concat([future.result() for future in futures])
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                return
+            self._resolve(requests, verified)
+
+        # resolved by the pool's thread, so that the next batch is gathered while this one is verified
+        for future in futures:
+            future.add_done_callback(chunk_done)
+
+    @staticmethod
+    def _resolve(requests: List[_Request], verified: VerifiedBatch):
+        ok = sum(verified.ok)
+        VERIFIED_RESPONSES.labels("ok").inc(ok)
+        VERIFIED_RESPONSES.labels("failed").inc(len(verified) - ok)
+        start = 0
+        for request in requests:
+            end = start + len(request.records)
+            request.future.set_result(verified.slice(start, end))
+            start = end
+
+    def close(self):
+        """
+        Stop the pool's processes, once the last user of a shared engine closes it.
+        """
+        with self._lock:
+            if self._users > 1:
+                self._users -= 1
+                return
+            self._users = 0
+            if self._gatherer is not None:
+                self._pending.put(None)
+                self._gatherer = None
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def __enter__(self) -> "CryptoEngine":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -1,13 +1,21 @@
+import heapq
 import logging
-from typing import Tuple
+import threading
+import time
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 
 import coincurve
 import sha3
 from ecies import decrypt
-from ecies.utils import generate_eth_key
+from ecies.utils import decapsulate, generate_eth_key, sym_decrypt
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 def uncompressed_public_key(public_key: str) -> bytes:
     """
@@ -20,9 +28,7 @@ def uncompressed_public_key(public_key: str) -> bytes:
         ValueError: If the provided public key is invalid.
     """
     try:
-        public_key_bytes = bytes.fromhex(public_key)
-        public_key = coincurve.PublicKey(public_key_bytes)
-        return public_key.format(compressed=False)
+        return coincurve.PublicKey(bytes.fromhex(public_key)).format(compressed=False)
     except Exception as e:
         logger.error(f"Error converting public key: {e}", exc_info=True)
         raise ValueError(f"Failed to convert public key: {e}") from e
@@ -70,13 +76,321 @@ def recover_public_key(signature: bytes, message_digest: bytes) -> str:
         raise ValueError(f"Failed to recover public key: {e}") from e
 
 
-def sign_address(private_key: str, message: str) -> bytes:
+def recover_uncompressed_public_key(signature: bytes, message: bytes) -> bytes:
+    """
+    Recovers the uncompressed public key from a signature and message, without a hex round-trip.
+
+    Args:
+        signature (bytes): The 65-byte recoverable signature.
+        message (bytes): The message that was signed.
+
+    Returns:
+        bytes: The recovered public key, 65 bytes uncompressed.
+
+    Raises:
+        ValueError: If the signature is not 65 bytes long or other cryptographic errors occur.
+    """
+    if len(signature) != 65:
+        raise ValueError("Signature must be exactly 65 bytes long")
+    try:
+        return coincurve.PublicKey.from_signature_and_message(signature, message).format(compressed=False)
+    except Exception as e:
+        raise ValueError(f"Failed to recover public key: {e}") from e
+
+
+@lru_cache(maxsize=65536)
+def uncompressed_public_key_to_address(public_key: bytes) -> str:
+    """
+    Convert an uncompressed public key to an Ethereum address. Results are memoised, since the
+    same nodes answer every heartbeat.
+
+    Args:
+        public_key (bytes): The 65-byte uncompressed public key.
+
+    Returns:
+        str: The address as a hexadecimal string, without 0x.
+    """
+    return sha3.keccak_256(public_key[1:]).digest()[-20:].hex()
+
+
+def recover_address(signature: bytes, message: bytes) -> str:
+    """
+    Recovers the signer's Ethereum address from a signature and message.
+
+    Args:
+        signature (bytes): The 65-byte recoverable signature.
+        message (bytes): The message that was signed.
+
+    Returns:
+        str: The signer's address as a hexadecimal string, without 0x.
+
+    Raises:
+        ValueError: If the public key cannot be recovered.
+    """
+    return uncompressed_public_key_to_address(recover_uncompressed_public_key(signature, message))
+
+
+def _recover_address_batch(signatures: List[bytes], message: bytes) -> List[Optional[str]]:
+    addresses: List[Optional[str]] = []
+    for signature in signatures:
+        try:
+            addresses.append(recover_address(signature, message))
+        except ValueError as e:
+            logger.error(f"Failed to recover address: {e}")
+            addresses.append(None)
+    return addresses
+
+
+def _map_chunks(
+        fn: Callable[[List[T]], List[R]], items: Sequence[T], executor: Optional[Executor], batches: int
+) -> List[R]:
+    """
+    Apply a batch function to `batches` chunks of the items on the executor, inline for small inputs.
+    """
+    if executor is None or batches <= 1 or len(items) < 2 * batches:
+        return fn(list(items))
+
+    size = -(-len(items) // batches)
+    futures = [executor.submit(fn, list(items[i:i + size])) for i in range(0, len(items), size)]
+    return [result for future in futures for result in future.result()]
+
+
+def recover_addresses(
+        signatures: List[bytes], message: bytes, executor: Optional[Executor] = None, batches: int = 1
+) -> List[Optional[str]]:
+    """
+    Recovers the signer addresses of many signatures over the same message.
+
+    The signatures are split into `batches` chunks that run on the executor. coincurve releases
+    the GIL inside libsecp256k1, so a thread pool runs them in parallel.
+
+    Args:
+        signatures (List[bytes]): The 65-byte recoverable signatures.
+        message (bytes): The message that was signed.
+        executor (Optional[Executor]): Executor to run the chunks on, inline if None.
+        batches (int): Number of chunks to split the signatures into.
+
+    Returns:
+        List[Optional[str]]: The addresses in input order, None where recovery failed.
+    """
+    return _map_chunks(lambda chunk: _recover_address_batch(chunk, message), signatures, executor, batches)
+
+
+class Signer:
+    """
+    Signs messages with one private key, parsed once.
+    """
+
+    def __init__(self, private_key: str):
+        """
+        Initialize the signer.
+
+        Args:
+            private_key (str): The private key as a hexadecimal string.
+
+        Raises:
+            ValueError: If the private key is invalid.
+        """
+        try:
+            self._key = coincurve.PrivateKey(bytes.fromhex(private_key))
+        except Exception as e:
+            raise ValueError(f"Invalid private key: {e}") from e
+
+    def sign(self, message: Union[str, bytes]) -> bytes:
+        """
+        Sign a message.
+
+        Args:
+            message (Union[str, bytes]): The message, strings are signed as UTF-8.
+
+        Returns:
+            bytes: The 65-byte recoverable signature.
+        """
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        return self._key.sign_recoverable(message)
+
+    def sign_many(
+            self, messages: Sequence[Union[str, bytes]], executor: Optional[Executor] = None, batches: int = 1
+    ) -> List[bytes]:
+        """
+        Sign many messages, in `batches` chunks on the executor. coincurve releases the GIL inside
+        libsecp256k1, so a thread pool signs them in parallel.
+
+        Args:
+            messages (Sequence[Union[str, bytes]]): The messages.
+            executor (Optional[Executor]): Executor to run the chunks on, inline if None.
+            batches (int): Number of chunks to split the messages into.
+
+        Returns:
+            List[bytes]: The signatures in input order.
+        """
+        return _map_chunks(lambda chunk: [self.sign(message) for message in chunk], messages, executor, batches)
+
+
+@lru_cache(maxsize=16)
+def signer_for(private_key: str) -> Signer:
+    """
+    The signer of a long-lived key, such as the admin node's own, parsed on first use.
+    """
+    return Signer(private_key)
+
+
+class KeyCache:
+    """
+    Parsed private keys by their hexadecimal form, each kept until its deadline.
+
+    Per-task keys decrypt every response to their task, and are useless once the task's deadline passed.
+    Keys without a deadline stay until the cache is full, when the keys with the earliest deadlines go first.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._keys: Dict[str, Tuple[coincurve.PrivateKey, float]] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, private_key: str, deadline: Optional[float] = None) -> coincurve.PrivateKey:
+        """
+        Get the parsed key, parsing it on first use.
+
+        Args:
+            private_key (str): The private key as a hexadecimal string.
+            deadline (Optional[float]): Unix time after which the key is no longer needed.
+
+        Returns:
+            coincurve.PrivateKey: The parsed key.
+
+        Raises:
+            ValueError: If the private key is invalid.
+        """
+        with self._lock:
+            cached = self._keys.get(private_key)
+        if cached is not None:
+            return cached[0]
+
+        try:
+            key = coincurve.PrivateKey(bytes.fromhex(private_key))
+        except Exception as e:
+            raise ValueError(f"Invalid private key: {e}") from e
+        deadline = float("inf") if deadline is None else deadline
+        with self._lock:
+            self._evict(time.time())
+            if private_key not in self._keys:
+                while len(self._keys) >= self.max_size:
+                    _, evicted = heapq.heappop(self._deadlines)
+                    self._keys.pop(evicted, None)
+                self._keys[private_key] = (key, deadline)
+                heapq.heappush(self._deadlines, (deadline, private_key))
+        return key
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Drop the keys whose deadline passed.
+
+        Args:
+            now (Optional[float]): Current unix time, defaults to the current time.
+
+        Returns:
+            int: The number of keys dropped.
+        """
+        with self._lock:
+            return self._evict(time.time() if now is None else now)
+
+    def _evict(self, now: float) -> int:
+        evicted = 0
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, private_key = heapq.heappop(self._deadlines)
+            if self._keys.pop(private_key, None) is not None:
+                evicted += 1
+        return evicted
+
+
+def _ecies_decrypt(private_key: coincurve.PrivateKey, message: bytes) -> bytes:
+    # `ecies.decrypt` without parsing the receiver key: the ephemeral public key, compressed or not, then the payload
+    key_size = 33 if message[0] in (2, 3) else 65
+    ephemeral_key = coincurve.PublicKey(message[:key_size])
+    return sym_decrypt(decapsulate(ephemeral_key, private_key), message[key_size:])
+
+
+class Decryptor:
+    """
+    Decrypts ECIES messages with per-task keys, parsed once per task and dropped at the task's deadline.
+    """
+
+    def __init__(self, keys: Optional[KeyCache] = None):
+        self.keys = keys if keys is not None else KeyCache()
+
+    def decrypt(self, private_key: str, encrypted_message: bytes, deadline: Optional[float] = None) -> str:
+        """
+        Decrypt a message.
+
+        Args:
+            private_key (str): The private key as a hexadecimal string.
+            encrypted_message (bytes): The encrypted message.
+            deadline (Optional[float]): Unix time after which the key is no longer needed.
+
+        Returns:
+            str: The decrypted message.
+
+        Raises:
+            ValueError: If the private key is invalid or the message cannot be decrypted.
+        """
+        key = self.keys.get(private_key, deadline)
+        try:
+            return _ecies_decrypt(key, encrypted_message).decode("utf-8")
+        except Exception as e:
+            raise ValueError(f"Failed to decrypt message: {e}") from e
+
+    def decrypt_many(
+            self,
+            private_key: str,
+            encrypted_messages: Sequence[bytes],
+            deadline: Optional[float] = None,
+            executor: Optional[Executor] = None,
+            batches: int = 1,
+    ) -> List[Optional[str]]:
+        """
+        Decrypt many messages to the same key, in `batches` chunks on the executor.
+
+        Args:
+            private_key (str): The private key as a hexadecimal string.
+            encrypted_messages (Sequence[bytes]): The encrypted messages.
+            deadline (Optional[float]): Unix time after which the key is no longer needed.
+            executor (Optional[Executor]): Executor to run the chunks on, inline if None.
+            batches (int): Number of chunks to split the messages into.
+
+        Returns:
+            List[Optional[str]]: The decrypted messages in input order, None where decryption failed.
+
+        Raises:
+            ValueError: If the private key is invalid.
+        """
+        key = self.keys.get(private_key, deadline)
+
+        def decrypt_chunk(chunk: List[bytes]) -> List[Optional[str]]:
+            results: List[Optional[str]] = []
+            for encrypted_message in chunk:
+                try:
+                    results.append(_ecies_decrypt(key, encrypted_message).decode("utf-8"))
+                except Exception as e:
+                    logger.error(f"Failed to decrypt message: {e}")
+                    results.append(None)
+            return results
+
+        return _map_chunks(decrypt_chunk, encrypted_messages, executor, batches)
+
+
+def sign_address(private_key: str, message: Union[str, bytes]) -> bytes:
     """
     Signs a message with a private key.
 
     Args:
         private_key (str): The private key to sign the message with.
-        message (str): The message to sign.
+        message (Union[str, bytes]): The message to sign, strings are signed as UTF-8.
 
     Returns:
         bytes: The signature of the message.
@@ -85,13 +399,7 @@ def sign_address(private_key: str, message: str) -> bytes:
         ValueError: If the private key is invalid or other cryptographic errors occur.
     """
     try:
-        private_key_bytes = bytes.fromhex(private_key)
-        private_key = coincurve.PrivateKey(private_key_bytes)
-
-        # Ensure the message is encoded to bytes
-        message_bytes = message.encode("utf-8")
-
-        return private_key.sign_recoverable(message_bytes)
+        return signer_for(private_key).sign(message)
     except Exception as e:
         logger.error(f"Error signing address: {e}", exc_info=True)
         raise ValueError(f"Failed to sign address: {e}") from e
@@ -143,13 +451,13 @@ def publickey_to_address(public_key: str) -> str:
         raise ValueError(f"Failed to convert public key to address: {e}") from e
 
 
-def sign_message(private_key: str, message: str) -> bytes:
+def sign_message(private_key: str, message: Union[str, bytes]) -> bytes:
     """
     Sign a message using the provided private key.
 
     Args:
         private_key (str): The private key to use for signing.
-        message (str): The message to sign.
+        message (Union[str, bytes]): The message to sign, strings are signed as UTF-8.
 
     Returns:
         bytes: The signature of the message.
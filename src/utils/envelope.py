@@ -0,0 +1,124 @@
+import time
+from typing import Generic, List, Optional, Tuple, TypeVar, Union
+
+from src.utils.codec import encode_signed
+from src.utils.ec import sign_message
+
+BATCH_VERSION = 2
+
+T = TypeVar("T")
+
+
+def encode_task(private_key: str, task_json: Union[str, bytes]) -> str:
+    """
+    Encode a single task message: the hex signature of the task JSON followed by the JSON, in base64.
+
+    Args:
+        private_key (str): The private key to sign with.
+        task_json (Union[str, bytes]): The task as JSON.
+
+    Returns:
+        str: The Waku payload.
+    """
+    body = task_json.encode("utf-8") if isinstance(task_json, str) else task_json
+    return encode_signed(sign_message(private_key, body), body)
+
+
+def batch_body(task_jsons: List[Union[str, bytes]]) -> bytes:
+    """
+    Build the JSON body of a batch envelope from already serialized tasks.
+
+    The body is an object with a `version` field, which single-task messages do not have,
+    and a `tasks` array holding the tasks as they would be sent on their own.
+
+    Args:
+        task_jsons (List[Union[str, bytes]]): The tasks as JSON, strings as UTF-8.
+
+    Returns:
+        bytes: The envelope body as JSON.
+    """
+    tasks = b",".join(t.encode("utf-8") if isinstance(t, str) else t for t in task_jsons)
+    return b'{"version":%d,"tasks":[' % BATCH_VERSION + tasks + b"]}"
+
+
+def encode_batch(private_key: str, task_jsons: List[Union[str, bytes]]) -> str:
+    """
+    Encode several tasks as one signed batch envelope, in the same signature + JSON layout as
+    single task messages.
+
+    Args:
+        private_key (str): The private key to sign with.
+        task_jsons (List[Union[str, bytes]]): The tasks as JSON.
+
+    Returns:
+        str: The Waku payload.
+    """
+    return encode_task(private_key, batch_body(task_jsons))
+
+
+class TaskBatcher(Generic[T]):
+    """
+    Collects tasks into batches bounded by the encoded size and by how long the oldest task waits.
+    """
+
+    # '{"version":2,"tasks":[]}' plus the 130 hex characters of the signature
+    _OVERHEAD = len(batch_body([])) + 130
+
+    def __init__(self, max_bytes: int, flush_interval: float):
+        """
+        Initialize the batcher.
+
+        Args:
+            max_bytes (int): Maximum size of a batch before base64, signature included.
+            flush_interval (float): Seconds after which a non-empty batch is flushed.
+        """
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._items: List[Tuple[T, Union[str, bytes]]] = []
+        self._size = self._OVERHEAD
+        self._opened_at: Optional[float] = None
+
+    def add(self, item: T, task_json: Union[str, bytes]) -> Optional[List[Tuple[T, Union[str, bytes]]]]:
+        """
+        Add a task to the current batch.
+
+        Args:
+            item (T): The task, returned with its JSON when the batch is flushed.
+            task_json (Union[str, bytes]): The task as JSON.
+
+        Returns:
+            Optional[List[Tuple[T, Union[str, bytes]]]]: The previous batch, if this task did not fit into it.
+        """
+        size = len(task_json.encode("utf-8") if isinstance(task_json, str) else task_json) + 1
+        flushed = None
+        if self._items and self._size + size > self.max_bytes:
+            flushed = self.drain()
+
+        if not self._items:
+            self._opened_at = time.monotonic()
+        self._items.append((item, task_json))
+        self._size += size
+        return flushed
+
+    def time_to_flush(self) -> Optional[float]:
+        """
+        Seconds until the current batch is due, or None if it is empty.
+        """
+        if self._opened_at is None:
+            return None
+        return max(0.0, self._opened_at + self.flush_interval - time.monotonic())
+
+    def drain(self) -> List[Tuple[T, Union[str, bytes]]]:
+        """
+        Take the current batch, leaving the batcher empty.
+
+        Returns:
+            List[Tuple[T, Union[str, bytes]]]: The tasks with their JSON.
+        """
+        items, self._items = self._items, []
+        self._size = self._OVERHEAD
+        self._opened_at = None
+        return items
+
+    def __len__(self) -> int:
+        return len(self._items)
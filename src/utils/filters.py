@@ -0,0 +1,86 @@
+from typing import Sequence, Union
+
+from fastbloom_rs import BloomFilter
+
+from src.models import FilterModel
+from src.utils.codec import decode_payload, encode_payload
+from src.utils.xor_filter import XorFilter
+
+# "bloom" is a fastbloom_rs Bloom filter at a 1% false-positive rate, "xor8" and "xor16" an XorFilter
+FILTER_TYPES = ("bloom", "xor8", "xor16")
+FILTER_ENCODINGS = ("hex", "base64")
+
+MembershipFilter = Union[BloomFilter, XorFilter]
+
+
+def build_filter(nodes: Sequence[str], kind: str = "bloom") -> MembershipFilter:
+    """
+    Build the filter of the nodes a task is assigned to.
+
+    Args:
+        nodes (Sequence[str]): The node addresses.
+        kind (str): One of `FILTER_TYPES`.
+
+    Returns:
+        MembershipFilter: The filter.
+
+    Raises:
+        ValueError: If the filter type is unknown.
+    """
+    if kind == "bloom":
+        bloom = BloomFilter(len(nodes), 0.01)
+        for node in nodes:
+            bloom.add(node)
+        return bloom
+    if kind in ("xor8", "xor16"):
+        return XorFilter.build(nodes, int(kind[3:]))
+    raise ValueError(f"Unknown filter type: {kind}")
+
+
+def encode_filter(membership_filter: MembershipFilter, encoding: str = "hex") -> FilterModel:
+    """
+    Encode a filter for a task message.
+
+    Hex-encoded Bloom filters are sent as before, without a type; every other combination names its type.
+
+    Args:
+        membership_filter (MembershipFilter): The filter.
+        encoding (str): One of `FILTER_ENCODINGS`.
+
+    Returns:
+        FilterModel: The filter as it goes into the task.
+    """
+    if isinstance(membership_filter, XorFilter):
+        kind, raw, hashes = f"xor{membership_filter.bits}", membership_filter.to_bytes(), None
+    else:
+        kind, raw, hashes = None, membership_filter.get_bytes(), membership_filter.hashes()
+    if encoding == "hex":
+        return FilterModel(hex=raw.hex(), hashes=hashes, type=kind)
+    return FilterModel(hashes=hashes, type=kind or "bloom", data=encode_payload(raw))
+
+
+def decode_filter(model: FilterModel) -> MembershipFilter:
+    """
+    Decode the filter of a task message.
+
+    Raises:
+        ValueError: If the filter type is unknown or its bytes are malformed.
+    """
+    try:
+        if model.hex is not None:
+            raw = bytes.fromhex(model.hex)
+        elif model.data is not None:
+            raw = decode_payload(model.data)
+        else:
+            raise ValueError("the filter has neither hex nor data")
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid filter encoding: {e}") from e
+    kind = model.type or "bloom"
+    if kind == "bloom":
+        return BloomFilter.from_bytes(raw, model.hashes)
+    if kind in ("xor8", "xor16"):
+        xor_filter = XorFilter.from_bytes(raw)
+        if f"xor{xor_filter.bits}" != kind:
+            raise ValueError(f"Filter of type {kind} has {xor_filter.bits}-bit fingerprints")
+        return xor_filter
+    raise ValueError(f"Unknown filter type: {kind}")
@@ -0,0 +1,499 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar, cast
+
+logger = logging.getLogger(__name__)
+
+# seconds, from a local cache hit to a slow aggregation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# a metric family as collected: {"name", "type", "help", "samples": [[name, labels, value], ...]}
+Family = dict
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str) -> List[Tuple[str, dict, float]]:
+        return [(name, {}, self.value)]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "functions", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.functions: List[Callable[[], float]] = []
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def add_function(self, fn: Callable[[], float]):
+        """
+        Add a callback read at collection time, e.g. a queue's size; the gauge is the sum of its value and callbacks.
+        """
+        with self._lock:
+            self.functions.append(fn)
+
+    def get(self) -> float:
+        total = self.value
+        for fn in list(self.functions):
+            try:
+                total += fn()
+            except Exception as e:
+                logger.error(f"Failed to read a gauge callback: {e}")
+        return total
+
+    def samples(self, name: str) -> List[Tuple[str, dict, float]]:
+        return [(name, {}, self.get())]
+
+
+class _Timer:
+    __slots__ = ("histogram", "errors", "start")
+
+    def __init__(self, histogram: "_HistogramChild", errors: Optional[_CounterChild]):
+        self.histogram = histogram
+        self.errors = errors
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc()
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # one count per bucket, plus the +Inf bucket; cumulated when collected
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self, errors: Optional[_CounterChild] = None) -> _Timer:
+        """
+        A context manager that observes how long its block took, and counts an error if it raised.
+        """
+        return _Timer(self, errors)
+
+    def samples(self, name: str) -> List[Tuple[str, dict, float]]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples: List[Tuple[str, dict, float]] = []
+        cumulative = 0
+        for bound, count in zip(list(self.bounds) + [float("inf")], counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", {"le": _format_value(bound)}, cumulative))
+        samples.append((f"{name}_sum", {}, total))
+        samples.append((f"{name}_count", {}, cumulative))
+        return samples
+
+
+class Metric:
+    """
+    A metric with a fixed set of label names, and one child per combination of label values.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        The child for the given label values, in the order of the label names.
+
+        Raises:
+            ValueError: If the number of values does not match the label names.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self) -> Family:
+        with self._lock:
+            children = list(self._children.items())
+        samples: List[list] = []
+        for values, child in children:
+            labels = dict(zip(self.labelnames, values))
+            samples.extend([name, {**labels, **extra}, value] for name, extra, value in child.samples(self.name))
+        return {"name": self.name, "type": self.type, "help": self.documentation, "samples": samples}
+
+
+class Counter(Metric):
+    """
+    A count that only goes up, e.g. of calls or errors.
+    """
+
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, set directly or read from callbacks at collection time.
+    """
+
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def add_function(self, fn: Callable[[], float]):
+        self.labels().add_function(fn)
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values, e.g. latencies, counted into cumulative buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self, errors: Optional[_CounterChild] = None) -> _Timer:
+        return self.labels().time(errors)
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    """
+    The metrics of a process, by name.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: M) -> M:
+        """
+        Register a metric, or return the one already registered under its name.
+
+        Raises:
+            ValueError: If a metric of another type is registered under the name.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"Metric {metric.name} is already registered as another {existing.type}")
+        return cast(M, existing)
+
+    def collect(self) -> List[Family]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [metric.collect() for metric in metrics]
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """
+    Register a counter in the process-wide registry.
+    """
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    """
+    Register a gauge in the process-wide registry.
+    """
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+        name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    """
+    Register a histogram in the process-wide registry.
+    """
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def timed(latency: Histogram, errors: Optional[Counter], *labels: str) -> Callable:
+    """
+    Decorate a function to observe its duration in `latency`, and count the calls that raised in `errors`,
+    both with the given label values.
+    """
+    latency_child = latency.labels(*labels)
+    errors_child = errors.labels(*labels) if errors is not None else None
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with latency_child.time(errors_child):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def merge(sources: Iterable[Tuple[Dict[str, str], List[Family]]]) -> List[Family]:
+    """
+    Merge the metrics of several processes into one set of families.
+
+    Args:
+        sources (Iterable[Tuple[Dict[str, str], List[Family]]]): Labels to add to the samples of each process,
+            e.g. its worker name, and its collected families.
+
+    Returns:
+        List[Family]: The families by name, in order of first appearance.
+    """
+    merged: Dict[str, Family] = {}
+    for labels, families in sources:
+        for family in families:
+            target = merged.setdefault(family["name"], {**family, "samples": []})
+            target["samples"].extend([name, {**labels, **sample_labels}, value]
+                                     for name, sample_labels, value in family["samples"])
+    return list(merged.values())
+
+
+def render(families: List[Family]) -> str:
+    """
+    Render metric families in the Prometheus text exposition format.
+    """
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family['name']} {family['help']}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        lines.extend(
+            f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in family["samples"]
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path: str, registry: Registry = REGISTRY):
+    """
+    Write the collected metrics of this process to a file, atomically, for a supervisor to merge.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry.collect(), f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def read_snapshots(directory: str, max_age: float) -> List[Tuple[Dict[str, str], List[Family]]]:
+    """
+    Read the snapshots of the worker processes, labelled with the worker name, skipping ones older than
+    `max_age` seconds, which belong to workers that exited.
+    """
+    sources = []
+    now = time.time()
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".json"):
+            continue
+        path = os.path.join(directory, file_name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                continue
+            with open(path) as f:
+                sources.append(({"worker": file_name[:-len(".json")]}, json.load(f)))
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read metrics snapshot {path}: {e}")
+    return sources
+
+
+def snapshot_loop(directory: str, name: str, interval: float, registry: Registry = REGISTRY):
+    """
+    Write this process's snapshot as `<directory>/<name>.json` every `interval` seconds, forever.
+    """
+    path = os.path.join(directory, f"{name}.json")
+    while True:
+        try:
+            write_snapshot(path, registry)
+        except Exception as e:
+            logger.error(f"Failed to write metrics snapshot: {e}", exc_info=True)
+        time.sleep(interval)
+
+
+class MetricsServer:
+    """
+    Serves the metrics in the Prometheus text format at `/metrics`, from a background thread.
+
+    In process mode the supervisor runs the server, and merges in the snapshots that its workers write to
+    `snapshot_dir`, each labelled with its worker name.
+
+    Admin actions, such as starting a profile, are served on POST at the paths of `actions`. An action is
+    called with the query parameters and returns the text of the response; a ValueError is a bad request.
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: int,
+            registry: Registry = REGISTRY,
+            snapshot_dir: Optional[str] = None,
+            snapshot_max_age: float = 30,
+            actions: Optional[Dict[str, Callable[[Dict[str, str]], str]]] = None,
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 for any free port.
+            registry (Registry): The metrics of this process.
+            snapshot_dir (Optional[str]): Directory of worker snapshots to merge in.
+            snapshot_max_age (float): Seconds after which a worker's snapshot is considered stale.
+            actions (Optional[Dict[str, Callable[[Dict[str, str]], str]]]): Admin actions by path.
+        """
+        self.registry = registry
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_max_age = snapshot_max_age
+        self.actions = actions or {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                self._reply(200, server.render(), "text/plain; version=0.0.4; charset=utf-8")
+
+            def do_POST(self):
+                path, _, query = self.path.partition("?")
+                action = server.actions.get(path)
+                if action is None:
+                    self.send_error(404)
+                    return
+                try:
+                    text = action({key: values[0] for key, values in urllib.parse.parse_qs(query).items()})
+                except ValueError as e:
+                    self._reply(400, f"{e}\n")
+                    return
+                except Exception as e:
+                    logger.error(f"Admin action {path} failed: {e}", exc_info=True)
+                    self._reply(500, f"{e}\n")
+                    return
+                self._reply(200, f"{text}\n")
+
+            def _reply(self, status: int, text: str, content_type: str = "text/plain; charset=utf-8"):
+                body = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        self.host = host
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def render(self) -> str:
+        """
+        The current metrics as Prometheus text.
+        """
+        sources: List[Tuple[Dict[str, str], List[Family]]] = [({}, self.registry.collect())]
+        if self.snapshot_dir is not None:
+            sources.extend(read_snapshots(self.snapshot_dir, self.snapshot_max_age))
+        return render(merge(sources))
+
+    def start(self) -> "MetricsServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics at http://{self.host}:{self.port}/metrics")
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
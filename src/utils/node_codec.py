@@ -0,0 +1,175 @@
+import base64
+import random
+import struct
+from typing import Iterable, Iterator, List, Optional, Union
+
+MAGIC = b"DKNN"
+VERSION = 1
+ADDRESS_SIZE = 20
+
+# magic, version, 3 reserved bytes, epoch (uint64), count (uint32)
+_HEADER = struct.Struct(">4sB3xQI")
+
+
+class NodeCodecError(ValueError):
+    """Raised when a packed node list cannot be decoded."""
+
+
+def address_to_bytes(address: Union[str, bytes]) -> bytes:
+    """
+    Convert a node address to its raw 20 bytes.
+
+    Args:
+        address (Union[str, bytes]): Hex address, with or without 0x, or raw bytes.
+
+    Returns:
+        bytes: The raw address.
+
+    Raises:
+        ValueError: If the address is not valid hex or not 20 bytes long.
+    """
+    if isinstance(address, bytes):
+        raw = address
+    else:
+        raw = bytes.fromhex(address[2:] if address[:2] == "0x" else address)
+    if len(raw) != ADDRESS_SIZE:
+        raise NodeCodecError(f"Address must be {ADDRESS_SIZE} bytes, got {len(raw)}")
+    return raw
+
+
+def pack_nodes(addresses: Iterable[Union[str, bytes]], epoch: int) -> bytes:
+    """
+    Pack node addresses into the compact binary format.
+
+    The layout is a 20-byte header (magic, version, epoch, count) followed by the sorted,
+    de-duplicated 20-byte addresses.
+
+    Args:
+        addresses (Iterable[Union[str, bytes]]): Addresses as hex strings or raw bytes.
+        epoch (int): Epoch of this node list, written to the header.
+
+    Returns:
+        bytes: The packed node list.
+    """
+    raw = sorted({address_to_bytes(a) for a in addresses})
+    return _HEADER.pack(MAGIC, VERSION, epoch, len(raw)) + b"".join(raw)
+
+
+def encode_nodes(addresses: Iterable[Union[str, bytes]], epoch: int) -> str:
+    """
+    Pack node addresses and encode them as base64, ready to be stored as a JSON value.
+
+    Args:
+        addresses (Iterable[Union[str, bytes]]): Addresses as hex strings or raw bytes.
+        epoch (int): Epoch of this node list.
+
+    Returns:
+        str: Base64 of the packed node list.
+    """
+    return base64.b64encode(pack_nodes(addresses, epoch)).decode("ascii")
+
+
+class PackedNodes:
+    """
+    Read-only view over a packed node list.
+
+    Addresses stay in a single buffer; hex strings are only built for the addresses that are
+    actually read, so sampling k nodes costs O(k) regardless of the size of the list.
+    """
+
+    __slots__ = ("epoch", "_buf", "_count")
+
+    def __init__(self, data: bytes):
+        """
+        Parse the header of a packed node list.
+
+        Args:
+            data (bytes): Output of `pack_nodes`.
+
+        Raises:
+            NodeCodecError: If the header or length is invalid.
+        """
+        if len(data) < _HEADER.size:
+            raise NodeCodecError("Packed node list is shorter than its header")
+        magic, version, epoch, count = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise NodeCodecError("Invalid packed node list magic")
+        if version != VERSION:
+            raise NodeCodecError(f"Unsupported packed node list version: {version}")
+        if len(data) != _HEADER.size + count * ADDRESS_SIZE:
+            raise NodeCodecError("Packed node list length does not match its header")
+
+        self.epoch: int = epoch
+        self._buf = memoryview(data)[_HEADER.size:]
+        self._count: int = count
+
+    @classmethod
+    def decode(cls, value: Union[str, bytes]) -> "PackedNodes":
+        """
+        Decode a base64 packed node list, as stored by `encode_nodes`.
+
+        Args:
+            value (Union[str, bytes]): The base64 value.
+
+        Returns:
+            PackedNodes: The decoded view.
+        """
+        try:
+            data = base64.b64decode(value, validate=True)
+        except ValueError as e:
+            raise NodeCodecError(f"Invalid base64 in packed node list: {e}") from e
+        return cls(data)
+
+    def address(self, index: int) -> bytes:
+        """
+        Get the raw address at an index.
+
+        Args:
+            index (int): Position in the sorted list.
+
+        Returns:
+            bytes: The 20-byte address.
+        """
+        if not 0 <= index < self._count:
+            raise IndexError("Node index out of range")
+        start = index * ADDRESS_SIZE
+        return self._buf[start:start + ADDRESS_SIZE].tobytes()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        return self.address(index).hex()
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self[i]
+
+    def __contains__(self, address: Union[str, bytes]) -> bool:
+        try:
+            target = address_to_bytes(address)
+        except ValueError:
+            return False
+
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.address(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self._count and self.address(lo) == target
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        """
+        Pick k distinct addresses uniformly at random.
+
+        Args:
+            k (int): Number of addresses to pick, at most `len(self)`.
+            rng (Optional[random.Random]): Random source, defaults to the `random` module.
+
+        Returns:
+            List[str]: The picked addresses as hex strings.
+        """
+        indices = (rng or random).sample(range(self._count), k)
+        return [self[i] for i in indices]
@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Union
+
+from src.utils.node_codec import PackedNodes, address_to_bytes, encode_nodes
+
+# the high bits of an epoch are the id of the registry that wrote it, the low bits count its commits
+WRITER_BITS = 32
+
+
+def writer_of(epoch: int) -> int:
+    """
+    The id of the registry that wrote an epoch, 0 if it never claimed one.
+    """
+    return epoch >> WRITER_BITS
+
+
+class NodeRegistry:
+    """
+    Liveness registry of compute nodes.
+
+    Keeps the last time each node answered a heartbeat and expires nodes that have not been seen
+    for `ttl` seconds. Every change bumps the epoch and can be published as a delta, which readers
+    apply to their own copy of the registry instead of re-reading the full node list. A registry that
+    publishes claims a writer id, which its epochs carry, so that readers never apply the deltas of one
+    writer on top of the state of another.
+
+    Membership is O(1) and sampling k nodes is O(k).
+    """
+
+    def __init__(self, ttl: Optional[float] = None, epoch: int = 0):
+        """
+        Initialize an empty registry.
+
+        Args:
+            ttl (Optional[float]): Seconds after which an unseen node expires, None to never expire.
+            epoch (int): Starting epoch.
+        """
+        self.ttl = ttl
+        self.epoch = epoch
+        self._lock = threading.Lock()
+        # ordered by last-seen time, oldest first
+        self._last_seen: "OrderedDict[bytes, float]" = OrderedDict()
+        self._nodes: List[bytes] = []
+        self._index: Dict[bytes, int] = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: PackedNodes, ttl: Optional[float] = None,
+                      now: Optional[float] = None) -> "NodeRegistry":
+        """
+        Build a registry from a packed snapshot. All nodes count as seen at `now`.
+
+        Args:
+            snapshot (PackedNodes): The packed node list.
+            ttl (Optional[float]): Seconds after which an unseen node expires.
+            now (Optional[float]): Time to use as last-seen, defaults to the current time.
+
+        Returns:
+            NodeRegistry: The registry at the snapshot's epoch.
+        """
+        registry = cls(ttl, snapshot.epoch)
+        seen = time.time() if now is None else now
+        for i in range(len(snapshot)):
+            registry._add(snapshot.address(i), seen)
+        return registry
+
+    def claim(self, writer: Optional[int] = None) -> int:
+        """
+        Make this registry's epochs carry a writer id, keeping the count of commits.
+
+        Args:
+            writer (Optional[int]): The writer id, random by default.
+
+        Returns:
+            int: The new epoch.
+        """
+        if writer is None:
+            writer = random.getrandbits(WRITER_BITS - 1) + 1
+        with self._lock:
+            self.epoch = (writer << WRITER_BITS) | (self.epoch & ((1 << WRITER_BITS) - 1))
+            return self.epoch
+
+    def observe(self, addresses: Iterable[Union[str, bytes]], now: Optional[float] = None) -> List[bytes]:
+        """
+        Record that nodes answered a heartbeat.
+
+        Args:
+            addresses (Iterable[Union[str, bytes]]): Responding node addresses.
+            now (Optional[float]): Time of the response, defaults to the current time.
+
+        Returns:
+            List[bytes]: Addresses that were not in the registry before.
+        """
+        seen = time.time() if now is None else now
+        added = []
+        with self._lock:
+            for address in addresses:
+                raw = address_to_bytes(address)
+                if raw in self._last_seen:
+                    self._last_seen[raw] = seen
+                    self._last_seen.move_to_end(raw)
+                else:
+                    self._add(raw, seen)
+                    added.append(raw)
+        return added
+
+    def expire(self, now: Optional[float] = None) -> List[bytes]:
+        """
+        Remove nodes that have not been seen within the TTL.
+
+        Args:
+            now (Optional[float]): Current time, defaults to the current time.
+
+        Returns:
+            List[bytes]: The removed addresses.
+        """
+        if self.ttl is None:
+            return []
+        cutoff = (time.time() if now is None else now) - self.ttl
+        removed = []
+        with self._lock:
+            while self._last_seen:
+                raw, seen = next(iter(self._last_seen.items()))
+                if seen >= cutoff:
+                    break
+                self._remove(raw)
+                removed.append(raw)
+        return removed
+
+    def commit(self, added: List[bytes], removed: List[bytes]) -> Optional[dict]:
+        """
+        Bump the epoch for a set of changes and describe them as a delta.
+
+        Args:
+            added (List[bytes]): Addresses added since the last commit.
+            removed (List[bytes]): Addresses removed since the last commit.
+
+        Returns:
+            Optional[dict]: The delta, or None if nothing changed.
+        """
+        if not added and not removed:
+            return None
+        with self._lock:
+            self.epoch += 1
+            return {
+                "epoch": self.epoch,
+                "added": [a.hex() for a in added],
+                "removed": [r.hex() for r in removed],
+            }
+
+    def apply_delta(self, delta: dict, now: Optional[float] = None) -> bool:
+        """
+        Apply a delta published by another registry.
+
+        Args:
+            delta (dict): A delta produced by `commit`.
+            now (Optional[float]): Time to use as last-seen for added nodes.
+
+        Returns:
+            bool: True if applied, False if the delta does not follow the current epoch or only marks
+                a snapshot.
+        """
+        seen = time.time() if now is None else now
+        with self._lock:
+            if delta["epoch"] != self.epoch + 1 or delta.get("snapshot"):
+                return False
+            for address in delta["removed"]:
+                raw = address_to_bytes(address)
+                if raw in self._index:
+                    self._remove(raw)
+            for address in delta["added"]:
+                raw = address_to_bytes(address)
+                if raw not in self._index:
+                    self._add(raw, seen)
+            self.epoch = delta["epoch"]
+        return True
+
+    def snapshot(self) -> str:
+        """
+        Encode the registry as a packed node list tagged with the current epoch.
+
+        Returns:
+            str: Base64 of the packed node list.
+        """
+        with self._lock:
+            return encode_nodes(self._nodes, self.epoch)
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        """
+        Pick k distinct nodes uniformly at random.
+
+        Args:
+            k (int): Number of nodes to pick, at most `len(self)`.
+            rng (Optional[random.Random]): Random source, defaults to the `random` module.
+
+        Returns:
+            List[str]: The picked addresses as hex strings.
+        """
+        with self._lock:
+            indices = (rng or random).sample(range(len(self._nodes)), k)
+            return [self._nodes[i].hex() for i in indices]
+
+    def __contains__(self, address: Union[str, bytes]) -> bool:
+        try:
+            return address_to_bytes(address) in self._index
+        except ValueError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def _add(self, raw: bytes, seen: float):
+        self._last_seen[raw] = seen
+        self._index[raw] = len(self._nodes)
+        self._nodes.append(raw)
+
+    def _remove(self, raw: bytes):
+        # swap with the last node so that removal stays O(1)
+        index = self._index.pop(raw)
+        last = self._nodes.pop()
+        if last != raw:
+            self._nodes[index] = last
+            self._index[last] = index
+        del self._last_seen[raw]
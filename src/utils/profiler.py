@@ -0,0 +1,216 @@
+"""
+On-demand profiling of a running node.
+
+A `Profiler` samples the stacks of all threads of its process for a number of seconds and writes them as
+collapsed stacks, one `thread;frame;...;frame count` line per distinct stack, which flamegraph.pl,
+speedscope and inferno read as is. Optionally it also traces allocations with `tracemalloc` during the
+profile and writes the top allocating lines, overall and for each role.
+
+A profile is started by SIGUSR1 or by a POST to `/profile` on the metrics endpoint. In process mode the
+supervisor writes the request to the profile directory and signals its workers, which each write their
+own files there.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+REQUEST_FILE = "request.json"
+
+_SHORT_NAMES: Dict[str, str] = {}
+
+
+def _short(filename: str) -> str:
+    # path relative to the working directory, or its last two components for library code
+    short = _SHORT_NAMES.get(filename)
+    if short is None:
+        cwd = os.getcwd() + os.sep
+        short = filename[len(cwd):] if filename.startswith(cwd) else os.sep.join(filename.split(os.sep)[-2:])
+        _SHORT_NAMES[filename] = short
+    return short
+
+
+def collapse(frame) -> str:
+    """
+    A thread's stack as collapsed frames, outermost first, each as `function (file:first line)`.
+    """
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Counter:
+    """
+    Sample the stacks of all other threads of this process.
+
+    Every sample holds the GIL while it walks the stacks, for some microseconds per thread, so the cost
+    to the sampled threads is about that times the sampling rate.
+
+    Args:
+        seconds (float): How long to sample for.
+        interval (float): Seconds between samples.
+
+    Returns:
+        Counter: Number of samples of each collapsed stack, prefixed with the thread's name.
+    """
+    stacks: Counter = Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                stacks[f"{names.get(ident, ident)};{collapse(frame)}"] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def top_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int = 20) -> List[str]:
+    """
+    The lines that allocated the most memory still held at the end of a profile, as report lines.
+    """
+    lines = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        lines.append(
+            f"{stat.size_diff / 1024:10.1f} KiB {stat.count_diff:8d} blocks  {_short(frame.filename)}:{frame.lineno}"
+        )
+    return lines
+
+
+def request_profile(directory: str, seconds: float, interval: float, allocations: bool):
+    """
+    Write the parameters of a profile to the profile directory, for the worker processes to read when signalled.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, REQUEST_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"seconds": seconds, "interval": interval, "allocations": allocations}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+class Profiler:
+    """
+    Runs one profile of this process at a time, on a background thread, and writes the results to a directory
+    as `<name>-<time>.collapsed` and, with allocations, `<name>-<time>.allocations.txt`.
+    """
+
+    def __init__(self, directory: str, name: str, roles: Sequence[type] = (), frames: int = 25, limit: int = 20):
+        """
+        Initialize the profiler.
+
+        Args:
+            directory (str): Where to write the results.
+            name (str): Name of this process in the file names, e.g. its worker name.
+            roles (Sequence[type]): Role classes whose allocations are reported separately, by the frames of
+                their module in the allocating traceback.
+            frames (int): Frames of traceback that `tracemalloc` keeps per allocation.
+            limit (int): Number of allocating lines to report, overall and per role.
+        """
+        self.directory = directory
+        self.name = name
+        self.roles: Dict[str, str] = {}
+        for role in roles:
+            filename = sys.modules[role.__module__].__file__
+            if filename is not None:
+                self.roles[role.__name__] = filename
+        self.frames = frames
+        self.limit = limit
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float = 0.01, allocations: bool = False) -> bool:
+        """
+        Start a profile, unless one is running.
+
+        Args:
+            seconds (float): How long to profile for.
+            interval (float): Seconds between stack samples.
+            allocations (bool): Also trace allocations, which slows down every allocation while it runs.
+
+        Returns:
+            bool: True if the profile started, False if one was already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, interval, allocations), name="profiler", daemon=True
+            )
+            self._thread.start()
+        logger.info(f"Profiling {self.name} for {seconds}s{' with allocations' if allocations else ''}")
+        return True
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Wait for the running profile, if any, to be written.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def start_requested(self) -> bool:
+        """
+        Start the profile last requested with `request_profile`, e.g. on SIGUSR1.
+
+        Returns:
+            bool: True if the profile started, False if one was already running or the request is unreadable.
+        """
+        try:
+            with open(os.path.join(self.directory, REQUEST_FILE)) as f:
+                request = json.load(f)
+            return self.start(float(request["seconds"]), float(request["interval"]), bool(request["allocations"]))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to read the profile request: {e}")
+            return False
+
+    def _run(self, seconds: float, interval: float, allocations: bool):
+        prefix = os.path.join(self.directory, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        # tracing may already be on, e.g. with PYTHONTRACEMALLOC, and is then left on
+        started = allocations and not tracemalloc.is_tracing()
+        try:
+            if started:
+                tracemalloc.start(self.frames)
+            before = tracemalloc.take_snapshot() if allocations else None
+            stacks = sample_stacks(seconds, interval)
+            after = tracemalloc.take_snapshot() if allocations else None
+            peak = tracemalloc.get_traced_memory()[1] if allocations else 0
+
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{prefix}.collapsed", "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            if before is not None and after is not None:
+                with open(f"{prefix}.allocations.txt", "w") as f:
+                    f.write(f"# allocated in {seconds}s and still held at the end, peak {peak / 2 ** 20:.1f} MiB\n")
+                    f.write("\n## all\n")
+                    f.writelines(line + "\n" for line in top_allocations(before, after, self.limit))
+                    for role, filename in self.roles.items():
+                        role_filter = [tracemalloc.Filter(True, filename, all_frames=True)]
+                        lines = top_allocations(
+                            before.filter_traces(role_filter), after.filter_traces(role_filter), self.limit
+                        )
+                        f.write(f"\n## {role}\n")
+                        f.writelines(line + "\n" for line in lines)
+            logger.info(f"Profile of {self.name} written to {prefix}.*")
+        except Exception as e:
+            logger.error(f"Profile of {self.name} failed: {e}", exc_info=True)
+        finally:
+            if started:
+                tracemalloc.stop()
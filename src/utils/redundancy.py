@@ -0,0 +1,193 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_TYPE = "synthesis"
+
+
+class Agreement:
+    """
+    Moving average of agreement scores, with the number of observations behind it.
+    """
+
+    __slots__ = ("value", "count")
+
+    def __init__(self):
+        self.value: Optional[float] = None
+        self.count = 0
+
+    def to_dict(self) -> dict:
+        return {"agreement": self.value, "observations": self.count}
+
+
+class AgreementTracker:
+    """
+    Chooses the redundancy of a task, i.e. how many nodes compute it, from how well responses agreed
+    in the past.
+
+    Agreement is tracked per task type, and per node as the similarity of its answers to those of the
+    other nodes on the same tasks. A task type whose responses keep agreeing goes down to `min_k` nodes,
+    one whose responses diverge goes up to `max_k`. The cohort of nodes picked for a task can raise its
+    redundancy further: while one of them has a history of disagreeing, another node is added.
+    """
+
+    def __init__(
+            self,
+            default_k: int,
+            min_k: int,
+            max_k: int,
+            high: float,
+            low: float,
+            alpha: float = 0.1,
+            min_observations: int = 20,
+            explore: float = 0.05,
+            rng: Optional[random.Random] = None,
+    ):
+        """
+        Initialize the tracker.
+
+        Args:
+            default_k (int): Redundancy until a task type has enough history.
+            min_k (int): Lowest redundancy. At least 2, as agreement cannot be measured on a single response.
+            max_k (int): Highest redundancy.
+            high (float): Agreement at or above which a task type is considered in consensus.
+            low (float): Agreement below which a task type or node is considered divergent.
+            alpha (float): Weight of the newest observation in the moving averages.
+            min_observations (int): Observations needed before the history is used.
+            explore (float): Share of tasks that run at `max_k` anyway, to keep measuring agreement.
+            rng (Optional[random.Random]): Random source, defaults to the `random` module.
+        """
+        if not 2 <= min_k <= default_k <= max_k:
+            raise ValueError(f"Expected 2 <= min_k <= default_k <= max_k, got {min_k}, {default_k}, {max_k}")
+        self.default_k = default_k
+        self.min_k = min_k
+        self.max_k = max_k
+        self.high = high
+        self.low = low
+        self.alpha = alpha
+        self.min_observations = min_observations
+        self.explore = explore
+        self.rng = rng or random
+        self._lock = threading.Lock()
+        self._types: Dict[str, Agreement] = {}
+        self._nodes: Dict[str, Agreement] = {}
+        # task id -> (task type, deadline)
+        self._tasks: Dict[str, Tuple[str, float]] = {}
+
+    def redundancy(self, task_type: str, candidates: List[str], default_k: Optional[int] = None) -> int:
+        """
+        Choose the redundancy of a task.
+
+        Args:
+            task_type (str): The task type.
+            candidates (List[str]): Node addresses in the order they would be assigned, at least `max_k` if available.
+            default_k (Optional[int]): Redundancy until the task type has enough history, e.g. as reloaded from
+                the config. Defaults to the one the tracker was built with.
+
+        Returns:
+            int: The number of nodes to assign, at most `len(candidates)`, so below `min_k` if fewer are available.
+        """
+        if default_k is None:
+            default_k = self.default_k
+        with self._lock:
+            history = self._types.get(task_type)
+            if history is None or history.value is None or history.count < self.min_observations:
+                k = default_k
+            elif self.rng.random() < self.explore or history.value < self.low:
+                k = self.max_k
+            elif history.value >= self.high:
+                k = self.min_k
+            else:
+                k = default_k
+
+            while k < min(self.max_k, len(candidates)) and any(self._diverges(node) for node in candidates[:k]):
+                k += 1
+        return min(k, len(candidates))
+
+    def assign(self, task_id: str, task_type: str, deadline: float):
+        """
+        Record the type of a task, so that its agreement can be attributed when it completes.
+
+        Args:
+            task_id (str): The task id.
+            task_type (str): The task type.
+            deadline (float): Unix time after which the task is forgotten if it did not complete.
+        """
+        with self._lock:
+            self._tasks[task_id] = (task_type, deadline)
+
+    def complete(self, task_id: str, scores: Optional[Dict[str, float]]):
+        """
+        Record the agreement of a task's responses.
+
+        Args:
+            task_id (str): The task id.
+            scores (Optional[Dict[str, float]]): Responding node addresses and the mean similarity of
+                their answer to the other answers. None or fewer than two scores record nothing.
+        """
+        with self._lock:
+            task_type, _ = self._tasks.pop(task_id, (None, None))
+            if task_type is None or not scores or len(scores) < 2:
+                return
+
+            self._observe(self._types.setdefault(task_type, Agreement()), sum(scores.values()) / len(scores))
+            for node, score in scores.items():
+                self._observe(self._nodes.setdefault(node, Agreement()), score)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Forget tasks whose deadline passed without an outcome.
+
+        Args:
+            now (Optional[float]): Current time, defaults to the current time.
+
+        Returns:
+            int: Number of tasks forgotten.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [task_id for task_id, (_, deadline) in self._tasks.items() if deadline < now]
+            for task_id in expired:
+                del self._tasks[task_id]
+        return len(expired)
+
+    def metrics(self) -> Dict[str, dict]:
+        """
+        Agreement per task type.
+
+        Returns:
+            Dict[str, dict]: Task type to its agreement and number of observations.
+        """
+        with self._lock:
+            return {task_type: history.to_dict() for task_type, history in self._types.items()}
+
+    def _diverges(self, node: str) -> bool:
+        history = self._nodes.get(node)
+        return (
+            history is not None and history.value is not None
+            and history.count >= self.min_observations and history.value < self.low
+        )
+
+    def _observe(self, history: Agreement, value: float):
+        history.value = value if history.value is None else (1 - self.alpha) * history.value + self.alpha * value
+        history.count += 1
+
+
+def agreement_scores(similarity: List[List[float]]) -> List[float]:
+    """
+    Score each response by its mean similarity to the other responses.
+
+    Args:
+        similarity (List[List[float]]): Pairwise similarity of the responses, `similarity[i][j]` between i and j.
+
+    Returns:
+        List[float]: One score per response, empty if there are fewer than two responses.
+    """
+    n = len(similarity)
+    if n < 2:
+        return []
+    return [sum(row[j] for j in range(n) if j != i) / (n - 1) for i, row in enumerate(similarity)]
@@ -0,0 +1,190 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.utils.metrics import counter, gauge
+from src.utils.node_registry import NodeRegistry
+
+logger = logging.getLogger(__name__)
+
+NODE_TASKS_IN_FLIGHT = gauge("dria_node_tasks_in_flight", "Tasks assigned to a node and not answered yet.", ("node",))
+NODE_TASKS = counter("dria_node_tasks_total", "Task assignments of a node, by outcome.", ("node", "outcome"))
+NODE_LATENCY = gauge("dria_node_latency_seconds", "Moving average of a node's response latency.", ("node",))
+NODE_SUCCESS = gauge("dria_node_success_rate", "Moving average of the share of its tasks a node answered.", ("node",))
+
+
+class NodeStats:
+    """
+    Load and performance counters of a single node.
+    """
+
+    __slots__ = ("in_flight", "assigned", "completed", "failed", "latency", "success")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.assigned = 0
+        self.completed = 0
+        self.failed = 0
+        # exponentially weighted moving averages, None until the first observation
+        self.latency: Optional[float] = None
+        self.success: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "assigned": self.assigned,
+            "completed": self.completed,
+            "failed": self.failed,
+            "latency": self.latency,
+            "success_rate": self.success,
+        }
+
+
+class NodeScheduler:
+    """
+    Assigns tasks to nodes using their outstanding load and recent response history.
+
+    Each of the k slots of a task draws `choices` random candidates from the registry and takes the
+    one with the lowest expected cost (power-of-d-choices), where the cost grows with the number of
+    tasks a node has in flight and its response latency, and shrinks with its success rate.
+    """
+
+    def __init__(self, choices: int = 2, alpha: float = 0.2, rng: Optional[random.Random] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            choices (int): Candidates drawn per slot.
+            alpha (float): Weight of the newest observation in the moving averages.
+            rng (Optional[random.Random]): Random source, defaults to the `random` module.
+        """
+        self.choices = choices
+        self.alpha = alpha
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._stats: Dict[str, NodeStats] = {}
+        # task id -> (assigned nodes, deadline)
+        self._tasks: Dict[str, tuple] = {}
+        self._mean_latency: Optional[float] = None
+
+    def pick(self, registry: NodeRegistry, k: int) -> List[str]:
+        """
+        Pick k distinct nodes for a task.
+
+        Args:
+            registry (NodeRegistry): The available nodes.
+            k (int): Number of nodes to pick; fewer are returned if fewer are available.
+
+        Returns:
+            List[str]: The picked node addresses.
+        """
+        k = min(k, len(registry))
+        candidates = registry.sample(min(len(registry), k * self.choices), self.rng)
+        if len(candidates) <= k:
+            return candidates
+
+        # split the distinct candidates into k groups and take the cheapest of each
+        groups = [candidates[i::k] for i in range(k)]
+        with self._lock:
+            return [min(group, key=self._cost) for group in groups]
+
+    def assign(self, task_id: str, nodes: List[str], deadline: float):
+        """
+        Record that a task was sent to nodes.
+
+        Args:
+            task_id (str): The task id.
+            nodes (List[str]): The assigned node addresses.
+            deadline (float): Unix time after which unanswered assignments are released.
+        """
+        with self._lock:
+            self._tasks[task_id] = (nodes, deadline)
+            for node in nodes:
+                stats = self._stats.setdefault(node, NodeStats())
+                stats.in_flight += 1
+                stats.assigned += 1
+                NODE_TASKS_IN_FLIGHT.labels(node).inc()
+                NODE_TASKS.labels(node, "assigned").inc()
+
+    def complete(self, task_id: str, responses: Dict[str, Optional[float]]):
+        """
+        Record the outcome of a task.
+
+        Assigned nodes that responded count as successes with their latency, the others as failures.
+        Responses for tasks assigned by another scheduler only update latency.
+
+        Args:
+            task_id (str): The task id.
+            responses (Dict[str, Optional[float]]): Responding node addresses and their latency in seconds.
+        """
+        with self._lock:
+            nodes, _ = self._tasks.pop(task_id, ((), None))
+            for node in nodes:
+                stats = self._stats[node]
+                self._release(node, stats)
+                ok = node in responses
+                stats.success = self._ewma(stats.success, 1.0 if ok else 0.0)
+                NODE_SUCCESS.labels(node).set(stats.success)
+                if ok:
+                    stats.completed += 1
+                else:
+                    stats.failed += 1
+                NODE_TASKS.labels(node, "completed" if ok else "failed").inc()
+
+            for node, latency in responses.items():
+                if latency is None:
+                    continue
+                stats = self._stats.setdefault(node, NodeStats())
+                stats.latency = self._ewma(stats.latency, latency)
+                NODE_LATENCY.labels(node).set(stats.latency)
+                self._mean_latency = self._ewma(self._mean_latency, latency)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Release the assignments of tasks whose deadline passed without an outcome.
+
+        Args:
+            now (Optional[float]): Current time, defaults to the current time.
+
+        Returns:
+            int: Number of tasks released.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [task_id for task_id, (_, deadline) in self._tasks.items() if deadline < now]
+            for task_id in expired:
+                nodes, _ = self._tasks.pop(task_id)
+                for node in nodes:
+                    self._release(node, self._stats[node])
+                    NODE_TASKS.labels(node, "expired").inc()
+        return len(expired)
+
+    def metrics(self) -> Dict[str, dict]:
+        """
+        Per-node utilisation metrics.
+
+        Returns:
+            Dict[str, dict]: Node address to its counters and moving averages.
+        """
+        with self._lock:
+            return {node: stats.to_dict() for node, stats in self._stats.items()}
+
+    @staticmethod
+    def _release(node: str, stats: NodeStats):
+        if stats.in_flight > 0:
+            stats.in_flight -= 1
+            NODE_TASKS_IN_FLIGHT.labels(node).dec()
+
+    def _cost(self, node: str) -> float:
+        stats = self._stats.get(node)
+        if stats is None:
+            # never assigned, prefer it so that idle capacity gets used
+            return 0.0
+        latency = stats.latency or self._mean_latency or 1.0
+        success = 1.0 if stats.success is None else max(stats.success, 0.05)
+        return (stats.in_flight + 1) * latency / success
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else (1 - self.alpha) * current + self.alpha * value
@@ -1,31 +1,83 @@
 import logging
 import random
+import threading
+import time
 import uuid
-from typing import List, Union
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
 
 from fastbloom_rs import BloomFilter
 
-from src.config import Config
+from src.config import Config, config as shared_config
 from src.db import HollowClient
 from src.dria import DriaClient
-from src.models import NodeModel, TaskDeliveryModel, TaskModel, QuestionModel
+from src.models import MessageError, TaskDeliveryModel, TaskModel, QuestionModel
 from src.rabbit import Producer
 from src.rabbit.consumer import Consumer
+from src.utils.codec import dumps
+from src.utils.filters import build_filter, encode_filter
+from src.utils.node_codec import PackedNodes, pack_nodes
+from src.utils.node_registry import NodeRegistry, writer_of
+from src.utils.redundancy import DEFAULT_TASK_TYPE, AgreementTracker
+from src.utils.scheduler import NodeScheduler
+from src.utils.tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
+NODES_KEY = "available-nodes"
+NODE_DELTAS_KEY = "available-nodes-deltas"
+NODE_EPOCH_KEY = "available-nodes-epoch"
+
 
 class TaskManager:
     """
     A class to manage tasks for the publisher service.
     """
 
-    def __init__(self):
-        self.consumer = Consumer()
-        self.producer = Producer()
-        self.config = Config()
-        self.hollow = HollowClient()
+    def __init__(
+            self,
+            config: Optional[Config] = None,
+            consumer: Optional[Consumer] = None,
+            producer: Optional[Producer] = None,
+    ):
+        """
+        Initialize the TaskManager.
+
+        Args:
+            config (Optional[Config]): The config, defaults to the process-wide one.
+            consumer (Optional[Consumer]): RabbitMQ consumer, a new connection is opened if not given.
+            producer (Optional[Producer]): RabbitMQ producer, a new connection is opened if not given.
+        """
+        self.config = config if config is not None else shared_config
+        self.consumer = consumer if consumer is not None else Consumer(self.config)
+        self.producer = producer if producer is not None else Producer(self.config)
+        # AMQP channels are not thread-safe, and on the async runtime sends come from several pool threads
+        self._producer_lock = threading.Lock()
+        # the consumer's channel is shared by the publisher's stages too, which acknowledge what they drained
+        self._consumer_lock = threading.Lock()
+        self.hollow = HollowClient(self.config)
         self.dria_client = DriaClient(self.config)
+        self._available_nodes: Optional[NodeRegistry] = None
+        self._node_deltas: Deque[dict] = deque(maxlen=self.config.node_snapshot_interval)
+        self._snapshot_epoch: Optional[int] = None
+        self.scheduler = NodeScheduler()
+        # only with adaptive redundancy, whose bounds the config then validates
+        self.redundancy: Optional[AgreementTracker] = None
+        if self.config.adaptive_redundancy:
+            self.redundancy = AgreementTracker(
+                default_k=self.config.compute_by_job,
+                min_k=self.config.redundancy_min,
+                max_k=self.config.redundancy_max,
+                high=self.config.agreement_high,
+                low=self.config.agreement_low,
+            )
+        # task id -> number of responses the aggregator should wait for
+        self._compute_by: Dict[str, int] = {}
+        # task id -> addresses of the nodes it was assigned to
+        self._assigned_nodes: Dict[str, List[str]] = {}
+        # feedback on the tasks this manager assigned comes back on a queue of its own, which the broker
+        # deletes with the consumer's connection, so that no other publisher drains it
+        self.feedback_queue = f"{self.config.FEEDBACK_CHANNEL}.{uuid.uuid4().hex}"
 
     def get_questions(self) -> Union[dict, None]:
         """
@@ -51,69 +103,315 @@ class TaskManager:
             for node in picked_nodes:
                 bf.add(node)
 
-            return QuestionModel(
-                id=task["question_id"],
-                question=task["question"],
-            ).dict()
+            return QuestionModel(question=task["question"]).dict()
 
         except Exception as e:
             logger.error(f"An error occurred while fetching tasks: {e}")
             raise
 
-    def get_tasks(self) -> Union[dict, None]:
+    def get_tasks(self) -> Optional[TaskDeliveryModel]:
         """
         Fetch available tasks for delivery.
 
         Returns:
-            dict: A task delivery models or None if no tasks are available.
+            Optional[TaskDeliveryModel]: A task delivery or None if no tasks are available.
         """
         try:
-            available_nodes = self.hollow.get("available-nodes")
-            print("Available nodes: ", available_nodes)
+            start_ns = time.time_ns()
+            available_nodes = self.get_available_nodes()
             if not available_nodes:
                 logger.warning("No available nodes found.")
                 return None
-            if len(available_nodes) < 3:
-                available_nodes = available_nodes * 3
-            picked_nodes = random.sample(
-                available_nodes,
-                max(3, self.config.compute_by_job),
-            )
+            logger.info(f"Available nodes: {len(available_nodes)}")
+
             task = self.consumer.receive_message(self.config.SYNTHESIS_CHANNEL, n=1)
             if not task:
                 logger.warning("No task available for delivery.")
                 return None
 
-            bf = BloomFilter(len(picked_nodes), 0.01)
-            for node in picked_nodes:
-                bf.add(node)
-
-            return TaskDeliveryModel(
-                id=str(uuid.uuid4()),
-                filter={"hex": bf.get_bytes().hex(), "hashes": bf.hashes()},
-                prompt=task["prompt"],
-                public_key=task["public_key"],
-            ).dict()
+            self.apply_node_feedback()
+            fetched_ns = time.time_ns()
+            delivery = self.assign_task(task, start_ns, available_nodes)
+            if delivery is not None:
+                TRACER.record("publish", delivery.id, "get_tasks", start_ns, fetched_ns)
+            return delivery
 
         except Exception as e:
             logger.error(f"An error occurred while fetching tasks: {e}")
             raise
 
-    def add_available_nodes(self, n: NodeModel) -> bool:
+    def fetch_synthesis_tasks(self, max_n: int) -> List[Tuple[int, dict]]:
         """
-        Add available nodes to the database.
+        Fetch up to `max_n` synthesis tasks from the RabbitMQ channel without blocking.
+
+        The tasks stay unacknowledged, so that RabbitMQ delivers them again if this process dies before it is
+        done with them. Acknowledge each with `ack_task` once it is published or requeued.
 
         Args:
-            n (NodeModel): Node model object containing the UUID and nodes.
+            max_n (int): The maximum number of tasks to fetch.
 
         Returns:
-            bool: True if the nodes were added successfully, False otherwise.
+            List[Tuple[int, dict]]: The delivery tag and message of each fetched task, possibly none.
         """
         try:
-            self.hollow.put("available-nodes", n.nodes)
+            with self._consumer_lock:
+                return self.consumer.drain_deliveries(self.config.SYNTHESIS_CHANNEL, max_n)
+        except Exception as e:
+            logger.error(f"An error occurred while fetching synthesis tasks: {e}")
+            raise
+
+    def ack_task(self, delivery_tag: int) -> bool:
+        """
+        Acknowledge a task fetched with `fetch_synthesis_tasks`, which removes it from the channel.
+
+        Args:
+            delivery_tag (int): The delivery tag of the task.
+
+        Returns:
+            bool: True if the task was acknowledged, False otherwise, in which case it is delivered again
+                once the connection closes.
+        """
+        try:
+            with self._consumer_lock:
+                self.consumer.ack(delivery_tag)
             return True
         except Exception as e:
-            logger.error(f"An error occurred while adding available nodes: {e}")
+            logger.error(f"An error occurred while acknowledging a task: {e}")
+            return False
+
+    def assign_task(
+            self, task: dict, received_ns: Optional[int] = None, available_nodes: Optional[NodeRegistry] = None
+    ) -> Optional[TaskDeliveryModel]:
+        """
+        Assign nodes to a synthesis task and build the filter of the assigned nodes, of type `task_filter`.
+
+        With `adaptive_redundancy`, the number of nodes is chosen per task from the agreement history
+        of its type and of the picked nodes, otherwise it is `compute_by_job`. If fewer distinct nodes are
+        available, the task is computed by all of them, as long as there are at least `redundancy_min`.
+
+        This is where a task gets its id, and so where its `publish` span is opened, if it is traced.
+
+        Args:
+            task (dict): The synthesis task from the RabbitMQ channel.
+            received_ns (Optional[int]): When the task was taken from the channel, in nanoseconds since the epoch,
+                where its `publish` span starts. Defaults to now.
+            available_nodes (Optional[NodeRegistry]): The nodes to assign from, e.g. fetched once for a batch
+                of tasks. Fetched with `get_available_nodes` if not given.
+
+        Returns:
+            Optional[TaskDeliveryModel]: The task delivery, or None if there are too few available nodes.
+
+        Raises:
+            MessageError: If the task does not have a string `prompt` and `public_key`.
+        """
+        prompt, public_key = task.get("prompt"), task.get("public_key")
+        if not isinstance(prompt, str) or not isinstance(public_key, str):
+            raise MessageError("Synthesis task must have a string prompt and public_key")
+
+        start_ns = time.time_ns()
+        if available_nodes is None:
+            available_nodes = self.get_available_nodes()
+        if not available_nodes:
+            logger.warning("No available nodes found.")
+            return None
+
+        task_type = task.get("type", DEFAULT_TASK_TYPE)
+        compute_by = self.config.compute_by_job
+        if self.redundancy is not None:
+            picked_nodes = self.scheduler.pick(available_nodes, self.config.redundancy_max)
+            # compute_by_job is a tunable, so the tracker's default is read from the config on each task
+            compute_by = self.redundancy.redundancy(task_type, picked_nodes, self.config.compute_by_job)
+            picked_nodes = picked_nodes[:compute_by]
+        else:
+            picked_nodes = self.scheduler.pick(available_nodes, compute_by)
+        if len(picked_nodes) < compute_by:
+            # the aggregator waits for `computeBy` responses, so it must not count nodes that do not exist
+            minimum = min(self.config.redundancy_min, compute_by)
+            if len(picked_nodes) < minimum:
+                logger.warning(f"Only {len(picked_nodes)} distinct nodes available, the task needs {minimum}.")
+                return None
+            logger.warning(f"Only {len(picked_nodes)} distinct nodes available for the task.")
+            compute_by = len(picked_nodes)
+
+        assigned_filter = encode_filter(
+            build_filter(picked_nodes, self.config.task_filter), self.config.task_filter_encoding
+        )
+
+        task_id = str(uuid.uuid4())
+        deadline = time.time() + 60 * self.config.task_timeout_minute
+        self.scheduler.assign(task_id, picked_nodes, deadline)
+        if self.redundancy is not None:
+            self.redundancy.assign(task_id, task_type, deadline)
+        self._compute_by[task_id] = compute_by
+        self._assigned_nodes[task_id] = picked_nodes
+        if TRACER.start("publish", task_id, start_ns=received_ns or start_ns, type=task_type):
+            TRACER.record("publish", task_id, "assign", start_ns, nodes=len(picked_nodes), computeBy=compute_by)
+        return TaskDeliveryModel(task_id, assigned_filter, prompt, public_key)
+
+    def pick_extra_nodes(self, k: int, is_assigned: Callable[[str], bool]) -> List[str]:
+        """
+        Pick nodes to re-dispatch a task to, skipping the ones it is already assigned to.
+
+        Args:
+            k (int): Number of nodes to pick.
+            is_assigned (Callable[[str], bool]): Whether the task is already assigned to a node.
+
+        Returns:
+            List[str]: Up to k node addresses.
+        """
+        available_nodes = self.get_available_nodes()
+        if not available_nodes:
+            return []
+        candidates = self.scheduler.pick(available_nodes, min(len(available_nodes), 4 * k))
+        return [node for node in candidates if not is_assigned(node)][:k]
+
+    def get_available_nodes(self) -> Optional[NodeRegistry]:
+        """
+        Get this manager's copy of the node registry, brought up to date with the published deltas.
+
+        The published epoch is read first, and the ring of deltas only when it differs from the local one.
+        The full snapshot is only read on the first call, or when the deltas no longer continue the local
+        epoch (e.g. after a long pause, a delta too large for the ring, or a monitor restart).
+
+        Returns:
+            Optional[NodeRegistry]: The available nodes, or None if no registry was published yet.
+        """
+        head = self.hollow.get(NODE_EPOCH_KEY)
+        nodes = self._available_nodes
+        if nodes is not None and head == nodes.epoch:
+            return nodes
+
+        deltas = self.hollow.get(NODE_DELTAS_KEY) or []
+        if nodes is None or not self._deltas_continue(nodes.epoch, deltas, head):
+            snapshot = self.hollow.get(NODES_KEY)
+            if not snapshot:
+                return None
+            if isinstance(snapshot, list):
+                # written by an older monitor as a plain JSON list of addresses
+                nodes = NodeRegistry.from_snapshot(PackedNodes(pack_nodes(snapshot, 0)))
+            else:
+                nodes = NodeRegistry.from_snapshot(PackedNodes.decode(snapshot))
+
+        for delta in deltas:
+            if delta["epoch"] > nodes.epoch and writer_of(delta["epoch"]) == writer_of(nodes.epoch):
+                nodes.apply_delta(delta)
+
+        self._available_nodes = nodes
+        return nodes
+
+    @staticmethod
+    def _deltas_continue(epoch: int, deltas: List[dict], head: Optional[int]) -> bool:
+        """
+        Whether a ring of deltas brings a registry at `epoch` up to date without reading the snapshot.
+
+        Args:
+            epoch (int): The local epoch.
+            deltas (List[dict]): The published ring, oldest first.
+            head (Optional[int]): The published epoch, None if written by an older monitor.
+
+        Returns:
+            bool: False if the ring was written by another writer, has a gap after the local epoch,
+                or marks a snapshot after it.
+        """
+        if head is not None and writer_of(head) != writer_of(epoch):
+            return False
+        if not deltas:
+            return head is None
+        if any(writer_of(delta["epoch"]) != writer_of(epoch) for delta in deltas):
+            return False
+        if not deltas[0]["epoch"] <= epoch + 1 <= deltas[-1]["epoch"] + 1:
+            return False
+        return not any(delta.get("snapshot") and delta["epoch"] > epoch for delta in deltas)
+
+    def publish_available_nodes(self, registry: NodeRegistry, delta: Optional[dict]) -> bool:
+        """
+        Publish a change of the node registry to the database.
+
+        Deltas go to a ring that holds the last `node_snapshot_interval` of them, and the full
+        snapshot is rewritten once per that many epochs, so readers can always catch up from the
+        latest snapshot plus the ring. A delta of more than `node_delta_max` addresses, e.g. when
+        a whole region comes back at once, is replaced in the ring by a marker and the snapshot is
+        rewritten instead. The epoch is written last, so that readers that see it also see its deltas.
+
+        Args:
+            registry (NodeRegistry): The monitor's registry.
+            delta (Optional[dict]): The delta from `NodeRegistry.commit`, if anything changed.
+
+        Returns:
+            bool: True if the change was published successfully, False otherwise.
+        """
+        try:
+            first = self._snapshot_epoch is None
+            oversized = delta is not None and len(delta["added"]) + len(delta["removed"]) > self.config.node_delta_max
+            if delta is not None:
+                self._node_deltas.append({"epoch": delta["epoch"], "snapshot": True} if oversized else delta)
+            if (
+                    self._snapshot_epoch is None
+                    or oversized
+                    or registry.epoch - self._snapshot_epoch >= self.config.node_snapshot_interval
+            ):
+                self.hollow.put(NODES_KEY, registry.snapshot())
+                self._snapshot_epoch = registry.epoch
+            if delta is not None or first:
+                # on the first publish, also replace the ring of a previous writer
+                self.hollow.put(NODE_DELTAS_KEY, list(self._node_deltas))
+            self.hollow.put(NODE_EPOCH_KEY, registry.epoch)
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while publishing available nodes: {e}")
+            return False
+
+    def apply_node_feedback(self):
+        """
+        Drain the outcomes that aggregators reported for the tasks this manager assigned into the node scheduler
+        and the agreement tracker, and release the assignments of tasks that timed out without one.
+        """
+        try:
+            # at most once on purpose: feedback that is lost only leaves its assignment to expire
+            with self._consumer_lock:
+                self.consumer.declare_queue(self.feedback_queue, exclusive=True)
+                feedbacks = self.consumer.drain_messages(self.feedback_queue)
+            for feedback in feedbacks:
+                self.scheduler.complete(feedback["taskId"], feedback["responses"])
+                if self.redundancy is not None:
+                    self.redundancy.complete(feedback["taskId"], feedback.get("agreement"))
+        except Exception as e:
+            logger.error(f"An error occurred while applying node feedback: {e}")
+        self.scheduler.expire()
+        if self.redundancy is not None:
+            self.redundancy.expire()
+
+    def report_node_feedback(
+            self,
+            task_id: str,
+            responses: Dict[str, Optional[float]],
+            agreement: Optional[Dict[str, float]] = None,
+            queue: Optional[str] = None,
+    ) -> bool:
+        """
+        Report which nodes answered a task, how fast, and how well their answers agreed, to the publisher
+        that assigned it.
+
+        Args:
+            task_id (str): The task ID.
+            responses (Dict[str, Optional[float]]): Responding node addresses and their latency in seconds.
+            agreement (Optional[Dict[str, float]]): Responding node addresses and the mean similarity of
+                their answer to the other answers, if the answers were scored.
+            queue (Optional[str]): The feedback queue of the assigning publisher, as carried by the task.
+                Defaults to the shared feedback channel.
+
+        Returns:
+            bool: True if the feedback was sent successfully, False otherwise.
+        """
+        feedback = {"taskId": task_id, "responses": responses}
+        if agreement is not None:
+            feedback["agreement"] = agreement
+        try:
+            with self._producer_lock:
+                self.producer.send_message(queue or self.config.FEEDBACK_CHANNEL, dumps(feedback))
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while reporting node feedback: {e}")
             return False
 
     def fetch_aggregation_tasks(self) -> Union[dict, None]:
@@ -154,6 +452,11 @@ class TaskManager:
         """
         Add an aggregation task to the RabbitMQ channel and the database.
 
+        If the task was assigned by this manager, the record and the message carry the exact addresses
+        of the assigned nodes as `nodes`, and the message the number of responses to wait for as `computeBy`
+        and the queue to report the node feedback to as `feedbackQueue`.
+        If the task is traced, the message carries its `publish` span as `traceparent`, and the span ends here.
+
         Args:
             t (TaskModel): The aggregator task model.
 
@@ -161,14 +464,70 @@ class TaskManager:
             bool: True if the task was added successfully, False otherwise.
         """
         try:
-            self.hollow.put(t.taskId, t.dict())
-            self.producer.send_message(self.config.AGGREGATION_CHANNEL, t.json())
-            self.hollow.update_key(t.taskId, "status", "published")
+            with TRACER.span("publish", t.taskId, "add_aggregator_task"):
+                record = t.to_dict()
+                nodes = self._assigned_nodes.pop(t.taskId, None)
+                if nodes is not None:
+                    record["nodes"] = nodes
+                self.hollow.put(t.taskId, record)
+                message = dict(record)
+                compute_by = self._compute_by.pop(t.taskId, None)
+                if compute_by is not None:
+                    message["computeBy"] = compute_by
+                    message["feedbackQueue"] = self.feedback_queue
+                traceparent = TRACER.traceparent("publish", t.taskId)
+                if traceparent is not None:
+                    message["traceparent"] = traceparent
+                with self._producer_lock:
+                    self.producer.send_message(self.config.AGGREGATION_CHANNEL, dumps(message))
+                self.hollow.update_key(t.taskId, "status", "published")
+            TRACER.finish("publish", t.taskId)
             return True
         except Exception as e:
             logger.error(f"An error occurred while adding an aggregation task: {e}")
+            TRACER.finish("publish", t.taskId, error=str(e))
+            return False
+
+    def discard_task(self, task_id: str):
+        """
+        Forget the assignment of a task that will not be added to the aggregation queue, e.g. because its
+        push to Waku failed or it was requeued.
+
+        Args:
+            task_id (str): The task id.
+        """
+        self._compute_by.pop(task_id, None)
+        self._assigned_nodes.pop(task_id, None)
+
+    def requeue(self, queue: str, task: dict) -> bool:
+        """
+        Put a task that was taken from a queue but not finished back onto it, e.g. when shutting down.
+
+        Args:
+            queue (str): The queue the task was taken from.
+            task (dict): The task message.
+
+        Returns:
+            bool: True if the task was requeued successfully, False otherwise.
+        """
+        try:
+            with self._producer_lock:
+                self.producer.send_message(queue, dumps(task))
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while requeueing a task to {queue}: {e}")
             return False
 
+    def close(self):
+        """
+        Close the RabbitMQ connections.
+        """
+        for client in (self.consumer, self.producer):
+            try:
+                client.close()
+            except Exception as e:
+                logger.error(f"An error occurred while closing a RabbitMQ connection: {e}")
+
     def add_search_results(self, task_id: str, context_answers: List[str], alignment_answers: List[str]) -> bool:
         """
         Add search results to the RabbitMQ.
@@ -189,3 +548,4 @@ class TaskManager:
         except Exception as e:
             logger.error(f"An error occurred while adding search results: {e}")
             return False
+        return True
@@ -46,15 +46,13 @@ def resolve_tasks(task_data: Dict[str, Union[str, List[Dict]]]) -> List[Dict]:
             continue
 
         hex_value = filter_data["hex"]
-        if isinstance(hex_value, bytes):
-            filter_data["hex"] = bytes.fromhex(hex_value)
-        elif isinstance(hex_value, str):
+        if isinstance(hex_value, str):
             try:
                 filter_data["hex"] = hex_value.encode("utf-8")
             except UnicodeEncodeError as e:
                 logger.warning(f"Skipping task with invalid 'hex' value: {hex_value}. Error: {e}")
                 continue
-        else:
+        elif not isinstance(hex_value, bytes):
             logger.warning(f"Skipping task with invalid 'hex' type: {type(hex_value)}")
             continue
 
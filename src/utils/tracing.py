@@ -0,0 +1,431 @@
+"""
+Per-task tracing of the publish → respond → aggregate path.
+
+Every task is a trace, whose id is derived from its `taskId`. Each role opens a root span for the part of
+the task it handles, `publish` in the publisher and `aggregate` in the aggregator, under which the stages
+and the remote calls they make are recorded as child spans. The publisher's root travels to the
+aggregator as a W3C `traceparent` in the aggregation message, so that the two halves form one trace.
+
+Finished spans are appended to TRACE_FILE in the OTLP/JSON format of the OpenTelemetry collector's file
+exporter, one export request per line, and can be summarized with:
+
+    python -m src.utils.tracing TRACE_FILE --top 10
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# span kinds and status codes of OTLP
+INTERNAL, CLIENT = 1, 3
+_STATUS_OK, _STATUS_ERROR = 1, 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# entered outside of traced tasks, which yields None
+_UNTRACED = nullcontext()
+
+
+def trace_id(task_id: str) -> str:
+    """
+    The trace id of a task: its UUID as 32 hex digits, or the first 16 bytes of the BLAKE2b digest of other ids.
+    """
+    try:
+        return uuid.UUID(task_id).hex
+    except ValueError:
+        return hashlib.blake2b(task_id.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    The trace id and span id of a W3C `traceparent`, or None if it is missing or malformed.
+    """
+    match = _TRACEPARENT.match(value) if isinstance(value, str) else None
+    return (match.group(1), match.group(2)) if match else None
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """
+    A timed operation within a task's trace.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(
+            self,
+            name: str,
+            trace_id: str,
+            parent_id: Optional[str] = None,
+            kind: int = INTERNAL,
+            start_ns: Optional[int] = None,
+            attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        # the random module is reseeded in forked processes
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """
+        The span as a W3C `traceparent`, for the spans of another process to be its children.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def child(self, name: str, kind: int = INTERNAL, start_ns: Optional[int] = None, **attributes) -> "Span":
+        return Span(name, self.trace_id, self.span_id, kind, start_ns, attributes)
+
+    def to_otlp(self) -> dict:
+        """
+        The span in the OTLP/JSON encoding.
+        """
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK},
+        }
+
+
+class Tracer:
+    """
+    Records the spans of the tasks handled by this process and exports them to a file.
+
+    Root spans are kept by root name and task id while they are open, so that the stages of a task can add
+    their spans from whichever thread runs them. The span a thread is in is also kept in a context variable,
+    which is how remote calls made within a stage find their parent.
+
+    Tracing is off until `configure` is given a file, and then only tasks selected by `sample_rate` are
+    traced. The choice is made from the trace id, so all processes make the same one for a task. Outside of
+    a traced task every call is a dictionary lookup or a context variable read.
+    """
+
+    def __init__(self, max_open: int = 10000, max_buffer: int = 512):
+        self.path: Optional[str] = None
+        self.sample_rate = 1.0
+        self.service = "dria-admin"
+        self.flush_interval = 5.0
+        self.max_open = max_open
+        self.max_buffer = max_buffer
+        self._roots: Dict[Tuple[str, str], Span] = {}
+        self._buffer: List[Span] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._atexit = False
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+    def configure(self, path: Optional[str], sample_rate: float = 1.0, service: str = "dria-admin",
+                  flush_interval: float = 5.0):
+        """
+        Start tracing to a file, or stop if no file is given.
+
+        Args:
+            path (Optional[str]): The file to append the spans to.
+            sample_rate (float): Fraction of the tasks to trace.
+            service (str): The `service.name` of the exported spans.
+            flush_interval (float): Seconds after which buffered spans are written, at the latest when the next
+                span ends.
+        """
+        self.path = path or None
+        self.sample_rate = sample_rate
+        self.service = service
+        self.flush_interval = flush_interval
+        if self.path is not None and not self._atexit:
+            self._atexit = True
+            atexit.register(self.flush)
+
+    def sampled(self, task_id: str) -> bool:
+        """
+        Whether a task is traced.
+        """
+        return self.path is not None and int(trace_id(task_id)[:8], 16) < self.sample_rate * 0x100000000
+
+    def start(self, root: str, task_id: str, parent: Optional[str] = None, start_ns: Optional[int] = None,
+              **attributes) -> Optional[Span]:
+        """
+        Open the root span of the part of a task this process handles.
+
+        Args:
+            root (str): Name of the root span, e.g. "publish".
+            task_id (str): The task id.
+            parent (Optional[str]): The `traceparent` of the span in another process this one continues.
+            start_ns (Optional[int]): When the span started, in nanoseconds since the epoch, defaults to now.
+            **attributes: Attributes of the span.
+
+        Returns:
+            Optional[Span]: The span, or None if the task is not traced.
+        """
+        if not self.sampled(task_id):
+            return None
+        context = parse_traceparent(parent)
+        span = Span(root, trace_id(task_id), context[1] if context else None, INTERNAL, start_ns,
+                    {"task.id": task_id, **attributes})
+        with self._lock:
+            self._roots[(root, task_id)] = span
+            if len(self._roots) > self.max_open:
+                # tasks dropped without being finished, oldest first
+                self._roots.pop(next(iter(self._roots)))
+        return span
+
+    def finish(self, root: str, task_id: str, error: Optional[str] = None, **attributes):
+        """
+        Close the root span of a task, if it is traced.
+
+        Args:
+            root (str): Name of the root span.
+            task_id (str): The task id.
+            error (Optional[str]): Why the task failed, if it did.
+            **attributes: Attributes to add to the span, e.g. its outcome.
+        """
+        if not self._roots:
+            return
+        with self._lock:
+            span = self._roots.pop((root, task_id), None)
+        if span is not None:
+            span.attributes.update(attributes)
+            span.error = error
+            self._end(span)
+
+    def traceparent(self, root: str, task_id: str) -> Optional[str]:
+        """
+        The `traceparent` of a task's open root span, or None if the task is not traced.
+        """
+        span = self._roots.get((root, task_id))
+        return span.traceparent if span is not None else None
+
+    def span(self, root: str, task_id: str, name: str, **attributes) -> AbstractContextManager:
+        """
+        Record a stage of a task as a child of its open root span. Within it, remote calls are recorded as
+        children of the stage.
+
+        Args:
+            root (str): Name of the root span.
+            task_id (str): The task id.
+            name (str): Name of the stage.
+            **attributes: Attributes of the span.
+
+        Returns:
+            AbstractContextManager: Yields the span, or None if the task is not traced.
+        """
+        parent = self._roots.get((root, task_id)) if self._roots else None
+        if parent is None:
+            return _UNTRACED
+        return self._enter(parent.child(name, **attributes))
+
+    @contextmanager
+    def _enter(self, span: Span) -> Iterator[Span]:
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            self._end(span)
+
+    def record(self, root: str, task_id: str, name: str, start_ns: int, end_ns: Optional[int] = None,
+               error: Optional[str] = None, **attributes):
+        """
+        Record a stage of a task that was timed by the caller, e.g. one done for a batch of tasks at once.
+        """
+        parent = self._roots.get((root, task_id))
+        if parent is None:
+            return
+        span = parent.child(name, start_ns=start_ns, **attributes)
+        span.error = error
+        self._end(span, end_ns)
+
+    def current(self) -> Optional[Span]:
+        """
+        The span the thread is in, if any.
+        """
+        return self._current.get()
+
+    def call(self, name: str, **attributes) -> AbstractContextManager:
+        """
+        Record a remote call as a child of the span the thread is in, if any.
+
+        Returns:
+            AbstractContextManager: Yields the span, or None outside of a traced stage.
+        """
+        parent = self._current.get()
+        if parent is None:
+            return _UNTRACED
+        return self._enter(parent.child(name, CLIENT, **attributes))
+
+    def _end(self, span: Span, end_ns: Optional[int] = None):
+        span.end_ns = end_ns if end_ns is not None else time.time_ns()
+        with self._lock:
+            self._buffer.append(span)
+            due = len(self._buffer) >= self.max_buffer or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered spans to the file, as one OTLP/JSON export request.
+        """
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not spans or self.path is None:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [
+                _attribute("service.name", self.service), _attribute("process.pid", os.getpid()),
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        try:
+            # one write of one line to a file opened for appending, so that processes sharing it do not interleave
+            with open(self.path, "ab") as f:
+                f.write(dumps(request) + b"\n")
+        except OSError as e:
+            logger.error(f"Failed to export {len(spans)} spans to {self.path}: {e}", exc_info=True)
+
+
+TRACER = Tracer()
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorate a function to record its calls as remote calls of the traced stage they are made in.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if TRACER.current() is None:
+                return fn(*args, **kwargs)
+            with TRACER.call(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def load_spans(path: str) -> List[dict]:
+    """
+    Read the spans of a file written by `Tracer.flush`, skipping lines that are not valid JSON.
+    """
+    spans = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                request = loads(line)
+            except ValueError:
+                continue
+            for resource_spans in request.get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    spans.extend(scope_spans.get("spans", []))
+    return spans
+
+
+def summarize(spans: List[dict]) -> List[dict]:
+    """
+    Summarize the spans of each task, slowest first.
+
+    Args:
+        spans (List[dict]): OTLP/JSON spans.
+
+    Returns:
+        List[dict]: Per task, its `taskId`, `seconds` from its first span's start to its last span's end, and
+            `stages`: (root, stage, count, seconds) tuples in order of first start. Each root has a "wait" stage,
+            the part of its time not spent in any of its stages.
+    """
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    for span in spans:
+        traces[span["traceId"]].append(span)
+
+    summaries = []
+    for trace, trace_spans in traces.items():
+        trace_spans.sort(key=lambda s: int(s["startTimeUnixNano"]))
+        # the root spans are the ones `Tracer.start` opened, which carry the task id
+        task_ids = {
+            span["spanId"]: attribute["value"]["stringValue"] for span in trace_spans
+            for attribute in span.get("attributes", []) if attribute["key"] == "task.id"
+        }
+        roots = {span["spanId"]: span for span in trace_spans if span["spanId"] in task_ids}
+        task_id = next(iter(task_ids.values()), trace)
+        stages: Dict[Tuple[str, str], List[float]] = {}
+        for root_id, root in roots.items():
+            children = [span for span in trace_spans if span.get("parentSpanId") == root_id]
+            busy = 0.0
+            for child in children:
+                seconds = _seconds(child)
+                busy += seconds
+                stage = stages.setdefault((root["name"], child["name"]), [0, 0.0])
+                stage[0] += 1
+                stage[1] += seconds
+            stages[(root["name"], "wait")] = [1, max(0.0, _seconds(root) - busy)]
+        start = min(int(span["startTimeUnixNano"]) for span in trace_spans)
+        end = max(int(span["endTimeUnixNano"]) for span in trace_spans)
+        summaries.append({
+            "taskId": task_id,
+            "seconds": (end - start) / 1e9,
+            "stages": [(root, stage, count, seconds) for (root, stage), (count, seconds) in stages.items()],
+        })
+    summaries.sort(key=lambda summary: summary["seconds"], reverse=True)
+    return summaries
+
+
+def _seconds(span: dict) -> float:
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Print the slowest tasks of a trace file, with the time they spent in each stage.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("path", help="file written by the admin node with TRACE_FILE set")
+    parser.add_argument("--top", type=int, default=10, help="number of tasks to print")
+    args = parser.parse_args(argv)
+
+    for summary in summarize(load_spans(args.path))[:args.top]:
+        print(f"{summary['taskId']}  {summary['seconds']:.3f}s")
+        for root, stage, count, seconds in summary["stages"]:
+            calls = f" x{count}" if count > 1 else ""
+            print(f"    {root + '.' + stage + calls:<40} {seconds:9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
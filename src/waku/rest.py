@@ -1,18 +1,23 @@
 import json
 import logging
 import urllib.parse
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 
 import requests
 
-from src.config import config
+from src.config import Config, config as shared_config
 from src.models import WakuSubscriptionError, WakuClientError, WakuContentTopicError
+from src.utils.metrics import counter, histogram, timed
+from src.utils.tracing import traced
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+WAKU_SECONDS = histogram("dria_waku_request_seconds", "Latency of Waku REST calls.", ("operation",))
+WAKU_ERRORS = counter("dria_waku_errors_total", "Waku REST calls that failed.", ("operation",))
+
 
 class WakuClient:
     """
@@ -21,8 +26,8 @@ class WakuClient:
     This class provides a client to interact with the Waku node which builded with Compose.
     """
 
-    def __init__(self):
-        self.base_url = config.waku_base_url
+    def __init__(self, config: Optional[Config] = None):
+        self.base_url = (config if config is not None else shared_config).waku_base_url
 
     def health_check(self):
         """
@@ -33,6 +38,8 @@ class WakuClient:
         response = requests.get(f"{self.base_url}/health")
         return response.text == "Node is healthy"
 
+    @timed(WAKU_SECONDS, WAKU_ERRORS, "subscribe_topic")
+    @traced("waku.subscribe_topic")
     def subscribe_topic(self, topic):
         """
         Subscribe to a topic.
@@ -53,6 +60,8 @@ class WakuClient:
             logger.error(f"Failed to subscribe to topic {topic}: {e}")
             raise WakuSubscriptionError(f"Failed to subscribe to topic {topic}") from e
 
+    @timed(WAKU_SECONDS, WAKU_ERRORS, "get_info")
+    @traced("waku.get_info")
     def get_info(self) -> Dict:
         """
         Information about the status of Waku.
@@ -68,6 +77,8 @@ class WakuClient:
             logger.error(f"Failed to get Waku info: {e}")
             raise WakuClientError("Failed to get Waku info") from e
 
+    @timed(WAKU_SECONDS, WAKU_ERRORS, "get_content_topic")
+    @traced("waku.get_content_topic")
     def get_content_topic(self, content_topic: str) -> List[Dict]:
         """
         Get content topic.
@@ -97,6 +108,8 @@ class WakuClient:
                 f"Failed to get content topic {content_topic}"
             ) from e
 
+    @timed(WAKU_SECONDS, WAKU_ERRORS, "push_content_topic")
+    @traced("waku.push_content_topic")
     def push_content_topic(self, data: Union[str, bytes], content_topic: str) -> str:
         """
         Push content to a topic.
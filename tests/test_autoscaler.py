@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+from pika.exceptions import ChannelClosedByBroker
+
+from src.rabbit.consumer import Consumer
+from src.runtime.autoscaler import Autoscaler, ScalingPolicy
+
+
+class _Role:
+    pass
+
+
+class _Supervisor:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.in_flight_tasks = 0
+
+    def worker_count(self, role):
+        return self.workers
+
+    def in_flight(self, role):
+        return self.in_flight_tasks
+
+    def scale(self, role, num_workers):
+        self.workers = num_workers
+
+
+def _autoscaler(workers=1, depth=0):
+    supervisor = _Supervisor(workers)
+    depths = {"q": depth}
+    policy = ScalingPolicy(_Role, "q", min_workers=1, max_workers=4, tasks_per_worker=10, scale_down_after=30)
+    return Autoscaler(supervisor, depths.__getitem__, [policy]), supervisor, depths
+
+
+def test_scales_up_at_once_within_bounds():
+    autoscaler, supervisor, depths = _autoscaler(depth=25)
+    autoscaler.step(now=0)
+    assert supervisor.workers == 3
+    depths["q"] = 1000
+    autoscaler.step(now=1)
+    assert supervisor.workers == 4
+    assert autoscaler.metrics()["_Role"]["scale_ups"] == 2
+
+
+def test_in_flight_counts_as_load():
+    autoscaler, supervisor, _ = _autoscaler()
+    supervisor.in_flight_tasks = 15
+    autoscaler.step(now=0)
+    assert supervisor.workers == 2
+
+
+def test_scales_down_one_at_a_time_after_sustained_low_load():
+    autoscaler, supervisor, _ = _autoscaler(workers=4)
+    autoscaler.step(now=0)
+    autoscaler.step(now=29)
+    assert supervisor.workers == 4
+    autoscaler.step(now=30)
+    assert supervisor.workers == 3
+    autoscaler.step(now=31)
+    assert supervisor.workers == 3
+    autoscaler.step(now=60)
+    assert supervisor.workers == 2
+
+
+def test_hysteresis_keeps_workers_on_moderate_load():
+    autoscaler, supervisor, depths = _autoscaler(workers=3, depth=12)
+    # two workers would be more than half loaded
+    for now in range(0, 100, 10):
+        autoscaler.step(now=now)
+    assert supervisor.workers == 3
+
+
+def test_low_load_interrupted_resets_timer():
+    autoscaler, supervisor, depths = _autoscaler(workers=2)
+    autoscaler.step(now=0)
+    depths["q"] = 8
+    autoscaler.step(now=20)
+    depths["q"] = 0
+    autoscaler.step(now=40)
+    assert supervisor.workers == 2
+    autoscaler.step(now=70)
+    assert supervisor.workers == 1
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        ScalingPolicy(_Role, "q", min_workers=3, max_workers=2, tasks_per_worker=1)
+
+
+class _Channel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_closed = False
+
+    def queue_declare(self, queue, passive):
+        if queue not in self.connection.queues:
+            # as pika does when the broker answers 404
+            self.is_closed = True
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+        return SimpleNamespace(method=SimpleNamespace(message_count=self.connection.queues[queue]))
+
+
+class _Connection:
+    def __init__(self, queues):
+        self.queues = queues
+
+    def channel(self):
+        return _Channel(self)
+
+
+def test_missing_queue_counts_as_empty_and_keeps_the_channel():
+    consumer = Consumer.__new__(Consumer)
+    consumer.channel = _Connection({"q": 7}).channel()
+    assert consumer.queue_depth("missing") == 0
+    assert not consumer.channel.is_closed
+    assert consumer.queue_depth("q") == 7
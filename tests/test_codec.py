@@ -0,0 +1,42 @@
+import base64
+import json
+
+import pytest
+
+from src.utils.codec import CodecError, TaskResponse, decode_json_payload, dumps, encode_signed, loads
+from src.utils.messaging_utils import str_to_base64
+
+
+def _message(data):
+    return {"payload": base64.b64encode(json.dumps(data).encode("utf-8")).decode("ascii"), "timestamp": 1}
+
+
+def test_loads_accepts_buffers():
+    raw = dumps({"a": [1, 2], "b": "ü"})
+    assert loads(raw) == loads(memoryview(raw)) == loads(raw.decode("utf-8")) == {"a": [1, 2], "b": "ü"}
+
+
+def test_task_response_decoded_once():
+    message = _message({"ciphertext": "0a0b", "signature": "ff", "text": "hello"})
+    response = TaskResponse.from_message(message)
+    assert (response.ciphertext, response.signature, response.text) == (b"\n\x0b", b"\xff", "hello")
+    assert response.message is message
+
+
+@pytest.mark.parametrize("message", [
+    {"payload": "not base64!"},
+    {"payload": base64.b64encode(b"{").decode("ascii")},
+    _message({"ciphertext": "zz", "signature": "ff"}),
+    _message({"signature": "ff"}),
+    {},
+])
+def test_malformed_responses_raise(message):
+    with pytest.raises(CodecError):
+        TaskResponse.from_message(message)
+
+
+def test_encode_signed_matches_previous_layout():
+    signature = bytes(range(65))
+    body = '{"taskId":"1","input":"ü"}'
+    assert encode_signed(signature, body) == str_to_base64(signature.hex() + body)
+    assert decode_json_payload(encode_signed(b"", body)) == json.loads(body)
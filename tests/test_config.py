@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from src.config import Config
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "tunables.json"
+    path.write_text("{}")
+    monkeypatch.setenv("CONFIG_FILE", str(path))
+    return path
+
+
+def test_config_is_frozen():
+    config = Config()
+    with pytest.raises(AttributeError):
+        config.polling_interval = 1
+
+
+def test_invalid_environment_rejected(monkeypatch):
+    monkeypatch.setenv("RUNTIME", "fibers")
+    monkeypatch.setenv("REDISPATCH_FRACTION", "2")
+    with pytest.raises(ValueError, match="RUNTIME.*redispatch_fraction"):
+        Config()
+
+
+def test_tunables_loaded_at_startup(config_file):
+    config_file.write_text(json.dumps({"compute_by_job": 5}))
+    assert Config().compute_by_job == 5
+
+
+def test_reload_changes_tunables(config_file):
+    config = Config()
+    config_file.write_text(json.dumps({"polling_interval": 0.5, "publisher_batch_size": "64"}))
+    assert config.reload() == {"polling_interval": 0.5, "publisher_batch_size": 64}
+    assert config.polling_interval == 0.5
+    assert config.reload() == {}
+
+
+def test_invalid_reload_changes_nothing(config_file):
+    config = Config()
+    before = config.tunables()
+    config_file.write_text(json.dumps({"polling_interval": 1, "compute_by_job": 0}))
+    with pytest.raises(ValueError, match="compute_by_job"):
+        config.reload()
+    config_file.write_text(json.dumps({"HOLLOWDB_URL": "http://elsewhere"}))
+    with pytest.raises(ValueError, match="not a tunable"):
+        config.reload()
+    assert config.tunables() == before
+
+
+@pytest.mark.parametrize("name, value", [
+    ("compute_by_job", 2.7),
+    ("compute_by_job", True),
+    ("compute_by_job", "2.7"),
+    ("polling_interval", False),
+    ("polling_interval", [1]),
+])
+def test_reload_rejects_values_of_another_type(config_file, name, value):
+    config = Config()
+    before = config.tunables()
+    config_file.write_text(json.dumps({name: value}))
+    with pytest.raises(ValueError, match=name):
+        config.reload()
+    assert config.tunables() == before
+
+
+def test_reload_converts_without_loss():
+    assert Config._convert("interval", 2, float) == 2.0
+    assert Config._convert("enabled", False, bool) is False
+    with pytest.raises(ValueError, match="expected bool"):
+        Config._convert("enabled", "false", bool)
+    with pytest.raises(ValueError, match="expected bool"):
+        Config._convert("enabled", 1, bool)
+
+
+def test_adaptive_redundancy_bounds_validated(config_file, monkeypatch):
+    config_file.write_text(json.dumps({"compute_by_job": 1}))
+    assert Config().compute_by_job == 1
+    monkeypatch.setenv("ADAPTIVE_REDUNDANCY", "true")
+    with pytest.raises(ValueError, match="adaptive redundancy"):
+        Config()
@@ -0,0 +1,73 @@
+import os
+import time
+
+import coincurve
+from ecies import encrypt
+
+from src.config import Config
+from src.utils.crypto_engine import CryptoEngine, pool_size, verify_batch
+from src.utils.ec import generate_task_keys, recover_address
+
+
+def _record(task_key, node_key):
+    private_key, public_key = task_key
+    message = os.urandom(32)
+    ciphertext = encrypt(public_key, message.hex().encode("utf-8"))
+    return ciphertext, node_key.sign_recoverable(message), private_key.removeprefix("0x"), time.time() + 60
+
+
+def test_verify_batch_recovers_addresses_and_flags_failures():
+    task_key = generate_task_keys()
+    node_keys = [coincurve.PrivateKey() for _ in range(3)]
+    records = [_record(task_key, node_key) for node_key in node_keys]
+    records.append((records[0][0], b"\x00" * 10, records[0][2], records[0][3]))
+    verified = verify_batch(records)
+    # the plaintext is the hex of the signed message
+    expected = [
+        recover_address(signature, bytes.fromhex(plaintext))
+        for (_, signature, _, _), plaintext in zip(records, verified.plaintexts[:3])
+    ]
+    assert [address for address, _ in verified] == expected + [None]
+    assert verified.ok == b"\x01\x01\x01\x00"
+    assert verified.plaintexts[3] is None
+
+
+def test_small_batches_run_inline():
+    engine = CryptoEngine(workers=4, min_batch=8)
+    verified = engine.verify([_record(generate_task_keys(), coincurve.PrivateKey())])
+    assert len(verified) == 1 and verified.ok == b"\x01"
+    assert engine._pool is None
+
+
+def test_pool_matches_inline():
+    task_keys = [generate_task_keys() for _ in range(3)]
+    records = [_record(task_keys[i % 3], coincurve.PrivateKey()) for i in range(24)]
+    with CryptoEngine(workers=2, min_batch=4) as engine:
+        verified = engine.verify(records)
+    assert verified.addresses == verify_batch(records).addresses
+    assert all(verified.ok)
+
+
+def test_records_of_callers_are_gathered_into_one_batch():
+    task_key = generate_task_keys()
+    requests = [[_record(task_key, coincurve.PrivateKey()) for _ in range(2)] for _ in range(3)]
+    with CryptoEngine(workers=2, min_batch=6, batch_window=60) as engine:
+        futures = [engine.submit(records) for records in requests]
+        results = [future.result(timeout=60) for future in futures]
+        assert engine._pool is not None
+    for records, verified in zip(requests, results):
+        assert verified.addresses == verify_batch(records).addresses
+        assert verified.ok == b"\x01\x01"
+
+
+def test_shared_engine_is_sized_once_per_process(monkeypatch):
+    monkeypatch.setenv("CRYPTO_WORKERS", "0")
+    monkeypatch.setenv("RUNTIME", "process")
+    monkeypatch.setenv("AGGREGATOR_WORKERS", "64")
+    config = Config()
+    assert pool_size(config) == 1
+    first, second = CryptoEngine.shared(config), CryptoEngine.shared(config)
+    assert first is second and first.workers == 1
+    first.close()
+    assert second._users == 1
+    second.close()
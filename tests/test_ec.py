@@ -1,4 +1,9 @@
+import time
+
+from ecies import encrypt
+
 from src.utils import uncompressed_public_key, generate_task_keys
+from src.utils.ec import Decryptor, KeyCache, Signer, recover_address
 
 
 def test_uncompressed_public_key(public_key):
@@ -9,3 +14,36 @@ def test_generate_task_keys():
     private_key, public_key = generate_task_keys()
     assert len(private_key) == 64
     assert len(public_key) == 128
+
+
+def test_signer_matches_sign_address():
+    private_key, _ = generate_task_keys()
+    signer = Signer(private_key.removeprefix("0x"))
+    signatures = signer.sign_many(["a", "b", "c"])
+    assert signatures[0] == signer.sign(b"a")
+    assert recover_address(signatures[1], b"b") == recover_address(signer.sign("b"), b"b")
+
+
+def test_decryptor_roundtrip_and_batch():
+    private_key, public_key = generate_task_keys()
+    private_key = private_key.removeprefix("0x")
+    ciphertexts = [encrypt(public_key, text.encode("utf-8")) for text in ("one", "two")]
+    decryptor = Decryptor()
+    assert decryptor.decrypt(private_key, ciphertexts[0]) == "one"
+    assert decryptor.decrypt_many(private_key, ciphertexts + [b"\x04" + b"\x00" * 80]) == ["one", "two", None]
+
+
+def test_key_cache_evicts_at_deadline():
+    now = time.time()
+    keys = KeyCache(max_size=2)
+    first, second, third = (generate_task_keys()[0].removeprefix("0x") for _ in range(3))
+    keys.get(first, deadline=now + 10)
+    keys.get(second, deadline=now + 20)
+    assert len(keys) == 2
+    assert keys.evict(now=now + 15) == 1
+    keys.get(first, deadline=now + 30)
+    # full, so the key with the earliest deadline makes room
+    keys.get(third)
+    assert len(keys) == 2
+    assert keys.evict(now=now + 25) == 0
+    assert keys.evict(now=now + 35) == 1
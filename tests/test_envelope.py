@@ -0,0 +1,30 @@
+import json
+
+from src.utils.envelope import BATCH_VERSION, TaskBatcher, batch_body
+
+
+def test_batch_body_is_versioned_json():
+    tasks = [json.dumps({"taskId": str(i)}) for i in range(3)]
+    body = json.loads(batch_body(tasks))
+    assert body["version"] == BATCH_VERSION
+    assert [t["taskId"] for t in body["tasks"]] == ["0", "1", "2"]
+
+
+def test_batcher_flushes_at_size_cap():
+    task = json.dumps({"input": "x" * 100})
+    batcher = TaskBatcher(max_bytes=TaskBatcher._OVERHEAD + 3 * (len(task) + 1), flush_interval=60)
+    assert batcher.add(1, task) is None
+    assert batcher.add(2, task) is None
+    assert batcher.add(3, task) is None
+    flushed = batcher.add(4, task)
+    assert [item for item, _ in flushed] == [1, 2, 3]
+    assert len(batcher) == 1
+
+
+def test_batcher_flush_interval():
+    batcher = TaskBatcher(max_bytes=10_000, flush_interval=0)
+    assert batcher.time_to_flush() is None
+    batcher.add(1, "{}")
+    assert batcher.time_to_flush() == 0
+    assert [item for item, _ in batcher.drain()] == [1]
+    assert len(batcher) == 0
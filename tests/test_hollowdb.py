@@ -0,0 +1,228 @@
+import json
+
+import pytest
+
+from src.config import Config
+from src.db import HollowClient
+from src.db.hollowdb.errors import HollowDBError
+from src.db.hollowdb.server import HollowServer, HollowStore
+from src.models import TaskModel
+from src.rabbit.memory import MemoryBroker, MemoryConsumer, MemoryProducer
+from src.utils.node_registry import NodeRegistry
+from src.utils.task_manager import NODE_DELTAS_KEY, NODE_EPOCH_KEY, TaskManager
+
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def hollow_server(monkeypatch):
+    with HollowServer(secret_key=SECRET) as server:
+        monkeypatch.setenv("HOLLOWDB_URL", server.url)
+        monkeypatch.setenv("HOLLOWDB_SECRET_KEY", SECRET)
+        yield server
+
+
+@pytest.fixture
+def config(hollow_server):
+    return Config()
+
+
+@pytest.fixture
+def broker():
+    return MemoryBroker()
+
+
+@pytest.fixture
+def task_manager(config, broker):
+    return TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+
+
+def test_get_missing_key_returns_none(config):
+    assert HollowClient(config).get("missing") is None
+
+
+def test_put_get_roundtrip(config):
+    client = HollowClient(config)
+    client.put("key", {"a": 1})
+    assert client.get("key") == {"a": 1}
+
+
+def test_put_existing_key_falls_back_to_update(config):
+    client = HollowClient(config)
+    client.put("key", [1])
+    client.put("key", [2])
+    assert client.get("key") == [2]
+
+
+def test_get_multi(config):
+    client = HollowClient(config)
+    client.put("a", 1)
+    client.put("b", 2)
+    assert client.get_multi(["a", "missing", "b"], "contract") == [1, None, 2]
+
+
+def test_update_key(config):
+    client = HollowClient(config)
+    client.put("task", {"status": "new"})
+    client.update_key("task", "status", "published")
+    assert client.get("task") == {"status": "published"}
+
+
+def test_push_contract_appends(config):
+    client = HollowClient(config)
+    client.push_contract("list", "x")
+    client.push_contract("list", "y")
+    assert client.get("list") == ["x", "y"]
+
+
+def test_wrong_secret_raises(hollow_server, monkeypatch):
+    monkeypatch.setenv("HOLLOWDB_SECRET_KEY", "wrong")
+    with pytest.raises(HollowDBError):
+        HollowClient(Config()).get("key")
+
+
+def test_sqlite_store_persists(tmp_path):
+    path = str(tmp_path / "hollow.db")
+    store = HollowStore(path)
+    store.put("key", {"a": 1})
+    store.close()
+    assert HollowStore(path).get("key") == {"a": 1}
+
+
+def test_task_manager_publish_flow(task_manager, broker):
+    registry = NodeRegistry()
+    added = registry.observe(["%040x" % i for i in range(5)])
+    assert task_manager.publish_available_nodes(registry, registry.commit(added, []))
+
+    broker.publish(
+        task_manager.config.SYNTHESIS_CHANNEL,
+        json.dumps({"prompt": "hello", "public_key": "ab" * 32}).encode(),
+    )
+    task = task_manager.get_tasks()
+    assert task.prompt == "hello"
+
+    task_model = TaskModel(
+        taskId=task.id, filter=task.filter, input=task.prompt, deadline=0, publicKey=task.public_key
+    )
+    assert task_manager.add_aggregator_task(task_model)
+    record = task_manager.hollow.get(task.id)
+    assert record["status"] == "published"
+    assert record["nodes"] and set(record["nodes"]) <= {"%040x" % i for i in range(5)}
+    assert broker.depth(task_manager.config.AGGREGATION_CHANNEL) == 1
+
+
+def test_synthesis_tasks_are_redelivered_until_acknowledged(config, broker):
+    task_manager = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    for prompt in ("one", "two"):
+        broker.publish(config.SYNTHESIS_CHANNEL, json.dumps({"prompt": prompt, "public_key": "ab"}).encode())
+    (first_tag, _), (_, second) = task_manager.fetch_synthesis_tasks(10)
+    assert broker.depth(config.SYNTHESIS_CHANNEL) == 0
+
+    assert task_manager.ack_task(first_tag)
+    # e.g. the process died with the second task in its pipeline
+    task_manager.consumer.close()
+    assert broker.depth(config.SYNTHESIS_CHANNEL) == 1
+    assert json.loads(broker.get(config.SYNTHESIS_CHANNEL)) == second
+
+
+def test_node_feedback_reaches_only_the_assigning_publisher(config, broker):
+    assigner, other = (
+        TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker)) for _ in range(2)
+    )
+    registry = NodeRegistry()
+    added = registry.observe(["%040x" % i for i in range(5)])
+    assigner.publish_available_nodes(registry, registry.commit(added, []))
+    for task_manager in (assigner, other):
+        task_manager.apply_node_feedback()
+
+    delivery = assigner.assign_task({"prompt": "hello", "public_key": "ab" * 32})
+    nodes = assigner._assigned_nodes[delivery.id]
+    assigner.add_aggregator_task(
+        TaskModel(taskId=delivery.id, filter=delivery.filter, input="hello", deadline=0, publicKey="ab" * 32)
+    )
+    message = json.loads(broker.get(config.AGGREGATION_CHANNEL))
+    assert message["feedbackQueue"] == assigner.feedback_queue != other.feedback_queue
+
+    aggregator_side = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    assert aggregator_side.report_node_feedback(delivery.id, {nodes[0]: 1.0}, queue=message["feedbackQueue"])
+    other.apply_node_feedback()
+    assert broker.depth(assigner.feedback_queue) == 1
+
+    assigner.apply_node_feedback()
+    metrics = assigner.scheduler.metrics()
+    assert metrics[nodes[0]]["completed"] == 1 and metrics[nodes[0]]["in_flight"] == 0
+
+
+def test_task_manager_follows_node_deltas(config, broker):
+    monitor_side = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    publisher_side = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+
+    registry = NodeRegistry(ttl=10)
+    monitor_side.publish_available_nodes(registry, None)
+    added = registry.observe(["%040x" % i for i in range(3)], now=0)
+    monitor_side.publish_available_nodes(registry, registry.commit(added, []))
+    assert len(publisher_side.get_available_nodes()) == 3
+
+    added = registry.observe(["%040x" % 9], now=5)
+    removed = registry.expire(now=12)
+    monitor_side.publish_available_nodes(registry, registry.commit(added, removed))
+    nodes = publisher_side.get_available_nodes()
+    assert nodes.epoch == registry.epoch
+    assert len(nodes) == 1 and "%040x" % 9 in nodes
+
+
+def test_task_manager_ignores_deltas_of_another_writer(config, broker):
+    first = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    second = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    reader = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+
+    registry = NodeRegistry()
+    registry.claim(1)
+    first.publish_available_nodes(registry, registry.commit(registry.observe(["%040x" % 1]), []))
+    assert "%040x" % 1 in reader.get_available_nodes()
+
+    other = NodeRegistry()
+    other.claim(2)
+    second.publish_available_nodes(other, other.commit(other.observe(["%040x" % 2]), []))
+    nodes = reader.get_available_nodes()
+    assert nodes.epoch == other.epoch
+    assert list(nodes.sample(len(nodes))) == ["%040x" % 2]
+
+
+def test_task_manager_falls_back_to_snapshot_for_large_deltas(hollow_server, broker, monkeypatch):
+    monkeypatch.setenv("NODE_DELTA_MAX", "2")
+    config = Config()
+    writer = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    reader = TaskManager(config, consumer=MemoryConsumer(broker), producer=MemoryProducer(broker))
+    registry = NodeRegistry()
+    writer.publish_available_nodes(registry, None)
+    assert len(reader.get_available_nodes()) == 0
+
+    writer.publish_available_nodes(registry, registry.commit(registry.observe(["%040x" % i for i in range(5)]), []))
+    assert writer.hollow.get(NODE_DELTAS_KEY)[-1] == {"epoch": registry.epoch, "snapshot": True}
+    nodes = reader.get_available_nodes()
+    assert nodes.epoch == registry.epoch and len(nodes) == 5
+
+    # unchanged, so only the epoch is read
+    keys = []
+    get = reader.hollow.get
+    monkeypatch.setattr(reader.hollow, "get", lambda key: keys.append(key) or get(key))
+    assert reader.get_available_nodes() is nodes
+    assert keys == [NODE_EPOCH_KEY]
+
+
+def test_task_manager_computes_by_the_nodes_available(task_manager):
+    registry = NodeRegistry()
+    task = {"prompt": "hello", "public_key": "ab" * 32}
+    added = registry.observe(["%040x" % 0])
+    task_manager.publish_available_nodes(registry, registry.commit(added, []))
+    # fewer than redundancy_min nodes, the task is held
+    assert task_manager.assign_task(task) is None
+
+    added = registry.observe(["%040x" % 1])
+    task_manager.publish_available_nodes(registry, registry.commit(added, []))
+    delivery = task_manager.assign_task(task)
+    assert task_manager._compute_by[delivery.id] == 2
+    assert len(task_manager._assigned_nodes[delivery.id]) == 2
+    task_manager.discard_task(delivery.id)
+    assert delivery.id not in task_manager._compute_by and delivery.id not in task_manager._assigned_nodes
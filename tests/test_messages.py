@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from src.models.messages import AggregatorTaskModel, FilterModel, MessageError, TaskDeliveryModel, TaskModel
+
+
+def _aggregator_message(**overrides):
+    message = {
+        "taskId": "t1",
+        "filter": {"hex": "00ff", "hashes": 3},
+        "input": "hello",
+        "deadline": 123,
+        "publicKey": "ab" * 33,
+        "privateKey": "cd" * 32,
+    }
+    message.update(overrides)
+    return message
+
+
+def test_task_json_round_trip():
+    task = TaskModel("t1", FilterModel("00ff", 3), "hello", 123, "ab")
+    data = json.loads(task.to_json())
+    assert data == {"taskId": "t1", "filter": {"hex": "00ff", "hashes": 3}, "input": "hello", "deadline": 123, "publicKey": "ab"}
+    assert TaskModel.from_dict(data) == task
+
+
+def test_structs_are_slotted():
+    delivery = TaskDeliveryModel("t1", FilterModel("00ff", 3), "hello", "ab")
+    assert not hasattr(delivery, "__dict__")
+    with pytest.raises(AttributeError):
+        delivery.extra = 1
+
+
+def test_validate_aggregator_task():
+    task = AggregatorTaskModel.validate(_aggregator_message(computeBy=2))
+    assert task.filter == FilterModel("00ff", 3)
+    assert task.computeBy == 2 and task.collected is None
+    assert "collected" not in task.to_dict()
+    assert task.nodes is None
+
+
+def test_aggregator_task_carries_assigned_nodes():
+    task = AggregatorTaskModel.validate(_aggregator_message(nodes=["aa" * 20, "bb" * 20]))
+    assert task.nodes == ["aa" * 20, "bb" * 20]
+    assert task.to_dict()["nodes"] == task.nodes
+
+
+def test_aggregator_task_carries_traceparent():
+    traceparent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    task = AggregatorTaskModel.validate(_aggregator_message(traceparent=traceparent))
+    assert task.to_dict()["traceparent"] == traceparent
+    assert AggregatorTaskModel.validate(_aggregator_message()).traceparent is None
+
+
+@pytest.mark.parametrize("overrides", [
+    {"taskId": None},
+    {"deadline": "soon"},
+    {"deadline": True},
+    {"filter": {"hex": "00ff"}},
+    {"filter": "00ff"},
+    {"collected": {}},
+    {"traceparent": 1},
+])
+def test_validate_rejects_malformed(overrides):
+    with pytest.raises(MessageError):
+        AggregatorTaskModel.validate(_aggregator_message(**overrides))
+
+
+def test_validate_rejects_non_object():
+    with pytest.raises(MessageError):
+        AggregatorTaskModel.validate(["t1"])
@@ -0,0 +1,109 @@
+import os
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src.utils.metrics import (
+    Counter, Gauge, Histogram, MetricsServer, Registry, merge, read_snapshots, render, timed, write_snapshot,
+)
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter_and_gauge_render(registry):
+    calls = registry.register(Counter("calls_total", "Calls.", ("operation",)))
+    calls.labels("get").inc()
+    calls.labels("get").inc(2)
+    depth = registry.register(Gauge("depth", "Depth."))
+    depth.set(4)
+    depth.add_function(lambda: 3)
+    text = render(registry.collect())
+    assert '# TYPE calls_total counter' in text
+    assert 'calls_total{operation="get"} 3' in text
+    assert "depth 7" in text
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = registry.register(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1)))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+    text = render(registry.collect())
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+
+
+def test_timed_counts_errors(registry):
+    latency = registry.register(Histogram("call_seconds", "Latency.", ("operation",)))
+    errors = registry.register(Counter("call_errors_total", "Errors.", ("operation",)))
+
+    @timed(latency, errors, "fail")
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        fail()
+    text = render(registry.collect())
+    assert 'call_seconds_count{operation="fail"} 1' in text
+    assert 'call_errors_total{operation="fail"} 1' in text
+
+
+def test_register_returns_existing_metric(registry):
+    first = registry.register(Counter("tasks_total", "Tasks."))
+    assert registry.register(Counter("tasks_total", "Tasks.")) is first
+    with pytest.raises(ValueError):
+        registry.register(Gauge("tasks_total", "Tasks."))
+
+
+def test_label_values_are_escaped(registry):
+    registry.register(Counter("odd_total", "Odd.", ("queue",))).labels('a"b\\c').inc()
+    assert 'odd_total{queue="a\\"b\\\\c"} 1' in render(registry.collect())
+
+
+def test_snapshots_are_merged_with_worker_label(registry, tmp_path):
+    registry.register(Counter("tasks_total", "Tasks.")).inc(5)
+    write_snapshot(str(tmp_path / "aggregator-0.json"), registry)
+    stale = tmp_path / "aggregator-1.json"
+    write_snapshot(str(stale), registry)
+    os.utime(stale, (time.time() - 100, time.time() - 100))
+
+    sources = read_snapshots(str(tmp_path), max_age=30)
+    assert [labels for labels, _ in sources] == [{"worker": "aggregator-0"}]
+    text = render(merge([({}, registry.collect())] + sources))
+    assert text.count("# TYPE tasks_total counter") == 1
+    assert 'tasks_total{worker="aggregator-0"} 5' in text
+
+
+def test_server_serves_metrics(registry):
+    registry.register(Counter("served_total", "Served.")).inc()
+    server = MetricsServer("127.0.0.1", 0, registry).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert "served_total 1" in response.read().decode()
+    finally:
+        server.close()
+
+
+def test_server_runs_admin_actions(registry):
+    def profile(params):
+        if "seconds" not in params:
+            raise ValueError("seconds is required")
+        return f"profiling for {params['seconds']}s"
+
+    server = MetricsServer("127.0.0.1", 0, registry, actions={"/profile": profile}).start()
+    url = f"http://127.0.0.1:{server.port}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(f"{url}/profile?seconds=5", method="POST")) as response:
+            assert response.read().decode() == "profiling for 5s\n"
+        for path, status in (("/profile", 400), ("/unknown", 404)):
+            with pytest.raises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(urllib.request.Request(url + path, method="POST"))
+            assert e.value.code == status
+    finally:
+        server.close()
@@ -0,0 +1,40 @@
+import os
+import random
+
+import pytest
+
+from src.utils.node_codec import NodeCodecError, PackedNodes, encode_nodes, pack_nodes
+
+
+def test_roundtrip_sorted_and_deduplicated():
+    addresses = [os.urandom(20).hex() for _ in range(100)]
+    nodes = PackedNodes.decode(encode_nodes(addresses + addresses[:10], epoch=7))
+    assert nodes.epoch == 7
+    assert len(nodes) == 100
+    assert list(nodes) == sorted(addresses)
+
+
+def test_contains():
+    addresses = [os.urandom(20).hex() for _ in range(50)]
+    nodes = PackedNodes(pack_nodes(addresses, epoch=1))
+    assert all(a in nodes for a in addresses)
+    assert "0x" + addresses[0] in nodes
+    assert os.urandom(20).hex() not in nodes
+    assert "not-hex" not in nodes
+
+
+def test_sample_distinct():
+    addresses = [os.urandom(20).hex() for _ in range(20)]
+    nodes = PackedNodes(pack_nodes(addresses, epoch=1))
+    picked = nodes.sample(5, random.Random(0))
+    assert len(set(picked)) == 5
+    assert set(picked) <= set(addresses)
+
+
+def test_invalid_data():
+    with pytest.raises(NodeCodecError):
+        PackedNodes(b"short")
+    with pytest.raises(NodeCodecError):
+        PackedNodes(pack_nodes([os.urandom(20)], epoch=1)[:-1])
+    with pytest.raises(NodeCodecError):
+        pack_nodes(["abcd"], epoch=1)
@@ -0,0 +1,61 @@
+import random
+
+from src.utils.node_codec import PackedNodes
+from src.utils.node_registry import NodeRegistry, writer_of
+
+A, B, C = ("%040x" % i for i in range(1, 4))
+
+
+def test_expire_after_ttl():
+    registry = NodeRegistry(ttl=30)
+    registry.observe([A, B], now=0)
+    registry.observe([A], now=20)
+    assert registry.expire(now=25) == []
+    assert registry.expire(now=40) == [bytes.fromhex(B)]
+    assert A in registry and B not in registry
+
+
+def test_empty_round_keeps_nodes():
+    registry = NodeRegistry(ttl=30)
+    registry.observe([A, B], now=0)
+    registry.observe([], now=10)
+    assert registry.expire(now=10) == []
+    assert len(registry) == 2
+
+
+def test_commit_and_apply_delta():
+    source = NodeRegistry(ttl=30)
+    mirror = NodeRegistry()
+    assert source.commit([], []) is None
+
+    delta = source.commit(source.observe([A, B, C], now=0), [])
+    assert mirror.apply_delta(delta)
+    delta = source.commit(source.observe([A], now=40), source.expire(now=40))
+    assert mirror.apply_delta(delta)
+    assert mirror.epoch == source.epoch == 2
+    assert len(mirror) == 1 and A in mirror
+
+    # out-of-order deltas are rejected
+    assert not mirror.apply_delta({"epoch": 5, "added": [B], "removed": []})
+
+
+def test_snapshot_roundtrip_and_sample():
+    registry = NodeRegistry()
+    registry.observe([A, B, C])
+    registry.commit([], [bytes.fromhex(A)])
+    restored = NodeRegistry.from_snapshot(PackedNodes.decode(registry.snapshot()))
+    assert restored.epoch == registry.epoch
+    assert len(restored) == 3
+    picked = restored.sample(2, random.Random(1))
+    assert len(set(picked)) == 2 and all(p in restored for p in picked)
+
+
+def test_claimed_epochs_reject_other_writers():
+    first, second = NodeRegistry(), NodeRegistry()
+    first.claim(1)
+    second.claim(2)
+    mirror = NodeRegistry.from_snapshot(PackedNodes.decode(first.snapshot()))
+    assert writer_of(mirror.epoch) == 1
+    assert not mirror.apply_delta(second.commit(second.observe([A]), []))
+    assert mirror.apply_delta(first.commit(first.observe([B]), []))
+    assert B in mirror and A not in mirror
@@ -0,0 +1,96 @@
+import glob
+import os
+import threading
+import time
+
+from src.runtime.supervisor import Supervisor
+from src.utils.profiler import Profiler, request_profile, sample_stacks
+
+
+class _Busy:
+    def __init__(self, config=None):
+        self.blocks = []
+
+    def run(self):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            self.allocate()
+
+    def allocate(self):
+        self.blocks.append(bytearray(1024))
+        del self.blocks[:-1000]
+
+
+def _wait_for(pattern: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        paths = glob.glob(pattern)
+        if paths:
+            return paths
+        time.sleep(0.05)
+    return []
+
+
+def test_sample_stacks_sees_other_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, name="waiting")
+    thread.start()
+    try:
+        stacks = sample_stacks(0.1, 0.01)
+    finally:
+        stop.set()
+        thread.join()
+    waiting = [stack for stack in stacks if stack.startswith("waiting;")]
+    assert waiting and all("wait (" in stack for stack in waiting)
+    assert sum(stacks[stack] for stack in waiting) >= 5
+
+
+def test_profile_writes_collapsed_stacks_and_allocations_per_role(tmp_path):
+    busy = _Busy()
+    thread = threading.Thread(target=busy.run, name="busy", daemon=True)
+    thread.start()
+    profiler = Profiler(str(tmp_path), "main", [_Busy])
+    assert profiler.start(0.3, 0.01, allocations=True)
+    assert not profiler.start(0.3)
+    profiler.wait(timeout=10)
+
+    (collapsed,) = glob.glob(str(tmp_path / "main-*.collapsed"))
+    with open(collapsed) as f:
+        lines = f.read().splitlines()
+    assert any(line.startswith("busy;") and "run (" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    (allocations,) = glob.glob(str(tmp_path / "main-*.allocations.txt"))
+    with open(allocations) as f:
+        report = f.read()
+    role_section = report.split("## _Busy\n", 1)[1]
+    assert "test_profiler.py" in role_section
+
+
+def test_supervisor_has_workers_profile_themselves(tmp_path):
+    supervisor = Supervisor(None, [(_Busy, 1, [])], profile_dir=str(tmp_path))
+    thread = threading.Thread(target=supervisor.run, args=(0.02,))
+    thread.start()
+    try:
+        # the worker ignores the signal until its role is created and its handler installed
+        paths = []
+        deadline = time.monotonic() + 10
+        while not paths and time.monotonic() < deadline:
+            if supervisor.profile(0.1):
+                paths = _wait_for(str(tmp_path / "_busy-0-*.collapsed"), timeout=1)
+            else:
+                time.sleep(0.05)
+    finally:
+        supervisor.stop()
+        thread.join(timeout=15)
+    assert paths
+    assert os.path.exists(tmp_path / "request.json")
+
+
+def test_requested_profile_reads_parameters(tmp_path):
+    request_profile(str(tmp_path), 0.05, 0.01, False)
+    profiler = Profiler(str(tmp_path), "worker")
+    assert profiler.start_requested()
+    profiler.wait(timeout=10)
+    assert glob.glob(str(tmp_path / "worker-*.collapsed"))
+    assert not glob.glob(str(tmp_path / "worker-*.allocations.txt"))
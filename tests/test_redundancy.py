@@ -0,0 +1,107 @@
+import json
+import random
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.functions.aggregator import Aggregator
+from src.utils.redundancy import AgreementTracker, agreement_scores
+
+NODES = ["%040x" % i for i in range(1, 11)]
+
+
+def _tracker(**kwargs):
+    kwargs.setdefault("explore", 0)
+    return AgreementTracker(3, 2, 5, high=0.9, low=0.7, min_observations=5, rng=random.Random(0), **kwargs)
+
+
+def _observe(tracker, task_type, scores, times=5):
+    for i in range(times):
+        tracker.assign(f"{task_type}-{i}", task_type, float("inf"))
+        tracker.complete(f"{task_type}-{i}", scores)
+
+
+def test_default_redundancy_without_history():
+    assert _tracker().redundancy("synthesis", NODES) == 3
+    # e.g. after compute_by_job was reloaded
+    assert _tracker().redundancy("synthesis", NODES, default_k=4) == 4
+
+
+def test_consensus_lowers_redundancy():
+    tracker = _tracker()
+    _observe(tracker, "synthesis", {NODES[0]: 0.95, NODES[1]: 0.97, NODES[2]: 0.96})
+    assert tracker.redundancy("synthesis", NODES) == 2
+    assert tracker.redundancy("other", NODES) == 3
+
+
+def test_divergence_raises_redundancy():
+    tracker = _tracker()
+    _observe(tracker, "synthesis", {NODES[0]: 0.5, NODES[1]: 0.6, NODES[2]: 0.4})
+    assert tracker.redundancy("synthesis", NODES[3:]) == 5
+
+
+def test_divergent_node_in_cohort_adds_a_node():
+    tracker = _tracker()
+    _observe(tracker, "synthesis", {NODES[0]: 0.95, NODES[1]: 0.96, NODES[2]: 0.97, NODES[3]: 0.95})
+    _observe(tracker, "other", {NODES[4]: 0.2, NODES[5]: 0.95, NODES[6]: 0.95, NODES[7]: 0.95})
+    assert tracker.redundancy("synthesis", [NODES[0], NODES[1]]) == 2
+    assert tracker.redundancy("synthesis", [NODES[4], NODES[0], NODES[1]]) == 3
+
+
+def test_redundancy_bounded_by_candidates():
+    tracker = _tracker()
+    _observe(tracker, "synthesis", {NODES[0]: 0.5, NODES[1]: 0.5})
+    assert tracker.redundancy("synthesis", NODES[:3]) == 3
+    assert tracker.redundancy("synthesis", NODES[:1]) == 1
+
+
+def test_unknown_or_single_response_tasks_are_ignored():
+    tracker = _tracker()
+    tracker.complete("unknown", {NODES[0]: 1.0, NODES[1]: 1.0})
+    tracker.assign("single", "synthesis", float("inf"))
+    tracker.complete("single", {NODES[0]: 1.0})
+    assert tracker.metrics() == {}
+
+
+def test_expire_forgets_tasks():
+    tracker = _tracker()
+    tracker.assign("task", "synthesis", deadline=10)
+    assert tracker.expire(now=11) == 1
+    tracker.complete("task", {NODES[0]: 1.0, NODES[1]: 1.0})
+    assert tracker.metrics() == {}
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        AgreementTracker(3, 1, 5, high=0.9, low=0.7)
+
+
+def test_agreement_scores():
+    assert agreement_scores([[1.0]]) == []
+    assert agreement_scores([[1.0, 0.5, 0.7], [0.5, 1.0, 0.9], [0.7, 0.9, 1.0]]) == pytest.approx([0.6, 0.7, 0.8])
+
+
+def test_similarity_normalizes_the_pairwise_maxsim():
+    pairwise = np.array([[8.0, 4.0], [2.0, 8.0]])
+    assert Aggregator._similarity(pairwise, 8) == [[1.0, 0.5], [0.25, 1.0]]
+
+
+def test_agreement_records_of_concurrent_aggregators_do_not_interleave(tmp_path):
+    path = tmp_path / "agreement.jsonl"
+    aggregator = SimpleNamespace(config=SimpleNamespace(agreement_record_file=str(path)))
+    similarity = [[random.random() for _ in range(40)] for _ in range(40)]
+
+    def record(worker):
+        for i in range(20):
+            Aggregator._record_agreement(aggregator, SimpleNamespace(taskId=f"{worker}-{i}"), NODES, similarity)
+
+    threads = [threading.Thread(target=record, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 160
+    assert all(record["similarity"] == similarity for record in records)
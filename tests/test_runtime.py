@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import time
+
+import src.functions.publisher as publisher_module
+import src.functions.search_aggregator as search_module
+from src.config import Config
+from src.functions.publisher import Publisher
+from src.functions.search_aggregator import SearchAggregator
+from src.models import FilterModel, TaskModel
+from src.runtime import AsyncRuntime, Shutdown, run_stage
+
+
+class _Role:
+    def __init__(self, work: int):
+        self.work = work
+        self.threads = set()
+        self.shutdown = Shutdown()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def stages(self):
+        return [("work", self._step, 0.01)]
+
+    def _step(self) -> bool:
+        self.threads.add(threading.current_thread().name)
+        if not self.work:
+            return False
+        self.work -= 1
+        return True
+
+
+class _AsyncRole:
+    def __init__(self):
+        self.results = []
+
+    def async_stages(self, runtime: AsyncRuntime):
+        async def step():
+            self.results.append(await runtime.cpu(sum, [1, 2, 3]))
+            return len(self.results) < 3
+
+        return [("work", step, 0.01)]
+
+
+def _serve(runtime: AsyncRuntime, roles, seconds=0.2):
+    async def serve():
+        try:
+            await asyncio.wait_for(runtime.serve(roles), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(serve())
+
+
+def test_blocking_stages_run_on_io_pool():
+    role = _Role(work=5)
+    _serve(AsyncRuntime(io_workers=2, cpu_workers=1), [role])
+    assert role.work == 0
+    assert all(name.startswith("io") for name in role.threads)
+
+
+def test_async_stages_preferred():
+    role = _AsyncRole()
+    _serve(AsyncRuntime(io_workers=1, cpu_workers=1), [role])
+    assert role.results[:3] == [6, 6, 6]
+
+
+def test_failing_stage_keeps_running():
+    calls = []
+
+    class Failing:
+        def stages(self):
+            def step():
+                calls.append(1)
+                raise RuntimeError("boom")
+
+            return [("fail", step, 0)]
+
+    _serve(AsyncRuntime(io_workers=1, cpu_workers=1, error_delay=0.01), [Failing()])
+    assert len(calls) > 1
+
+
+def test_run_stage_drains_before_returning():
+    role = _Role(work=5)
+    role.shutdown.request(drain_timeout=10)
+    run_stage(role._step, 10, 0, role.shutdown)
+    assert role.work == 0
+
+
+def test_run_stage_stops_at_drain_deadline():
+    shutdown = Shutdown()
+    shutdown.request(drain_timeout=0)
+    calls = []
+    run_stage(lambda: calls.append(1) or True, 0, 0, shutdown)
+    assert calls == []
+    assert shutdown.remaining() == 0
+
+
+def test_shutdown_drains_and_closes_roles():
+    role = _Role(work=1000)
+    runtime = AsyncRuntime(io_workers=1, cpu_workers=1)
+
+    async def serve():
+        asyncio.get_running_loop().call_later(0.05, runtime.request_shutdown, [role], 10)
+        await asyncio.wait_for(runtime.serve([role]), 5)
+
+    asyncio.run(serve())
+    assert role.work == 0
+    assert role.closed
+
+
+class _TaskManager:
+    def __init__(self):
+        self.requeued = []
+        self.acked = []
+
+    def requeue(self, queue, task):
+        self.requeued.append(task)
+        return True
+
+    def discard_task(self, task_id):
+        pass
+
+    def ack_task(self, delivery_tag):
+        self.acked.append(delivery_tag)
+        return True
+
+    def close(self):
+        pass
+
+
+def test_failed_publisher_stage_stops_the_pipeline(monkeypatch):
+    monkeypatch.setenv("DRAIN_TIMEOUT", "0.2")
+    monkeypatch.setenv("PUBLISHER_QUEUE_SIZE", "1")
+    monkeypatch.setattr(publisher_module, "TaskManager", lambda config: _TaskManager())
+    monkeypatch.setattr(publisher_module, "WakuClient", lambda config: None)
+    publisher = Publisher(Config())
+    publisher._assign_queue.put((0, 1, {"prompt": "queued"}))
+
+    def fill():
+        # the assign stage is gone, so this waits on the full queue
+        publisher._put(publisher._assign_queue, (0, 2, {"prompt": "waiting"}))
+        return False
+
+    def fail():
+        raise SystemExit("stage crashed")
+
+    monkeypatch.setattr(publisher, "stages", lambda: [("drain", fill, 0.01), ("assign", fail, 0.01)])
+    thread = threading.Thread(target=publisher.run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert publisher.task_manager.requeued == [{"prompt": "queued"}]
+    assert publisher.task_manager.acked == [1]
+
+
+class _FailingWaku:
+    def push_content_topic(self, payload, topic):
+        raise ConnectionError("waku is down")
+
+
+def test_failed_push_requeues_the_drained_message(monkeypatch):
+    monkeypatch.setattr(publisher_module, "TaskManager", lambda config: _TaskManager())
+    monkeypatch.setattr(publisher_module, "WakuClient", lambda config: _FailingWaku())
+    publisher = Publisher(Config())
+    task = {"prompt": "p", "public_key": "k", "type": "summary", "metadata": {"source": "a"}}
+    task_model = TaskModel("task-1", FilterModel(hex="00"), "p", 0, "k")
+    publisher._drained[task_model.taskId] = (7, task)
+    publisher._push_queue.put(([task_model], b"payload"))
+    assert publisher._push_tasks()
+    assert publisher.task_manager.requeued == [task]
+    assert publisher.task_manager.acked == [7]
+    assert not publisher._drained
+
+
+class _SearchTaskManager(_TaskManager):
+    def __init__(self, tasks):
+        super().__init__()
+        self.tasks = list(tasks)
+        self.on_fetch = lambda: None
+
+    def fetch_search_tasks(self):
+        self.on_fetch()
+        return self.tasks.pop(0) if self.tasks else None
+
+
+def test_search_aggregator_requeues_a_task_not_due_by_the_drain_deadline(monkeypatch):
+    task = {
+        "task_id": "t", "query_id": "q", "type": "search", "query": "?", "timestamp": time.time() + 3600,
+        "privateKey": "00", "nodes": [],
+    }
+    monkeypatch.setattr(search_module, "TaskManager", lambda config: _SearchTaskManager([task]))
+    monkeypatch.setattr(search_module, "WakuClient", lambda config: None)
+    search = SearchAggregator(Config())
+    # SIGTERM arrives while the task is being fetched
+    search.task_manager.on_fetch = lambda: search.shutdown.request(0.1)
+    thread = threading.Thread(target=search.run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert search.task_manager.requeued == [task]
+
+
+def test_a_single_monitor_writes_the_registry(monkeypatch):
+    from src.functions import monitor
+
+    monkeypatch.setattr(monitor.Monitor, "_writer_elected", False)
+    assert monitor.Monitor._elect_writer()
+    assert not monitor.Monitor._elect_writer()
+
+    # in process mode, each worker elects in its own process
+    monkeypatch.setattr(monitor.Monitor, "_writer_elected", False)
+    monkeypatch.setattr(monitor, "worker_index", lambda: 1)
+    assert not monitor.Monitor._elect_writer()
+    monkeypatch.setattr(monitor, "worker_index", lambda: 0)
+    assert monitor.Monitor._elect_writer()
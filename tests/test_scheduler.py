@@ -0,0 +1,77 @@
+import random
+
+from src.utils.node_registry import NodeRegistry
+from src.utils.metrics import REGISTRY
+from src.utils.scheduler import NodeScheduler
+
+NODES = ["%040x" % i for i in range(1, 11)]
+
+
+def _registry(nodes=NODES):
+    registry = NodeRegistry()
+    registry.observe(nodes)
+    return registry
+
+
+def test_pick_distinct_nodes():
+    scheduler = NodeScheduler(rng=random.Random(0))
+    picked = scheduler.pick(_registry(), 3)
+    assert len(picked) == len(set(picked)) == 3
+
+
+def test_pick_never_duplicates_when_few_nodes():
+    scheduler = NodeScheduler()
+    assert sorted(scheduler.pick(_registry(NODES[:2]), 3)) == sorted(NODES[:2])
+
+
+def test_pick_avoids_loaded_nodes():
+    scheduler = NodeScheduler(choices=10, rng=random.Random(0))
+    scheduler.assign("busy", NODES[:5], deadline=float("inf"))
+    picked = scheduler.pick(_registry(), 1)
+    assert picked[0] not in NODES[:5]
+
+
+def test_complete_updates_metrics():
+    scheduler = NodeScheduler()
+    scheduler.assign("task", NODES[:3], deadline=float("inf"))
+    scheduler.complete("task", {NODES[0]: 2.0, NODES[1]: None})
+    metrics = scheduler.metrics()
+    assert metrics[NODES[0]]["in_flight"] == 0
+    assert metrics[NODES[0]]["latency"] == 2.0
+    assert metrics[NODES[1]]["success_rate"] == 1.0
+    assert metrics[NODES[2]]["success_rate"] == 0.0
+    assert metrics[NODES[2]]["failed"] == 1
+
+
+def test_expire_releases_in_flight():
+    scheduler = NodeScheduler()
+    scheduler.assign("task", NODES[:2], deadline=10)
+    assert scheduler.expire(now=5) == 0
+    assert scheduler.expire(now=11) == 1
+    assert all(m["in_flight"] == 0 for m in scheduler.metrics().values())
+
+
+def _node_samples(node):
+    return {
+        (family["name"], labels.get("outcome")): value
+        for family in REGISTRY.collect() if family["name"].startswith("dria_node_")
+        for _, labels, value in family["samples"] if labels["node"] == node
+    }
+
+
+def test_node_metrics_are_exported():
+    node = "%040x" % 999
+    scheduler = NodeScheduler()
+    scheduler.assign("task", [node], deadline=float("inf"))
+    assert _node_samples(node)[("dria_node_tasks_in_flight", None)] == 1
+    scheduler.complete("task", {node: 0.5})
+    scheduler.assign("late", [node], deadline=10)
+    scheduler.expire(now=11)
+
+    samples = _node_samples(node)
+    assert samples[("dria_node_tasks_in_flight", None)] == 0
+    assert samples[("dria_node_latency_seconds", None)] == 0.5
+    assert samples[("dria_node_success_rate", None)] == 1.0
+    assert samples[("dria_node_tasks_total", "assigned")] == 2
+    assert samples[("dria_node_tasks_total", "completed")] == 1
+    assert samples[("dria_node_tasks_total", "expired")] == 1
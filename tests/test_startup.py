@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from benchmarks.startup import HEAVY, ROLES, by_package, import_times
+
+# generous, so that only regressions of the order of pulling in a heavy dependency fail
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+
+def _role_packages(module: str):
+    try:
+        return by_package(import_times(module))
+    except ImportError as e:
+        pytest.skip(f"dependencies of {module} are not installed: {e}")
+
+
+@pytest.mark.parametrize("role", sorted(ROLES))
+def test_role_imports_no_heavy_dependencies(role):
+    packages = _role_packages(ROLES[role])
+    assert not set(packages) & set(HEAVY)
+    assert sum(packages.values()) / 1000 < BUDGET_MS
+
+
+def test_utils_import_is_lazy():
+    packages = _role_packages("src.utils")
+    assert "src" in packages
+    assert not set(packages) & set(HEAVY)
+    assert "coincurve" not in packages
+
+
+def test_import_times_parses_output():
+    times = import_times("json")
+    names = [name for name, _, _ in times]
+    assert "json" in names
+    assert all(cumulative >= self_us >= 0 for _, self_us, cumulative in times)
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+import pytest
+
+from src.runtime.supervisor import Supervisor, parse_cpus, worker_index
+
+
+class _Crashing:
+    def __init__(self, config):
+        pass
+
+    def run(self):
+        os._exit(3)
+
+
+class _Sleeping:
+    preloaded = False
+
+    @classmethod
+    def preload(cls):
+        cls.preloaded = True
+
+    def __init__(self, config):
+        # preloaded in the supervisor before the fork
+        assert self.preloaded
+
+    def run(self):
+        time.sleep(60)
+
+
+class _Indexed:
+    def __init__(self, directory):
+        open(os.path.join(directory, f"worker-{worker_index()}"), "w").close()
+
+    def run(self):
+        time.sleep(60)
+
+
+def test_parse_cpus():
+    assert parse_cpus("") == []
+    assert parse_cpus("0-3,6") == [0, 1, 2, 3, 6]
+    with pytest.raises(ValueError):
+        parse_cpus("a")
+
+
+def test_backoff_doubles_up_to_max():
+    supervisor = Supervisor(None, [], backoff_base=1, backoff_max=5)
+    assert [supervisor.backoff(n) for n in range(1, 6)] == [1, 2, 4, 5, 5]
+
+
+def test_workers_pinned_round_robin():
+    supervisor = Supervisor(None, [(_Sleeping, 3, [2, 5])])
+    assert [worker.cpus for worker in supervisor.workers] == [[2], [5], [2]]
+
+
+def _run_for(supervisor: Supervisor, seconds: float):
+    thread = threading.Thread(target=supervisor.run, args=(0.02,))
+    thread.start()
+    time.sleep(seconds)
+    status = supervisor.status()
+    supervisor.stop()
+    thread.join(timeout=15)
+    return status
+
+
+def test_crashed_worker_restarted_with_backoff():
+    supervisor = Supervisor(None, [(_Crashing, 1, [])], backoff_base=0.05, backoff_max=0.1)
+    status = _run_for(supervisor, 1)
+    assert status["_crashing-0"]["failures"] >= 3
+
+
+def test_healthy_worker_kept_running_and_stopped():
+    supervisor = Supervisor(None, [(_Sleeping, 2, [])])
+    status = _run_for(supervisor, 0.5)
+    assert all(worker["pid"] is not None and worker["failures"] == 0 for worker in status.values())
+    assert all(worker.process is None or not worker.process.is_alive() for worker in supervisor.workers)
+
+
+def test_scale_adds_and_retires_workers():
+    supervisor = Supervisor(None, [(_Sleeping, 1, [])])
+    supervisor.scale(_Sleeping, 3)
+    assert [worker.index for worker in supervisor.workers] == [0, 1, 2]
+    supervisor.scale(_Sleeping, 1)
+    assert [worker.index for worker in supervisor.workers] == [0]
+    assert supervisor.worker_count(_Sleeping) == 1
+
+
+def test_workers_know_their_index(tmp_path):
+    assert worker_index() is None
+    _run_for(Supervisor(str(tmp_path), [(_Indexed, 2, [])]), 0.5)
+    assert sorted(os.listdir(tmp_path)) == ["worker-0", "worker-1"]
@@ -0,0 +1,106 @@
+import time
+import uuid
+
+import pytest
+
+from src.utils.tracing import Tracer, load_spans, main, parse_traceparent, summarize, trace_id
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    tracer = Tracer()
+    tracer.configure(str(tmp_path / "trace.jsonl"), flush_interval=3600)
+    return tracer
+
+
+def test_trace_id_is_derived_from_the_task_id():
+    task_id = str(uuid.uuid4())
+    assert trace_id(task_id) == uuid.UUID(task_id).hex
+    assert trace_id("search-1") == trace_id("search-1")
+    assert len(trace_id("search-1")) == 32
+
+
+def test_parse_traceparent():
+    assert parse_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01") == ("a" * 32, "b" * 16)
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(None) is None
+
+
+def test_untraced_tasks_record_nothing(tmp_path):
+    tracer = Tracer()
+    assert tracer.start("publish", "task") is None
+    with tracer.span("publish", "task", "sign") as span:
+        assert span is None
+    with tracer.call("waku.push_content_topic") as span:
+        assert span is None
+    tracer.finish("publish", "task")
+    tracer.flush()
+    assert not list(tmp_path.iterdir())
+
+
+def test_sampling_is_the_same_in_every_process(tracer):
+    tracer.sample_rate = 0.5
+    other = Tracer()
+    other.configure(tracer.path, sample_rate=0.5)
+    task_ids = [str(uuid.uuid4()) for _ in range(200)]
+    sampled = [tracer.sampled(task_id) for task_id in task_ids]
+    assert sampled == [other.sampled(task_id) for task_id in task_ids]
+    assert 50 < sum(sampled) < 150
+
+
+def test_spans_form_one_trace_across_roles(tracer):
+    task_id = str(uuid.uuid4())
+    tracer.start("publish", task_id, start_ns=1_000_000_000)
+    with tracer.span("publish", task_id, "add_aggregator_task"):
+        with tracer.call("rabbitmq.publish", queue="aggregation"):
+            pass
+    traceparent = tracer.traceparent("publish", task_id)
+    tracer.finish("publish", task_id)
+
+    # the aggregator only has the message
+    aggregator = Tracer()
+    aggregator.configure(tracer.path)
+    aggregator.start("aggregate", task_id, parent=traceparent)
+    with pytest.raises(RuntimeError):
+        with aggregator.span("aggregate", task_id, "poll"):
+            raise RuntimeError("waku is down")
+    aggregator.finish("aggregate", task_id, outcome="failed")
+    tracer.flush()
+    aggregator.flush()
+
+    spans = {span["name"]: span for span in load_spans(tracer.path)}
+    assert {span["traceId"] for span in spans.values()} == {uuid.UUID(task_id).hex}
+    assert spans["add_aggregator_task"]["parentSpanId"] == spans["publish"]["spanId"]
+    assert spans["rabbitmq.publish"]["parentSpanId"] == spans["add_aggregator_task"]["spanId"]
+    assert spans["aggregate"]["parentSpanId"] == spans["publish"]["spanId"]
+    assert spans["poll"]["status"] == {"code": 2, "message": "RuntimeError: waku is down"}
+    assert {"key": "outcome", "value": {"stringValue": "failed"}} in spans["aggregate"]["attributes"]
+
+
+def test_summarize_orders_tasks_by_duration(tracer):
+    for task_id, seconds in (("fast", 2), ("slow", 5)):
+        start_ns = time.time_ns() - seconds * 1_000_000_000
+        tracer.start("aggregate", task_id, start_ns=start_ns)
+        tracer.record("aggregate", task_id, "poll", start_ns, start_ns + 500_000_000)
+        tracer.record("aggregate", task_id, "poll", start_ns + 500_000_000, start_ns + 1_000_000_000)
+        tracer.finish("aggregate", task_id)
+    tracer.flush()
+
+    slow, fast = summarize(load_spans(tracer.path))
+    assert (slow["taskId"], fast["taskId"]) == ("slow", "fast")
+    assert slow["seconds"] == pytest.approx(5, abs=0.5)
+    (poll_root, poll, polls, poll_seconds), (wait_root, wait, _, wait_seconds) = slow["stages"]
+    assert (poll_root, poll, polls, poll_seconds) == ("aggregate", "poll", 2, 1.0)
+    assert (wait_root, wait) == ("aggregate", "wait")
+    assert wait_seconds == pytest.approx(4, abs=0.5)
+
+
+def test_cli_prints_the_slowest_tasks(tracer, capsys):
+    root = tracer.start("publish", "task")
+    tracer.record("publish", "task", "sign", root.start_ns)
+    tracer.finish("publish", "task")
+    tracer.flush()
+    main([tracer.path, "--top", "1"])
+    out = capsys.readouterr().out
+    assert out.startswith("task ")
+    assert "publish.sign" in out and "publish.wait" in out
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from src.utils.xor_filter import XorFilter, _MASK64, _murmur64, key_hash
+
+# the test vector of the wire format in docs/README.md
+VECTOR = bytes.fromhex(
+    "efcdab89674523010b00000008000000000000000000000000000000000000000000006100000000007d00000000"
+)
+
+
+@pytest.mark.parametrize("bits", [8, 16])
+@pytest.mark.parametrize("size", [0, 1, 3, 1000])
+def test_contains_every_key(bits, size):
+    keys = [os.urandom(20).hex() for _ in range(size)]
+    xor_filter = XorFilter.build(keys, bits)
+    assert all(key in xor_filter for key in keys)
+
+
+@pytest.mark.parametrize("bits, bound", [(8, 0.01), (16, 0.001)])
+def test_false_positive_rate(bits, bound):
+    xor_filter = XorFilter.build([os.urandom(20).hex() for _ in range(500)], bits)
+    probes = 20000
+    false_positives = sum(xor_filter.contains(os.urandom(20).hex()) for _ in range(probes))
+    assert false_positives / probes < bound
+
+
+def test_bytes_round_trip():
+    keys = ["%040x" % i for i in range(50)]
+    xor_filter = XorFilter.build(keys, 16)
+    restored = XorFilter.from_bytes(xor_filter.to_bytes())
+    assert restored.seed == xor_filter.seed and restored.bits == 16
+    assert all(restored.contains(key) for key in keys)
+
+
+@pytest.mark.parametrize("key, k, h, slots", [
+    ("%040x" % 1, 0x195973895DC3B831, 0x2E43BE2653666247, (97, 3, 14, 22)),
+    ("%040x" % 2, 0xA1D4A583518E7C7D, 0xF4280076A5479C0B, (125, 7, 16, 28)),
+])
+def test_documented_test_vector(key, k, h, slots):
+    xor_filter = XorFilter.from_bytes(VECTOR)
+    assert (xor_filter.seed, xor_filter.block_length, xor_filter.bits) == (0x0123456789ABCDEF, 11, 8)
+    assert key_hash(key) == k
+    assert _murmur64((k + xor_filter.seed) & _MASK64) == h
+    assert xor_filter._slots(h) == slots
+    assert key in xor_filter
+    assert xor_filter.to_bytes() == VECTOR
+
+
+def test_rejects_malformed_bytes():
+    data = XorFilter.build(["a", "b"]).to_bytes()
+    with pytest.raises(ValueError):
+        XorFilter.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        XorFilter.from_bytes(data[:5])
+    with pytest.raises(ValueError):
+        XorFilter.build(["a"], bits=4)
+
+
+def test_filter_models_round_trip():
+    pytest.importorskip("fastbloom_rs")
+    from src.utils.filters import FILTER_ENCODINGS, FILTER_TYPES, build_filter, decode_filter, encode_filter
+
+    nodes = ["%040x" % i for i in range(10)]
+    for kind in FILTER_TYPES:
+        for encoding in FILTER_ENCODINGS:
+            model = encode_filter(build_filter(nodes, kind), encoding)
+            assert all(decode_filter(model).contains(node) for node in nodes)